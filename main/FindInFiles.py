@@ -0,0 +1,392 @@
+"""Find and Replace over multiple files for the GraphDonkey application.
+
+All open tabs are searched. Optionally, all files with a known extension in a
+folder (and its subfolders) can be included as well. The files are searched in
+a thread pool and the results are grouped per file as they come in.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from PyQt6 import QtWidgets, QtCore, uic
+from concurrent.futures import ThreadPoolExecutor
+from main.extra.IOHandler import IOHandler
+from main.FindReplace import pattern, template, expand, matchAll, replaceInEditor
+from main.plugins import PluginLoader
+import os
+import queue
+
+pluginloader = PluginLoader.instance()
+
+# Maximal length of the line previews in the result view
+PREVIEW_LENGTH = 200
+
+
+def utf16Offsets(text):
+    """Map the UTF-16 offsets of a text (as used by Qt) onto the indices of the string.
+
+    Returns:
+        A dict from offset to index, or None if they are identical.
+    """
+    if len(text) == 0 or max(text) <= "￿":
+        return None
+    offsets = {}
+    unit = 0
+    for i, c in enumerate(text):
+        offsets[unit] = i
+        unit += 2 if ord(c) > 0xFFFF else 1
+    offsets[unit] = len(text)
+    return offsets
+
+
+def findInText(regex, text):
+    """Find all matches of a regex in a text.
+
+    Returns:
+        A list of (start, end, line, preview) tuples, where start and end are the
+        (UTF-16) positions of the match.
+    """
+    matches = matchAll(regex, text)
+    if len(matches) == 0:
+        return []
+    offsets = utf16Offsets(text)
+    res = []
+    line = 1
+    last = 0
+    for match in matches:
+        start, end = match.capturedStart(), match.capturedEnd()
+        idx = start if offsets is None else offsets[start]
+        line += text.count("\n", last, idx)
+        last = idx
+        ls = text.rfind("\n", 0, idx) + 1
+        le = text.find("\n", idx)
+        preview = text[ls:len(text) if le == -1 else le].strip()
+        res.append((start, end, line, preview[:PREVIEW_LENGTH]))
+    return res
+
+
+def replaceInText(regex, text, template):
+    """Replace all matches of a regex in a text.
+
+    Returns:
+        A tuple (text, count) with the new text and the amount of replacements.
+    """
+    matches = matchAll(regex, text)
+    offsets = utf16Offsets(text)
+    parts = []
+    last = 0
+    for match in matches:
+        start, end = match.capturedStart(), match.capturedEnd()
+        if offsets is not None:
+            start, end = offsets[start], offsets[end]
+        parts.append(text[last:start])
+        parts.append(expand(template, match))
+        last = end
+    parts.append(text[last:])
+    return "".join(parts), len(matches)
+
+
+class FindInFiles(QtWidgets.QDialog):
+    def __init__(self, parent):
+        super(FindInFiles, self).__init__(parent)
+        uic.loadUi(IOHandler.dir_ui("FindInFiles.ui"), self)
+        self.mainwindow = parent
+
+        self.generation = 0
+        self.pool = None
+        self.results = queue.SimpleQueue()
+        self.expected = 0
+        self.received = 0
+        self.replacing = False
+        self.items = {}
+        self.failed = []
+        self.drainTimer = QtCore.QTimer(self)
+        self.drainTimer.setInterval(30)
+        self.drainTimer.timeout.connect(self.drain)
+
+        self.pb_find.clicked.connect(self.search)
+        self.pb_replaceAll.clicked.connect(self.replaceAll)
+        self.pb_close.clicked.connect(self.close)
+        self.pb_browse.clicked.connect(self.browse)
+        self.le_find.returnPressed.connect(self.search)
+        self.le_replace.textChanged.connect(lambda text: self.pb_replaceAll.setEnabled(text != ""))
+        self.tree_results.itemActivated.connect(self.goTo)
+
+        self.setError("")
+
+    def showEvent(self, event):
+        QtWidgets.QDialog.showEvent(self, event)
+        current = self.combo_filetype.currentText()
+        exts = pluginloader.getFileExtensions()
+        self.combo_filetype.clear()
+        self.combo_filetype.addItem("All File Types", sorted({e for t in exts for e in exts[t]}))
+        for t in sorted(exts):
+            self.combo_filetype.addItem("%s Files (*.%s)" % (t, " *.".join(exts[t])), exts[t])
+        idx = self.combo_filetype.findText(current)
+        self.combo_filetype.setCurrentIndex(max(idx, 0))
+        if self.le_folder.text() == "":
+            edit = self.mainwindow.editor()
+            if edit is not None and edit.filename != "":
+                self.le_folder.setText(IOHandler.directory(edit.filename))
+
+    def close(self):
+        self.reset()
+        QtWidgets.QDialog.close(self)
+
+    def browse(self):
+        options, folder = self.mainwindow.io()
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self, "Search in Folder", folder, options)
+        if folder != "":
+            self.le_folder.setText(folder)
+
+    def get(self):
+        reg = pattern(self.le_find.text(), self.check_regex.isChecked(), self.check_words.isChecked(),
+                      self.check_case.isChecked())
+        if reg.isValid():
+            self.setInfo("")
+        else:
+            self.setError(reg.errorString())
+        return reg
+
+    def tabs(self):
+        """Get the list of editors of all open tabs."""
+        return [self.mainwindow.editor(i) for i in range(self.mainwindow.files.count())]
+
+    def reset(self):
+        """Stop the current search and clear the results."""
+        self.generation += 1
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        self.drainTimer.stop()
+        self.tree_results.clear()
+        self.items = {}
+        self.failed = []
+        self.expected = 0
+        self.received = 0
+
+    def start(self):
+        """Start a new round of background tasks."""
+        self.reset()
+        self.pool = ThreadPoolExecutor()
+        self.drainTimer.start()
+
+    def submit(self, func, *args):
+        """Run a function in the thread pool. Its result is added to the queue of results."""
+        generation = self.generation
+        self.expected += 1
+
+        def task():
+            try:
+                result = func(*args)
+            except Exception as e:
+                result = "failed", args[0], str(e)  # Every task must be received, or the search never ends
+            self.results.put((generation, result))
+
+        self.pool.submit(task)
+
+    def folder(self):
+        """Get the folder to search in, or None if no folder must be searched."""
+        folder = self.le_folder.text()
+        if self.group_folder.isChecked() and os.path.isdir(folder):
+            return folder
+        return None
+
+    def search(self):
+        regex = self.get()
+        if self.le_find.text() == "" or not regex.isValid():
+            return
+        self.start()
+        self.replacing = False
+
+        opened = set()
+        for editor in self.tabs():
+            if editor.filename != "":
+                opened.add(os.path.realpath(editor.filename))
+            if editor.wrapper.pending is not None:
+                # The tab has not been loaded yet, so its file is still up to date
+                self.submit(self._searchFile, os.path.realpath(editor.filename), regex.pattern(),
+                            regex.patternOptions())
+            else:
+                self.submit(self._searchText, editor, regex.pattern(), regex.patternOptions(), editor.toPlainText())
+
+        folder = self.folder()
+        if folder is not None:
+            exts = {"." + e for e in self.combo_filetype.currentData()}
+            self.submit(self._walk, folder, exts, opened, regex.pattern(), regex.patternOptions())
+        self.setInfo("Searching...")
+
+    @staticmethod
+    def _searchText(key, ptn, options, text):
+        # Each thread uses its own copy of the regex
+        return "found", key, findInText(QtCore.QRegularExpression(ptn, options), text)
+
+    def _walk(self, folder, exts, opened, ptn, options):
+        files = []
+        for root, dirs, names in os.walk(folder):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in names:
+                path = os.path.realpath(os.path.join(root, name))
+                if os.path.splitext(name)[1].lower() in exts and path not in opened:
+                    files.append(path)
+        return "walked", files, ptn, options
+
+    @staticmethod
+    def _searchFile(path, ptn, options):
+        try:
+            read = IOHandler.read_text(path)
+        except (OSError, UnicodeError):
+            read = None
+        if read is None:
+            return "found", path, []
+        return "found", path, findInText(QtCore.QRegularExpression(ptn, options), read[0])
+
+    @staticmethod
+    def _replaceFile(path, ptn, options, tmpl):
+        try:
+            read = IOHandler.read_text(path)
+            if read is None:
+                return "replaced", path, 0
+            text, count = replaceInText(QtCore.QRegularExpression(ptn, options), read[0], tmpl)
+            if count > 0:
+                IOHandler.write_atomic(path, text.encode(read[1]))
+            return "replaced", path, count
+        except (OSError, UnicodeError) as e:
+            return "failed", path, str(e)
+
+    def drain(self):
+        """Process the results of the background tasks."""
+        while True:
+            try:
+                generation, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation:
+                continue
+            self.received += 1
+            if result[0] == "walked":
+                _, files, ptn, options = result
+                for path in files:
+                    self.submit(self._searchFile, path, ptn, options)
+            elif result[0] == "found":
+                self.addResults(result[1], result[2])
+            elif result[0] == "replaced":
+                self.replaced[0] += result[2]
+                self.replaced[1] += 1 if result[2] > 0 else 0
+            elif result[0] == "failed":
+                self.failed.append("%s: %s" % (result[1], result[2]))
+
+        done = self.received >= self.expected
+        if done:
+            self.drainTimer.stop()
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+                self.pool = None
+        if self.replacing:
+            if done:
+                self.replacing = False
+                self.replacedInfo()
+        else:
+            count = sum([self.items[k].childCount() for k in self.items])
+            msg = "%i match%s found in %i file%s" % (count, "" if count == 1 else "es", len(self.items),
+                                                     "" if len(self.items) == 1 else "s")
+            if done and len(self.failed) > 0:
+                self.setError(msg + ".<br/>Could not search:<br/>" + "<br/>".join(self.failed))
+            else:
+                self.setInfo(msg + ("." if done else " so far..."))
+
+    def addResults(self, key, matches):
+        """Add the matches of a single file to the result view."""
+        if len(matches) == 0:
+            return
+        if isinstance(key, str):
+            label = key
+        else:
+            label = key.filename if key.filename != "" else "undefined"
+            idx = self.tabs().index(key) if key in self.tabs() else -1
+            if idx >= 0:
+                label = "%s [%s]" % (label, self.mainwindow.files.tabText(idx))
+        top = QtWidgets.QTreeWidgetItem(["%s (%i)" % (label, len(matches))])
+        top.setData(0, QtCore.Qt.ItemDataRole.UserRole, (key, 0))
+        top.setToolTip(0, label)
+        for start, end, line, preview in matches:
+            item = QtWidgets.QTreeWidgetItem(top, ["%i: %s" % (line, preview)])
+            item.setData(0, QtCore.Qt.ItemDataRole.UserRole, (key, line))
+        self.tree_results.addTopLevelItem(top)
+        self.items[key] = top
+
+    def goTo(self, item, column=0):
+        """Open the file of a result and select the match."""
+        key, line = item.data(0, QtCore.Qt.ItemDataRole.UserRole)
+        tabs = self.tabs()
+        if isinstance(key, str):
+            paths = [os.path.realpath(e.filename) if e.filename != "" else "" for e in tabs]
+            if key in paths:
+                key = tabs[paths.index(key)]
+            elif self.mainwindow.openFile(key):
+                key = self.mainwindow.editor()
+            else:
+                return
+            tabs = self.tabs()
+        if key not in tabs:
+            return
+        self.mainwindow.changeTab(tabs.index(key))
+        if line > 0:
+            block = key.document().findBlockByNumber(line - 1)
+            cursor = key.textCursor()
+            cursor.setPosition(block.position())
+            match = self.get().match(block.text())
+            if match.hasMatch():
+                cursor.setPosition(block.position() + match.capturedStart())
+                cursor.setPosition(block.position() + match.capturedEnd(), cursor.MoveMode.KeepAnchor)
+            key.setTextCursor(cursor)
+            key.centerCursor()
+
+    def replaceAll(self):
+        regex = self.get()
+        if self.le_find.text() == "" or not regex.isValid() or len(self.items) == 0:
+            return
+        # Files that have been opened since the search are replaced in their editor
+        tabs = self.tabs()
+        opened = {os.path.realpath(e.filename): e for e in tabs if e.filename != ""}
+        files = [k for k in self.items if isinstance(k, str) and k not in opened]
+        editors = [opened.get(k, k) for k in self.items if k in tabs or k in opened]
+        count = sum([self.items[k].childCount() for k in self.items])
+        if len(files) > 0 and not self.mainwindow.question("Replace in Files",
+                "Replace %i matches in %i files? Files that are not opened will be "
+                "changed on disk and this cannot be undone." % (count, len(self.items))):
+            return
+
+        tmpl = template(self.le_replace.text(), self.check_regex.isChecked())
+        self.start()
+        self.replacing = True
+        self.replaced = [0, 0]
+        for editor in editors:
+            tabs = self.tabs()
+            if editor not in tabs or not self.mainwindow.materialize(tabs.index(editor)):
+                continue
+            cnt = replaceInEditor(editor, regex, tmpl)
+            self.replaced[0] += cnt
+            self.replaced[1] += 1 if cnt > 0 else 0
+        for path in files:
+            self.submit(self._replaceFile, path, regex.pattern(), regex.patternOptions(), tmpl)
+        if len(files) == 0:
+            self.drain()
+        else:
+            self.setInfo("Replacing...")
+
+    def replacedInfo(self):
+        msg = "%i match%s replaced in %i file%s." % (self.replaced[0], "" if self.replaced[0] == 1 else "es",
+                                                     self.replaced[1], "" if self.replaced[1] == 1 else "s")
+        if len(self.failed) > 0:
+            self.setError(msg + "<br/>Could not write:<br/>" + "<br/>".join(self.failed))
+        else:
+            self.setInfo(msg)
+
+    def setInfo(self, msg):
+        self.label_error.setText(msg)
+
+    def setError(self, msg):
+        if msg == "":
+            self.label_error.setText("")
+        else:
+            self.label_error.setText("<span style='color: red'><b>Error:</b> %s</span>" % msg)
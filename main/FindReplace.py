@@ -5,14 +5,131 @@ Date:   17/12/2019
 """
 from PyQt6 import QtWidgets, QtGui, QtCore, uic
 from main.extra.IOHandler import IOHandler
+from main.extra.Threading import WorkerThread
+from bisect import bisect_left
+import queue
 import re
 
+# References to capture groups in the replacement text (e.g. $1), unless escaped
+CAPTURE = QtCore.QRegularExpression(r"(?<![\\])\$(\d+)")
+
+# Amount of matches the background search collects before handing them over
+CHUNK_SIZE = 500
+
+
+def pattern(text, regex=False, words=False, case=False):
+    """Create the regular expression to search for.
+
+    Args:
+        text (str):     The text to find.
+        regex (bool):   When True, the text is a regular expression. Defaults to False.
+        words (bool):   When True, only whole words are matched. Defaults to False.
+        case (bool):    When True, matching is case-sensitive. Defaults to False.
+
+    Returns:
+        A QRegularExpression, which may be invalid.
+    """
+    if not regex:
+        text = QtCore.QRegularExpression.escape(text)
+    if words:
+        text = r"\b" + text.replace(" ", r"\b") + r"\b"
+    options = QtCore.QRegularExpression.PatternOption.NoPatternOption
+    if not case:
+        options |= QtCore.QRegularExpression.PatternOption.CaseInsensitiveOption
+    return QtCore.QRegularExpression(text, options)
+
+
+def template(text, regex=False):
+    """Split a replacement text into literal strings and references to capture groups
+    (as (group, text) tuples), such that it only has to be parsed once.
+
+    Args:
+        text (str):     The replacement text.
+        regex (bool):   When True, capture groups can be referenced. Defaults to False.
+    """
+    if not regex:
+        return [text]
+    parts = []
+    last = 0
+    iter = CAPTURE.globalMatch(text)
+    while iter.hasNext():
+        match = iter.next()
+        if match.hasMatch():
+            parts.append(text[last:match.capturedStart()].replace(r"\$", "$"))
+            parts.append((int(match.captured(1)), match.captured()))
+            last = match.capturedEnd()
+    parts.append(text[last:].replace(r"\$", "$"))
+    return parts
+
+
+def expand(template, match):
+    """Obtain the replacement text for a match.
+
+    Args:
+        template (list):                    The result of the `template` function.
+        match (QRegularExpressionMatch):    The match to replace.
+    """
+    text = ""
+    for part in template:
+        if isinstance(part, str):
+            text += part
+        elif match.capturedStart(part[0]) != -1:
+            text += match.captured(part[0])
+        else:
+            text += part[1]
+    return text
+
+
+def matchAll(regex, text):
+    """Get the list of all QRegularExpressionMatches of a regex in a text."""
+    matches = []
+    it = regex.globalMatch(text)
+    while it.hasNext():
+        match = it.next()
+        if match.hasMatch():
+            matches.append(match)
+    return matches
+
+
+def replaceInEditor(editor, regex, template):
+    """Replace all matches in an editor in a single pass, as a single undo step.
+
+    Args:
+        editor (QPlainTextEdit):    The editor to replace in.
+        regex (QRegularExpression): The expression to replace.
+        template (list):            The result of the `template` function.
+
+    Returns:
+        The amount of replaced matches.
+    """
+    matches = matchAll(regex, editor.toPlainText())
+
+    # Back-to-front, such that the positions of the remaining matches stay valid
+    cursor = editor.textCursor()
+    cursor.beginEditBlock()
+    for match in reversed(matches):
+        cursor.setPosition(match.capturedStart())
+        cursor.setPosition(match.capturedEnd(), QtGui.QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(expand(template, match))
+    cursor.endEditBlock()
+    return len(matches)
+
 
 class FindReplace(QtWidgets.QDialog):
     def __init__(self, parent, editor):
         super(FindReplace, self).__init__(parent)
         uic.loadUi(IOHandler.dir_ui("FindReplace.ui"), self)
-        self.editor = editor
+        self.editor = None
+
+        # Matching happens in a background thread, of which the results are
+        #   periodically moved into the editor's list of matches
+        self.generation = 0
+        self.searched = -1
+        self.worker = None
+        self.results = queue.SimpleQueue()
+        self.drainTimer = QtCore.QTimer(self)
+        self.drainTimer.setInterval(30)
+        self.drainTimer.timeout.connect(self.drain)
 
         self.pb_find.clicked.connect(self.findText)
         self.pb_close.clicked.connect(self.close)
@@ -30,12 +147,174 @@ class FindReplace(QtWidgets.QDialog):
         self.setError("")
 
         self.idx = -1
+        self.setEditor(editor)
+
+    def setEditor(self, editor):
+        """Set the editor to search in."""
+        if editor is self.editor:
+            return
+        if self.editor is not None:
+            self.reset()
+            try:
+                self.editor.document().contentsChange.disconnect(self.contentsChange)
+            except (RuntimeError, TypeError):
+                pass  # The editor was already deleted
+        self.editor = editor
+        if editor is not None:
+            editor.document().contentsChange.connect(self.contentsChange)
+            if self.isVisible():
+                self.findChanged()
+
+    def reset(self):
+        """Stop the current search and remove all matches."""
+        self.generation += 1
+        self.idx = -1
+        if self.editor is not None:
+            self.editor.matches = []
+            self.editor.highlightMatches()
 
     def findChanged(self, text=None):
-        self.get()  #< Check validity
+        regex = self.get()  #< Check validity
+        self.reset()
+        if self.editor is not None and self.isVisible() and self.le_find.text() != "" and regex.isValid():
+            self.search(regex)
+
+    def search(self, regex):
+        """Start searching the current contents of the editor in the background."""
+        generation = self.generation
+        text = self.editor.toPlainText()
+
+        def run():
+            batch = []
+            it = regex.globalMatch(text)
+            while it.hasNext():
+                if generation != self.generation:
+                    return
+                match = it.next()
+                if match.hasMatch():
+                    batch.append((match.capturedStart(), match.capturedEnd(), match))
+                    if len(batch) >= CHUNK_SIZE:
+                        self.results.put((generation, batch))
+                        batch = []
+            self.results.put((generation, batch))
+
+        self.searched = generation
+        self.worker = WorkerThread(run)
+        self.worker.start()
+        self.drainTimer.start()
+        self.setInfo("Searching...")
+
+    def drain(self):
+        """Move the results of the background search into the editor."""
+        running = self.worker is not None and self.worker.isRunning()
+        added = False
+        while True:
+            try:
+                generation, batch = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self.generation and len(batch) > 0:
+                self.editor.matches += batch
+                added = True
+        if added:
+            self.editor.highlightMatches()
+        if running:
+            self.setInfo("%i matches found so far..." % len(self.editor.matches))
+        else:
+            self.drainTimer.stop()
+            if self.searched == self.generation:
+                self.showCount()
+
+    def wait(self):
+        """Make sure the search for the current find text has finished."""
+        if self.searched != self.generation:
+            regex = self.get()
+            if self.le_find.text() == "" or not regex.isValid():
+                return
+            self.search(regex)
+        self.worker.wait()
+        self.drain()
+
+    def contentsChange(self, position, removed, added):
+        """Keep the matches up-to-date while the document is being edited, by only
+        rescanning the blocks that were changed. The scanned range only grows when
+        a match reaches its end (e.g. for a pattern that spans multiple lines)."""
+        if self.searched != self.generation or not self.isVisible():
+            return
+        if self.worker is not None and self.worker.isRunning():
+            self.findChanged()  # The snapshot is outdated
+            return
+        self.drain()  # The finished search may not have been handed over yet
+
+        doc = self.editor.document()
+        first = doc.findBlock(position)
+        last = doc.findBlock(position + added)
+        if not last.isValid():
+            last = doc.lastBlock()
+        start = first.position()
+        delta = added - removed
+
+        matches = self.editor.matches
+        lo = bisect_left(matches, start, key=lambda m: m[1])
+        res = matches[:lo]
+        if lo < len(matches) and matches[lo][0] < start:
+            start = matches[lo][0]  # A match that started in an earlier block was changed
+            first = doc.findBlock(start)
+
+        end = last.position() + last.length()
+        # New matches may reach past the changed blocks, but (most likely) not farther
+        #   than the longest match so far
+        context = max([len(self.le_find.text())] + [e - s for s, e, _ in matches[max(0, lo - 100):lo + 100]])
+        regex = self.get()
+        while True:
+            offset = first.position()
+            block, lines = first, []
+            while block.isValid() and (len(lines) == 0 or block.position() < end + context):
+                lines.append(block.text())
+                tail = block
+                block = block.next()
+            window = "\n".join(lines) + ("\n" if block.isValid() else "")
+            found = []
+            cut = False
+            it = regex.globalMatch(window)
+            while it.hasNext():
+                match = it.next()
+                if not match.hasMatch() or match.capturedStart() + offset < start:
+                    continue
+                if match.capturedStart() + offset >= end:
+                    break
+                if match.capturedEnd() >= len(window) and block.isValid():
+                    cut = True  # The match may continue after the scanned blocks
+                    break
+                found.append((match.capturedStart() + offset, match.capturedEnd() + offset, match))
+            if not cut:
+                break
+            context = 2 * (tail.position() + tail.length() - end)  # Double the scanned range
+
+        stop = found[-1][1] if len(found) > 0 else start
+        res += found
+        hi = bisect_left(matches, end - delta, key=lambda m: m[0])
+        for s, e, m in matches[hi:]:
+            if s + delta >= stop:
+                res.append((s + delta, e + delta, m))
+
         self.idx = -1
-        self.editor.matches = []
+        self.editor.matches = res
         self.editor.highlightMatches()
+        self.showCount()
+
+    def showCount(self):
+        l = len(self.editor.matches)
+        if l == 0:
+            self.setInfo("No matches found.")
+        elif l == 1:
+            self.setInfo("1 match found.")
+        else:
+            self.setInfo("%i matches found." % l)
+
+    def showEvent(self, event):
+        QtWidgets.QDialog.showEvent(self, event)
+        self.findChanged()
 
     def replaceTextChanged(self, text):
         self.pb_replace.setEnabled(text != "")
@@ -57,19 +336,11 @@ class FindReplace(QtWidgets.QDialog):
         return self.radio_dir_down.isChecked()
 
     def close(self):
-        self.findChanged()
+        self.reset()
         QtWidgets.QDialog.close(self)
 
     def get(self):
-        text = self.le_find.text()
-        if not self.useRegEx():
-            text = QtCore.QRegularExpression.escape(text)
-        if self.wholeWords():
-            text = r"\b" + text.replace(" ", r"\b") + r"\b"
-        options = QtCore.QRegularExpression.PatternOption.NoPatternOption
-        if not self.caseSensitive():
-            options |= QtCore.QRegularExpression.PatternOption.CaseInsensitiveOption
-        reg = QtCore.QRegularExpression(text, options)
+        reg = pattern(self.le_find.text(), self.useRegEx(), self.wholeWords(), self.caseSensitive())
         if reg.isValid():
             self.setInfo("")
         else:
@@ -77,20 +348,12 @@ class FindReplace(QtWidgets.QDialog):
         return reg
 
     def findText(self):
+        if self.editor is None:
+            return
         cursor = self.editor.textCursor()
         if self.idx == -1:
             start = cursor.selectionStart()
-            cursor.movePosition(QtGui.QTextCursor.MoveOperation.Start)
-            cursor.movePosition(QtGui.QTextCursor.MoveOperation.End, QtGui.QTextCursor.MoveMode.KeepAnchor)
-            text = cursor.selectedText()
-
-            self.editor.matches = []
-            regex = self.get()
-            it = regex.globalMatch(text)
-            while it.hasNext():
-                match = it.next()
-                if match.hasMatch():
-                    self.editor.matches.append((match.capturedStart(), match.capturedEnd(), match))
+            self.wait()
 
             l = len(self.editor.matches)
 
@@ -103,13 +366,6 @@ class FindReplace(QtWidgets.QDialog):
             if l > 0:
                 self.idx %= l
 
-            if l == 0:
-                self.setInfo("No matches found.")
-            elif l == 1:
-                self.setInfo("1 match found.")
-            else:
-                self.setInfo("%i matches found." % l)
-
         l = len(self.editor.matches)
 
         if self.idx != -1:
@@ -124,33 +380,15 @@ class FindReplace(QtWidgets.QDialog):
             self.editor.setTextCursor(cursor)
         self.editor.highlightMatches()
 
+    def template(self):
+        return template(self.le_replace.text(), self.useRegEx())
+
     def replaceMatch(self, match):
         start, end, rem = match
         cursor = self.editor.textCursor()
-
-        text = self.le_replace.text()
-        if self.useRegEx():
-            capregex = QtCore.QRegularExpression(r"(?<![\\])\$(\d+)")
-            iter = capregex.globalMatch(text)
-            ms = []
-            while iter.hasNext():
-                match = iter.next()
-                if match.hasMatch():
-                    ms.append(match)
-            for m in range(len(ms), 0, -1):
-                match = ms[m-1]
-                group = int(match.captured(1))
-                st = rem.capturedStart(group)
-                if st != -1:
-                    cursor.setPosition(st)
-                    cursor.setPosition(rem.capturedEnd(group), QtGui.QTextCursor.MoveMode.KeepAnchor)
-                    mtxt = cursor.selectedText()
-                    text = text[:match.capturedStart()] + mtxt + text[match.capturedEnd():]
-            text = text.replace(r"\$", "$")
-
         cursor.setPosition(start)
         cursor.setPosition(end, QtGui.QTextCursor.MoveMode.KeepAnchor)
-        cursor.insertText(text)
+        cursor.insertText(expand(self.template(), rem))
 
     def replace(self):
         self.findText()
@@ -158,12 +396,20 @@ class FindReplace(QtWidgets.QDialog):
             self.replaceMatch(self.editor.matches[self.idx])
         self.findChanged()
         self.findText()
-        self.editor.updateLineNumberArea()
 
     def replaceAll(self):
-        self.findText()
-        while len(self.editor.matches) > 0:
-            self.replace()
+        regex = self.get()
+        if not regex.isValid() or self.le_find.text() == "":
+            return
+        self.reset()
+        l = replaceInEditor(self.editor, regex, self.template())
+        self.findChanged()
+        if l == 0:
+            self.setInfo("No matches found.")
+        elif l == 1:
+            self.setInfo("1 match replaced.")
+        else:
+            self.setInfo("%i matches replaced." % l)
 
     def setInfo(self, msg):
         if msg == "":
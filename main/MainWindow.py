@@ -6,18 +6,25 @@ Date:   14/12/2019
 from PyQt6 import QtWidgets, QtCore, QtGui, uic
 
 from main.FindReplace import FindReplace
+from main.FindInFiles import FindInFiles
 from main.Preferences import Preferences, bool
 from main.Snippets import Snippets
 from main.extra.IOHandler import IOHandler
 from main.editor.CodeEditor import EditorWrapper, StatusBar
+from main.editor.Intellisense import SymbolIndex, scanSymbols
+from main.editor.Parser import sourcePositions
+from main.editor.Focus import FocusGraph
 from main.extra.GraphicsView import GraphicsView
+from main.extra.Overview import Overview
+from main.extra.Journal import Journal
 from main.extra import Constants, tabPathnames
 from main.wizards.UpdateWizard import UpdateWizard
 from markdown.extensions.legacy_em import LegacyEmExtension as legacy_em
-import os, sys, chardet, markdown
+from concurrent.futures import ThreadPoolExecutor
+import os, sys, markdown, queue, shutil, time
 from main.extra.qrc import tango
 
-from main.plugins import PluginLoader
+from main.plugins import PluginLoader, job, killOutdated
 from main.wizards.WelcomeWizard import WelcomeWizard
 
 Config = IOHandler.get_preferences()
@@ -25,6 +32,11 @@ pluginloader = PluginLoader.instance()
 
 rccv = tango.rcc_version
 
+# A draft of the graph is shown first when its last render took longer than this amount of seconds,
+# or when it was not rendered before and its text is longer than this amount of characters
+DRAFT_TIME = 0.5
+DRAFT_SIZE = 100000
+
 class MainWindow(QtWidgets.QMainWindow):
     def __init__(self):
         super().__init__()
@@ -33,7 +45,57 @@ class MainWindow(QtWidgets.QMainWindow):
         self.view = GraphicsView(self, self.viewDock)
         self.viewDockWidgetContents.layout().addWidget(self.view)
         self.view.zoomed.connect(self.zoomed)
-
+        self.view.elementClicked.connect(self.goToElement)
+        self.view.elementHovered.connect(self.showElement)
+        self.sources = {}  # The statements of the rendered graph, see sourcePositions
+
+        # Graphs are rendered in the background; the finished renders are shown by the timer
+        self.renderer = ThreadPoolExecutor(max_workers=2)
+        self.renders = queue.SimpleQueue()
+        self.renderGeneration = 0
+        self.renderShown = 0  # The last generation of which the final render was shown
+        self.renderDraft = 0  # The last generation of which a draft was shown
+        self.renderPending = 0
+        self.renderTimes = {}  # The duration of the last final render of each editor
+        self.renderTimer = QtCore.QTimer(self)
+        self.renderTimer.setInterval(30)
+        self.renderTimer.timeout.connect(self.drainRenders)
+
+        # In focus mode, only the neighbourhood of the node at the cursor is rendered
+        self.focus = None  # The FocusGraph of the current text
+        self.focusKey = None  # The editor and the revision of its document from which the focus was taken
+        self.focusNode = None
+        self.focusSources = {}
+        self.focusTimer = QtCore.QTimer(self)
+        self.focusTimer.setSingleShot(True)
+        self.focusTimer.setInterval(150)
+        self.focusTimer.timeout.connect(self.refocus)
+        self.overview = Overview(self.view, self.overviewDock)
+        self.overviewDockWidgetContents.layout().addWidget(self.overview)
+        self.overviewDock.setVisible(False)
+
+        self.symbols = SymbolIndex()  # Completions across all open tabs
+        self.find = None
+
+        # Files are saved in the background; the finished saves are processed by the timer
+        self.writer = ThreadPoolExecutor(max_workers=4)
+        self.written = queue.SimpleQueue()
+        self.writing = {}
+        self.writeTimer = QtCore.QTimer(self)
+        self.writeTimer.setInterval(30)
+        self.writeTimer.timeout.connect(self.drainWrites)
+
+        # Unsaved changes are journaled in the background, to recover them after a crash
+        self.journal = Journal(self)
+
+        # Open files are reloaded when they are changed by other programs
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.fileChanged)
+        self.changedFiles = set()
+        self.reloadTimer = QtCore.QTimer(self)
+        self.reloadTimer.setSingleShot(True)
+        self.reloadTimer.setInterval(100)
+        self.reloadTimer.timeout.connect(self.reloadChanged)
         self.transformationActions = []
         self.disableDisplay = []
         self.lockDisplay(False)
@@ -53,11 +115,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.preferences.apply()
 
         self.recents = []
+        # Restored tabs are read in the background and loaded by the timer
+        self.reader = ThreadPoolExecutor(max_workers=2)
+        self.prefetched = queue.SimpleQueue()
+        self.prefetchTimer = QtCore.QTimer(self)
+        self.prefetchTimer.setInterval(10)
+        self.prefetchTimer.timeout.connect(self.prefetch)
         self.restore()
+        self.recover()
 
         self.releaseDisplay()
 
         self.find = FindReplace(self, self.editor())
+        self.findInFiles = FindInFiles(self)
         self.snippets = Snippets(self)
 
         # Set menu
@@ -83,14 +153,19 @@ class MainWindow(QtWidgets.QMainWindow):
         self.action_Indent.triggered.connect(lambda: self.editorEvent("indent"))
         self.action_Unindent.triggered.connect(lambda: self.editorEvent("unindent"))
         self.action_Auto_Indent.triggered.connect(lambda: self.editorEvent("autoIndent"))
+        self.action_Convert_Indentation.triggered.connect(lambda: self.editorEvent("convertIndentation"))
         self.action_Lower_Case.triggered.connect(lambda: self.editorEvent("caseLower"))
         self.action_Upper_Case.triggered.connect(lambda: self.editorEvent("caseUpper"))
         self.action_Title_Case.triggered.connect(lambda: self.editorEvent("caseTitle"))
         self.action_Move_Up.triggered.connect(lambda: self.editorEvent("moveUp"))
         self.action_Move_Down.triggered.connect(lambda: self.editorEvent("moveDown"))
         self.action_Find.triggered.connect(self.findReplace)
+        self.action_Find_In_Files.triggered.connect(self.findAll)
         self.action_Autocomplete.triggered.connect(lambda: self.editorEvent("complete"))
         self.viewDock.closeEvent = self.viewDockCloseEvent
+        self.overviewDock.closeEvent = self.overviewDockCloseEvent
+        self.action_Show_Overview.setChecked(not self.overviewDock.isHidden())
+        self.action_Focus_On_Cursor.toggled.connect(lambda: self.displayGraph())
         self.action_Snippets.triggered.connect(self.openSnippets)
         self.action_Next_File.triggered.connect(lambda: self.changeTab(self.files.currentIndex() + 1))
         self.action_Previous_File.triggered.connect(lambda: self.changeTab(self.files.currentIndex() - 1))
@@ -158,6 +233,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.action_Unindent.setEnabled(on)
         self.action_Auto_Indent.setEnabled(on)
         self.action_Find.setEnabled(on)
+        self.action_Find_In_Files.setEnabled(on)
         self.action_Autocomplete.setEnabled(on)
 
     def lockDisplay(self, disp=False):
@@ -165,14 +241,18 @@ class MainWindow(QtWidgets.QMainWindow):
             self.displayGraph()
         self.disableDisplay.append(True)
 
-    def releaseDisplay(self):
+    def releaseDisplay(self, disp=True):
         if len(self.disableDisplay) > 0:
             self.disableDisplay.pop()
-        if self.canDisplay():
+        if disp and self.canDisplay():
             self.displayGraph()
 
     def canDisplay(self):
-        return len(self.disableDisplay) == 0
+        return len(self.disableDisplay) == 0 and not self.loading()
+
+    def loading(self):
+        """Check if the text of an editor is being loaded, in which case it is incomplete."""
+        return any(self.files.widget(i).editor.loading for i in range(self.files.count()))
 
     def setEditorType(self, type, idx=-1):
         if idx == -1:
@@ -201,11 +281,15 @@ class MainWindow(QtWidgets.QMainWindow):
         return self.files.widget(idx)
 
     def tabChanged(self, index):
+        if not self.materialize(index):
+            return
         self.updateTitle()
         edit = self.editor(index)
         if edit is not None:
             edit.highlighter.rehighlight()
             self.setStatusBar(edit.wrapper.statusBar)
+            if self.find is not None:
+                self.find.setEditor(edit)
             self.displayGraph()
             self.setUndoEnabled(edit.document().isUndoAvailable())
             self.setRedoEnabled(edit.document().isRedoAvailable())
@@ -252,17 +336,108 @@ class MainWindow(QtWidgets.QMainWindow):
     def updateStatus(self, text):
         self.statusBar().statusMessage.setText(text)
 
-    def newTab(self, label):
+    def newTab(self, label, activate=True):
         editor = EditorWrapper(self)
+        editor.editor.savedChanged.connect(lambda saved: self.updateTitle())
         self.files.addTab(editor, label)
+        self.journal.track(editor.editor)
+        editor.editor.cursorPositionChanged.connect(lambda: self.focusTimer.start())
 
-        self.changeTab(self.files.count() - 1)
-        self.preferences.applyEditor()
+        self.preferences.applyEditor([editor.editor])
+        if activate:
+            self.changeTab(self.files.count() - 1)
+        return editor
+
+    def materialize(self, idx=-1):
+        """Load the file of a tab that was restored as a placeholder.
+
+        Args:
+            idx (int):  The index of the tab. Defaults to -1 (the current tab).
+
+        Returns:
+            True iff the tab exists and is loaded.
+        """
+        if idx == -1:
+            idx = self.files.currentIndex()
+        wrapper = self.files.widget(idx)
+        if wrapper is None or wrapper.pending is None:
+            return wrapper is not None
+        start, end = wrapper.pending
+        wrapper.pending = None
+        self.lockDisplay()
+        try:
+            self.updateFileType(idx)
+        except IOError as e:
+            self.warn("I/O Error", "%s\nPlease retry.\nFilename: %s" % (str(e), wrapper.editor.filename))
+            self.releaseDisplay(False)
+            self.symbols.discard(wrapper.editor)
+            self.journal.untrack(wrapper.editor)
+            self.files.removeTab(self.files.indexOf(wrapper))
+            self.updateTitle()
+            return False
+        self.releaseDisplay(False)
+        edit = wrapper.editor
+        size = edit.document().characterCount() - 1
+        curs = edit.textCursor()
+        curs.setPosition(min(start, size))
+        curs.setPosition(min(end, size), QtGui.QTextCursor.MoveMode.KeepAnchor)
+        edit.setTextCursor(curs)
+        return True
+
+    def prefetch(self):
+        """Read the files of the placeholder tabs in the background (closest to the current
+        tab first) and load a single tab whose file was read.
+
+        As these tabs are hidden, they are not parsed yet. Their symbols are scanned
+        instead, such that they can be completed in other tabs.
+        """
+        if self.loading():
+            return  # Another tab is being loaded
+        current = self.files.currentIndex()
+        pending = [i for i in range(self.files.count()) if self.files.widget(i).pending is not None]
+        if len(pending) == 0:
+            self.prefetchTimer.stop()
+            return
+        for idx in sorted(pending, key=lambda i: abs(i - current)):
+            wrapper = self.files.widget(idx)
+            if not wrapper.reading:
+                wrapper.reading = True
+
+                def task(fileName=wrapper.editor.filename):
+                    try:
+                        data = self.readFile(fileName)
+                        return data, scanSymbols(data[0])
+                    except Exception as e:
+                        return e if isinstance(e, IOError) else IOError(str(e)), set()
+
+                def done(future, wrapper=wrapper):
+                    # Each read must be handed over, or the tab is never loaded
+                    try:
+                        data, symbols = future.result()
+                    except Exception as e:
+                        data, symbols = IOError(str(e)), set()
+                    self.prefetched.put((wrapper, data, symbols))
+
+                self.reader.submit(task).add_done_callback(done)
+        try:
+            wrapper, data, symbols = self.prefetched.get_nowait()
+        except queue.Empty:
+            return
+        idx = self.files.indexOf(wrapper)
+        if idx == -1 or wrapper.pending is None:
+            return  # Closed or shown in the meantime
+        wrapper.prefetched = data
+        if self.materialize(idx) and not wrapper.editor.isVisible():
+            self.symbols.publish(wrapper.editor, wrapper.filetype.currentText(), symbols)
 
     def viewDockCloseEvent(self, event):
         self.action_Show_Render_Area.setChecked(False)
         self.viewDock.setVisible(False)
 
+    def overviewDockCloseEvent(self, event):
+        self.action_Show_Overview.setChecked(False)
+        self.overviewDock.setVisible(False)
+
     def restore(self):
         # Restore layout from memory iff needs be/possible
         settings = IOHandler.get_settings()
@@ -288,26 +463,66 @@ class MainWindow(QtWidgets.QMainWindow):
                 files = []
             if cursors is None:
                 cursors = []
+            # Only the active tab is loaded immediately, the others are prefetched afterwards
+            self.files.blockSignals(True)
             for file in range(len(files)):
-                succ = self.openFile(files[file], True)
-                if succ and file < len(cursors):
-                    curs = self.editor().textCursor()
-                    curs.setPosition(cursors[file][0])
-                    curs.setPosition(cursors[file][1], QtGui.QTextCursor.MoveMode.KeepAnchor)
-                    self.editor().setTextCursor(curs)
+                wrapper = self.newTab(files[file], False)
+                wrapper.editor.filename = files[file]
+                wrapper.pending = tuple(cursors[file]) if file < len(cursors) else (0, 0)
+                self.updateRecents(files[file])
             self.changeTab(active)
+            self.files.blockSignals(False)
+            self.tabChanged(self.files.currentIndex())
+            self.prefetchTimer.start()
         self.updateRecents()
 
+    def recover(self):
+        """Recover the unsaved changes of a session that was not closed properly."""
+        recovered, folders = self.journal.recover()
+        if len(recovered) > 0 and self.question("Recover Unsaved Changes",
+                                                "It appears GraphDonkey was not closed properly.\n"
+                                                "Do you want to recover the unsaved changes of %i file(s)?"
+                                                % len(recovered)):
+            for item in recovered:
+                idx = self.findTab(item["filename"]) if item["filename"] != "" else -1
+                if idx == -1:
+                    if item["filename"] != "" and os.path.isfile(item["filename"]):
+                        if not self.openFile(item["filename"]):
+                            continue
+                    else:
+                        self.newTab("undefined *")
+                        self.editor().filename = item["filename"]
+                    idx = self.files.currentIndex()
+                elif not self.materialize(idx):
+                    continue
+                edit = self.editor(idx)
+                enc = edit.wrapper.encoding.findData(item["encoding"])
+                if enc != -1:
+                    edit.wrapper.encoding.setCurrentIndex(enc)
+                edit.wrapper.statusBar.setLineSep(item["linesep"])
+                # Replace the contents as a single edit, such that the recovery can be undone
+                curs = QtGui.QTextCursor(edit.document())
+                curs.select(QtGui.QTextCursor.SelectionType.Document)
+                curs.insertText(item["text"])
+            self.updateTitle()
+        for folder in folders:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def findTab(self, filename):
+        """Find the index of the tab of a file, or -1 if it is not open."""
+        for i in range(self.files.count()):
+            if os.path.realpath(self.editor(i).filename) == os.path.realpath(filename):
+                return i
+        return -1
+
     def closeEvent(self, event: QtGui.QCloseEvent):
+        self.drainWrites(True)
         self.lockDisplay()
         saved = True
-        old = self.files.currentIndex()
         for tab in range(self.files.count()):
-            self.changeTab(tab)
-            if not self.editor().isSaved():
+            if not self.editor(tab).isSaved():
                 saved = False
                 break
-        self.changeTab(old)
         if not saved:
             saved = self.question("Unsaved Changes", "It appears there are some unchanged changes.\n"
                                                      "Are you sure you want quit? All changes will be lost.")
@@ -315,6 +530,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.releaseDisplay()
 
         if saved:
+            self.journal.close()
             settings = IOHandler.get_settings()
             if bool(Config.value("rememberLayout", True)):
                 settings.setValue("geometry", self.saveGeometry())
@@ -328,6 +544,9 @@ class MainWindow(QtWidgets.QMainWindow):
                 for tab in range(self.files.count()):
                     editor = self.editor(tab)
                     files.append(editor.filename)
+                    if editor.wrapper.pending is not None:
+                        cursors.append(editor.wrapper.pending)
+                        continue
                     curs = editor.textCursor()
                     cursors.append((curs.selectionStart(), curs.selectionEnd()))
                 settings.setValue("open", files)
@@ -402,49 +621,124 @@ class MainWindow(QtWidgets.QMainWindow):
 
         fn = edit.filename
 
-        if fn == '':
+        if fn == '' or edit.wrapper.pending is not None:
             return
 
         ext = fn.split(".")[-1]
         exts = pluginloader.getFileExtensions()
 
-        # Detect line separator
-        with open(fn, "r", newline='') as file:
-            text = file.read()
-            if "\r\n" in text:
-                linesep = '\r\n'
-            elif "\n" in text:
-                linesep = '\n'
-            elif "\r" in text:
-                linesep = '\r'
-            else:
-                linesep = os.linesep
-
-        # Actually open the file
-        with open(fn, "rb") as myfile:
-            data = myfile.read()
-            enc = chardet.detect(data)
-            et = enc['encoding']
-            lan = enc['language']
-            idx = self.editor().wrapper.encoding.findText(et.upper())
-            if idx == -1:
-                self.warn("Unknown File Encoding", "Cannot identify encoding.\n"
-                                                   "Detected as %s.\n"
-                                                   "Reverting to UTF-8."
-                          % (et.upper() + ("" if len(lan) == 0 else " (%s)" % lan)))
-                et = 'utf-8'
-            data = data.decode(et)
-        edit.wrapper.encoding.setCurrentText(et.upper())
+        if edit.wrapper.prefetched is not None:
+            data, edit.wrapper.prefetched = edit.wrapper.prefetched, None
+            if isinstance(data, IOError):
+                raise data
+            data, et, linesep = data
+        else:
+            data, et, linesep = self.readFile(fn)
+        idx = edit.wrapper.encoding.findData(et)
+        if idx == -1:
+            idx = edit.wrapper.encoding.findText(et.upper())
+        if idx == -1:
+            self.warn("Unknown File Encoding", "Cannot identify encoding.\n"
+                                               "Detected as %s.\n"
+                                               "Reverting to UTF-8." % et.upper())
+            idx = edit.wrapper.encoding.findData("utf-8")
+        edit.wrapper.encoding.setCurrentIndex(idx)
         edit.wrapper.statusBar.setLineSep(linesep)
+        self.setEditorType(Constants.lookup(ext, exts, ""), indx)
         c = edit.textCursor()
         cstr = c.selectionStart()
         cend = c.selectionEnd()
-        edit.setText(data)
+        self.journal.pause(edit)
+        edit.loadText(data)
         c.setPosition(cstr)
         c.setPosition(cend, QtGui.QTextCursor.MoveMode.KeepAnchor)
         edit.setTextCursor(c)
-        edit.filecontents = data.replace(linesep, "\n")
-        self.setEditorType(Constants.lookup(ext, exts, ""), indx)
+        edit.filecontents = data
+        self.journal.reset(edit)
+        self.watch()
+
+    @staticmethod
+    def readFile(fileName):
+        """Read a file from disk.
+
+        Args:
+            fileName (str): The file to read.
+
+        Returns:
+            A tuple (text, encoding, linesep), where all line separators of the
+            text are converted to '\\n'.
+
+        Raises:
+            IOError: When the file cannot be read or decoded.
+        """
+        # Read the file in one go; the encoding is only guessed from a sample
+        read = IOHandler.read_text(fileName)
+        if read is None:
+            raise IOError("Cannot decode the contents of this file as text.")
+        data, et = read
+
+        # Detect line separator
+        if "\r\n" in data:
+            linesep = '\r\n'
+        elif "\n" in data:
+            linesep = '\n'
+        elif "\r" in data:
+            linesep = '\r'
+        else:
+            linesep = os.linesep
+        if linesep != '\n':
+            data = data.replace(linesep, "\n")
+        return data, et, linesep
+
+    def watch(self):
+        """Watch the files of all open tabs for changes by other programs."""
+        files = {self.editor(i).filename for i in range(self.files.count())}
+        files = {fn for fn in files if fn != "" and os.path.isfile(fn)}
+        watched = set(self.watcher.files())
+        if len(watched - files) > 0:
+            self.watcher.removePaths(list(watched - files))
+        if len(files - watched) > 0:
+            self.watcher.addPaths(list(files - watched))
+
+    def fileChanged(self, fileName):
+        # Files are often written in multiple steps, hence the reload is delayed
+        self.changedFiles.add(fileName)
+        self.reloadTimer.start()
+
+    def reloadChanged(self):
+        """Reload the open files that were changed by other programs.
+
+        Only the lines that differ are replaced, such that the cursor, the scroll
+        position and the undo history of the editors are kept.
+        """
+        if len(self.writing) > 0 or self.loading():
+            # Our own saves are noticed as well; wait until they are processed
+            self.reloadTimer.start()
+            return
+        changed, self.changedFiles = self.changedFiles, set()
+        for i in range(self.files.count()):
+            edit = self.editor(i)
+            if edit.filename not in changed or edit.wrapper.pending is not None or not os.path.isfile(edit.filename):
+                continue
+            try:
+                data, et, linesep = self.readFile(edit.filename)
+            except IOError:
+                continue
+            if data != edit.filecontents:
+                if data != edit.toPlainText():
+                    if edit.isSaved() or self.question("File Changed", "The file '%s' was changed by another "
+                                                       "program.\nDo you want to reload it? All unsaved changes "
+                                                       "will be lost." % edit.filename):
+                        edit.reloadText(data)
+                        idx = edit.wrapper.encoding.findData(et)
+                        if idx != -1:
+                            edit.wrapper.encoding.setCurrentIndex(idx)
+                        edit.wrapper.statusBar.setLineSep(linesep)
+                edit.filecontents = data
+            # The journal refers to the old modification time and size of the file
+            self.journal.rebase(edit)
+        self.updateTitle()
+        self.watch()
 
     def openFile(self, fileName, ignoreopen=False):
         self.lockDisplay()
@@ -493,26 +787,82 @@ class MainWindow(QtWidgets.QMainWindow):
         if editor is not None and editor.filename == "":
             self.saveAs()
         elif editor is not None:
-            contents = editor.toPlainText()
-            contents = contents.replace("\n", editor.wrapper.linesep.currentData())
-            try:
-                bc = bytes(contents, editor.wrapper.encoding.currentData())
-                with open(editor.filename, 'wb') as myfile:
-                    myfile.write(bc)
-                editor.save()
-                self.updateTitle()
-            except Exception as e:
-                self.error("Error", str(e))
-        if editor is not None:
-            editor.stoppedTyping()
+            self.write(editor)
 
     def saveAll(self):
         old = self.files.currentIndex()
         for idx in range(self.files.count()):
-            self.changeTab(idx)
-            self.save()
+            editor = self.files.widget(idx).editor
+            if editor.wrapper.pending is not None or editor.isSaved():
+                continue
+            if editor.filename == "":
+                self.changeTab(idx)
+                self.saveAs()
+            else:
+                self.write(editor)
         self.changeTab(old)
 
+    def write(self, editor):
+        """Save the contents of an editor in a background thread.
+
+        Args:
+            editor (CodeEditor):    The editor to save.
+        """
+        if editor in self.writing:
+            # Save again once the current write has finished
+            self.writing[editor] = True
+            return
+        self.writing[editor] = False
+        text = editor.toPlainText()
+        fileName = editor.filename
+        encoding = editor.wrapper.encoding.currentData()
+        linesep = editor.wrapper.linesep.currentData()
+
+        def task():
+            try:
+                IOHandler.write_text(fileName, text, encoding, linesep)
+                return None
+            except Exception as e:
+                return e
+
+        future = self.writer.submit(task)
+        future.add_done_callback(lambda f: self.written.put((editor, fileName, text, f.result())))
+        self.writeTimer.start()
+        self.updateStatus("Saving %s..." % fileName)
+
+    def drainWrites(self, wait=False):
+        """Process the saves that have finished.
+
+        Args:
+            wait (bool):    When True, wait until all saves have finished.
+                            Defaults to False.
+        """
+        errors = []
+        while len(self.writing) > 0:
+            try:
+                editor, fileName, text, error = self.written.get(wait)
+            except queue.Empty:
+                break
+            again = self.writing.pop(editor, False)
+            if error is not None:
+                # The document stays unsaved, but a queued save may still succeed
+                errors.append(str(error))
+            else:
+                if editor.filename == fileName:
+                    editor.save(text)
+                    self.journal.rebase(editor)
+                self.updateStatus("Saved %s" % fileName)
+            if again:
+                self.write(editor)
+        self.writeTimer.stop()
+        self.updateTitle()
+        self.watch()
+        if len(errors) > 0:
+            # The dialog is modal, so the timer may only drain again once it is closed
+            self.error("Error", "<br/>".join(errors))
+        if len(self.writing) > 0:
+            self.writeTimer.start()
+
     def saveAs(self):
         options, folder = self.io()
         fileName, t = QtWidgets.QFileDialog\
@@ -601,12 +951,20 @@ class MainWindow(QtWidgets.QMainWindow):
             idx = old
         else:
             self.changeTab(idx)
+        if self.editor() in self.writing:
+            self.drainWrites(True)
         close = True
         if not self.editor().isSaved():
             close = self.question("Unsaved Changes", "It appears there are some unchanged changes in this file.\n"
                                                      "Are you sure you want to close it? All changes will be lost.")
         if close:
+            self.symbols.discard(self.files.widget(idx).editor)
+            self.journal.untrack(self.files.widget(idx).editor)
+            self.renderTimes.pop(self.files.widget(idx).editor, None)
+            if self.focusKey is not None and self.focusKey[0] is self.files.widget(idx).editor:
+                self.focus = self.focusKey = None
             self.files.removeTab(idx)
+            self.watch()
         if old >= self.files.count():
             old = self.files.count() - 1
         if old == -1:
@@ -618,13 +976,22 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def forceDisplay(self):
         if self.canDisplay():
-            res = self.displayGraph()
+            res = self.displayGraph(True)
             if res is not None and len(res) > 0:
                 self.error("Error", res)
         else:
             self.error("Cannot Render", "A process is currently trying to render the graph, please wait.")
 
-    def displayGraph(self):
+    def displayGraph(self, report=False):
+        """Start rendering the graph of the current editor in the background.
+
+        Args:
+            report (bool):  When True, an error of the render is shown in a dialog.
+                            Defaults to False.
+
+        Returns:
+            An error message if the render could not be started, None otherwise.
+        """
         if self.canDisplay() and self.editor() is not None:
             ename = self.editorWrapper().engine.currentText()
             try:
@@ -635,15 +1002,186 @@ class MainWindow(QtWidgets.QMainWindow):
                     raise RuntimeError("Unknown rendering engine '%s'." % ename)
                 res = self.editor().convert(ename)
                 if res is not None:
-                    bdata = engine["convert"](res)
-                    self.view.clear()
-                    self.view.add(bdata)
+                    tree = self.editor().highlighter.parser.tree
+                    if self.action_Focus_On_Cursor.isChecked() and tree is not None:
+                        res, sources = self.focusOn(tree, res)
+                    else:
+                        sources = {} if tree is None else sourcePositions(tree)
+                    self.render(engine, res, sources, report)
             except Exception as e:
                 print(str(e), file=sys.stderr)
                 self.updateStatus(str(e))
                 return str(e)
         return None
 
+    def render(self, engine, text, sources, report=False):
+        """Render a graph in the background, replacing all renders that are still busy.
+
+        For graphs that are slow to render, a quick draft is shown first if the engine
+        supports this. The final render replaces the draft once it is done.
+
+        Args:
+            engine (dict):  The rendering engine.
+            text (str):     The text to render.
+            sources (dict): The statements of the graph, see sourcePositions.
+            report (bool):  When True, an error of the final render is shown in a dialog.
+        """
+        self.renderGeneration += 1
+        generation = self.renderGeneration
+        killOutdated()
+        editor = self.editor()
+        last = self.renderTimes.get(editor, None)
+        phases = [(True, engine["convert"])]
+        if "draft" in engine and ((last is None and len(text) > DRAFT_SIZE) or (last or 0) > DRAFT_TIME):
+            phases.insert(0, (False, engine["draft"]))
+
+        for final, convert in phases:
+            def task(final=final, convert=convert):
+                if generation != self.renderGeneration:
+                    return generation, editor, final, None, None, None, sources, report  # Skip outdated renders
+                start = time.perf_counter()
+                try:
+                    with job(lambda: generation == self.renderGeneration):
+                        bdata, error = convert(text), None
+                except Exception as e:
+                    bdata, error = None, str(e)
+                return generation, editor, final, bdata, error, time.perf_counter() - start, sources, report
+
+            self.renderPending += 1
+            future = self.renderer.submit(task)
+            future.add_done_callback(lambda f: self.renders.put(f.result()))
+        self.renderTimer.start()
+
+    def drainRenders(self):
+        """Show the renders that have finished."""
+        errors = []
+        while True:
+            try:
+                generation, editor, final, bdata, error, elapsed, sources, report = self.renders.get_nowait()
+            except queue.Empty:
+                break
+            self.renderPending -= 1
+            if final and elapsed is not None:
+                self.renderTimes[editor] = elapsed
+            # A draft that finishes after its final render is not shown anymore
+            if generation != self.renderGeneration or self.renderShown == generation or editor is not self.editor():
+                continue
+            if error is not None:
+                if final:
+                    print(error, file=sys.stderr)
+                    self.updateStatus(error)
+                    if report:
+                        errors.append(error)
+                continue
+            if bdata is None:
+                continue
+            self.view.setGraph(bdata)
+            self.sources = sources
+            if final:
+                self.renderShown = generation
+                if self.renderDraft == generation:
+                    self.updateStatus("")
+            else:
+                self.renderDraft = generation
+                self.updateStatus("Showing a draft; rendering the final graph...")
+        self.renderTimer.stop()
+        if len(errors) > 0:
+            # The dialog is modal, so the timer may only drain again once it is closed
+            self.error("Error", "<br/>".join(errors))
+        if self.renderPending > 0:
+            self.renderTimer.start()
+
+    def cursorIndex(self, edit):
+        """Get the position of the cursor of an editor as an index in its (Python) text."""
+        pos = edit.textCursor().position()
+        text = edit.toPlainText()
+        if text.isascii():
+            return pos
+        return len(text.encode("utf-16-le")[:2 * pos].decode("utf-16-le", "ignore"))
+
+    def focusOn(self, tree, text):
+        """Get the text to render in focus mode.
+
+        Args:
+            tree (Tree):    The parse tree of the current editor.
+            text (str):     The text that would be rendered otherwise.
+
+        Returns:
+            The neighbourhood of the node at the cursor (or of the last focused node),
+            or text when there is no such node, and the statements of the graph (see
+            sourcePositions).
+        """
+        edit = self.editor()
+        # The text is parsed again whenever the cursor moves, but the graph is only rebuilt after a change
+        key = (edit, edit.document().revision())
+        if self.focusKey != key:
+            self.focus = FocusGraph(tree, edit.toPlainText())
+            self.focusSources = sourcePositions(tree)
+            self.focusKey = key
+        node = self.focus.nodeAt(self.cursorIndex(edit))
+        if node is None and self.focusNode in self.focus:
+            node = self.focusNode
+        self.focusNode = node
+        if node is None:
+            return text, self.focusSources
+        return self.focus.extract(node), self.focusSources
+
+    def refocus(self):
+        """Render the neighbourhood of the node at the cursor, when it differs from the shown one."""
+        edit = self.editor()
+        if not self.action_Focus_On_Cursor.isChecked() or edit is None or not self.canDisplay():
+            return
+        # After a change, the graph is rendered anyway once the text is parsed again
+        if self.focusKey != (edit, edit.document().revision()):
+            return
+        node = self.focus.nodeAt(self.cursorIndex(edit))
+        engine = pluginloader.getEngines().get(self.editorWrapper().engine.currentText(), None)
+        if node is None or node == self.focusNode or engine is None:
+            return
+        self.focusNode = node
+        self.render(engine, self.focus.extract(node), self.focusSources)
+
+    def elementSpan(self, key):
+        """Get the (start, end) position in the editor of the statement of a rendered element, or None."""
+        spans = self.sources.get(key[:2], [])
+        edit = self.editor()
+        if len(spans) == 0 or edit is None:
+            return None
+        # The n-th of multiple edges between the same nodes stems from the n-th statement
+        start, end = spans[min(key[2], len(spans)) - 1] if key[0] == "edge" else spans[0]
+        # Lark counts characters, while the editor counts UTF-16 code units
+        text = edit.toPlainText()
+        size = edit.document().characterCount() - 1
+        charStart = start
+        start = len(text[:charStart].encode("utf-16-le")) // 2
+        end = start + len(text[charStart:end].encode("utf-16-le")) // 2
+        return min(start, size), min(end, size)
+
+    def goToElement(self, key):
+        """Select the statement that defines a node, edge or cluster of the rendered graph."""
+        span = self.elementSpan(key)
+        if span is None:
+            return
+        edit = self.editor()
+        curs = edit.textCursor()
+        curs.setPosition(span[0])
+        curs.setPosition(span[1], QtGui.QTextCursor.MoveMode.KeepAnchor)
+        edit.setTextCursor(curs)
+        edit.centerCursor()
+        edit.setFocus()
+
+    def showElement(self, key, pos):
+        """Show the statements of a node, edge or cluster of the rendered graph in a tooltip."""
+        if key is None or key[:2] not in self.sources:
+            QtWidgets.QToolTip.hideText()
+            return
+        text = self.editor().toPlainText()
+        lines = ["%s %s" % key[:2]]
+        for start, end in self.sources[key[:2]][:5]:
+            stmt = " ".join(text[start:end].split())
+            lines.append(stmt if len(stmt) <= 100 else stmt[:97] + "...")
+        QtWidgets.QToolTip.showText(pos, "\n".join(lines), self.view)
+
     def openSnippets(self):
         self.snippets.exec_()
 
@@ -652,8 +1190,15 @@ class MainWindow(QtWidgets.QMainWindow):
         if sel != "":
             self.find.le_find.setText(sel)
             self.find.le_replace.setText("")
+        self.find.setEditor(self.editor())
         self.find.show()
 
+    def findAll(self):
+        sel = self.editor().textCursor().selectedText()
+        if sel != "":
+            self.findInFiles.le_find.setText(sel)
+        self.findInFiles.show()
+
     def transform(self, func, to):
         self.lockDisplay()
         editor = self.editor()
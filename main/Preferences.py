@@ -156,7 +156,7 @@ class Preferences(QtWidgets.QDialog):
         self.shortcuts = [
             "New", "Open", "Clear_Recents", "Save", "Save_As", "Save_All", "Export", "Preferences", "Close_File",
             "Exit", "Undo", "Redo", "Select_All", "Clear", "Delete", "Copy", "Cut", "Paste", "Duplicate", "Comment",
-            "Indent", "Unindent", "Auto_Indent", "Find", "Autocomplete", "Show_Render_Area", "Snippets", "Next_File",
+            "Indent", "Unindent", "Auto_Indent", "Find", "Find_In_Files", "Autocomplete", "Show_Render_Area", "Snippets", "Next_File",
             "Previous_File", "Render", "Save_Rendered_View", "View_Parse_Tree", "Zoom_In", "Zoom_Out", "Reset_Zoom",
             "Zoom_To_Fit", "GraphDonkey", "Qt", "Move_Up", "Move_Down", "Updates", "Report_Issue"
         ]
@@ -284,6 +284,7 @@ class Preferences(QtWidgets.QDialog):
             self.ks_move_up.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/move_up", "CTRL+SHIFT+UP")))
             self.ks_move_down.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/move_down", "CTRL+SHIFT+DOWN")))
             self.ks_find.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/find", "CTRL+F")))
+            self.ks_find_in_files.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/find_in_files", "CTRL+SHIFT+F")))
             self.ks_autocomplete.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/autocomplete", "CTRL+SPACE")))
             self.ks_show_render_area.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/show_render_area", "")))
             self.ks_render.setKeySequence(QtGui.QKeySequence(self.preferences.value("ks/render", "CTRL+R")))
@@ -421,6 +422,7 @@ class Preferences(QtWidgets.QDialog):
             self.preferences.setValue("ks/move_up", self.ks_move_up.keySequence().toString())
             self.preferences.setValue("ks/move_down", self.ks_move_down.keySequence().toString())
             self.preferences.setValue("ks/find", self.ks_find.keySequence().toString())
+            self.preferences.setValue("ks/find_in_files", self.ks_find_in_files.keySequence().toString())
             self.preferences.setValue("ks/autocomplete", self.ks_autocomplete.keySequence().toString())
             self.preferences.setValue("ks/show_render_area", self.ks_show_render_area.keySequence().toString())
             self.preferences.setValue("ks/snippets", self.ks_snippets.keySequence().toString())
@@ -485,63 +487,63 @@ class Preferences(QtWidgets.QDialog):
         view.setMaxZoomLevel(float(self.num_zoom_level_max.value()) / 100)
         view.setZoomFactorBase(self.num_zoom_factor.value())
 
-    def applyEditor(self):
-        self.parent().files.setTabBarAutoHide(self.check_autohide.isChecked())
-        for index in range(self.parent().files.count()):
-            editor = self.parent().editor(index)
+    def applyEditor(self, editors=None):
+        """Apply the editor preferences.
+
+        Only the settings that changed since they were last applied to an
+        editor are updated, such that the open documents are not reloaded.
 
+        Args:
+            editors (list): The editors to apply the preferences to. Defaults to
+                            None (all open editors).
+        """
+        self.parent().files.setTabBarAutoHide(self.check_autohide.isChecked())
+        if editors is None:
+            editors = [self.parent().editor(index) for index in range(self.parent().files.count())]
+
+        font = QtGui.QFont()
+        font.setFamily(self.font_editor.currentFont().family())
+        font.setFixedPitch(self.check_monospace.isChecked())
+        font.setPointSize(self.num_font_editor.value())
+        fontWidth = QtGui.QFontMetrics(font).averageCharWidth()
+        state = {
+            "whitespace": self.check_showWhitespace.isChecked(),
+            "font": font.toString(),
+            "tabs": self.num_tabwidth.value() * fontWidth,
+            "theme": tuple((key, self.preferences.value(key)) for key in self.preferences.allKeys()
+                           if key.startswith("col/") or key == "editor/syntaxHighlighting")
+        }
+
+        for editor in editors:
             # SET FILE TYPES AND ENGINES
             editor.wrapper.setTypes()
 
+            old = editor.appliedPreferences
+            changed = {key for key in state if old.get(key) != state[key]}
+            editor.appliedPreferences = state
+
             # SHOW WHITESPACES
-            option = editor.document().defaultTextOption()
-            if self.check_showWhitespace.isChecked():
-                option.setFlags(option.flags() | QtGui.QTextOption.Flag.ShowTabsAndSpaces | QtGui.QTextOption.Flag.ShowLineAndParagraphSeparators)
-            else:
-                option.setFlags(option.flags() & ~QtGui.QTextOption.Flag.ShowTabsAndSpaces & ~QtGui.QTextOption.Flag.ShowLineAndParagraphSeparators)
-            editor.document().setDefaultTextOption(option)
+            if "whitespace" in changed:
+                option = editor.document().defaultTextOption()
+                if state["whitespace"]:
+                    option.setFlags(option.flags() | QtGui.QTextOption.Flag.ShowTabsAndSpaces | QtGui.QTextOption.Flag.ShowLineAndParagraphSeparators)
+                else:
+                    option.setFlags(option.flags() & ~QtGui.QTextOption.Flag.ShowTabsAndSpaces & ~QtGui.QTextOption.Flag.ShowLineAndParagraphSeparators)
+                editor.document().setDefaultTextOption(option)
 
             # FONT
-            font = QtGui.QFont()
-            font.setFamily(self.font_editor.currentFont().family())
-            font.setFixedPitch(self.check_monospace.isChecked())
-            font.setPointSize(self.num_font_editor.value())
-            editor.setFont(font)
+            if "font" in changed:
+                editor.setFont(font)
 
             # TAB WIDTH
-            fontWidth = QtGui.QFontMetrics(font).averageCharWidth()
-            editor.setTabStopDistance(self.num_tabwidth.value() * fontWidth)
+            if "tabs" in changed:
+                editor.setTabStopDistance(state["tabs"])
 
             # FIX DISPLAY
-            editor.positionChangedSlot()
-            editor.highlighter.rehighlight()
-
-            # TURN TABS TO SPACES AND VICE VERSA
-            cursor = editor.textCursor()
-            seltxt = cursor.selectedText()
-            cstart = cursor.selectionStart()
-            cend = cursor.selectionEnd()
-            cursor.setPosition(0)
-            cursor.setPosition(cstart, QtGui.QTextCursor.MoveMode.KeepAnchor)
-            before = cursor.selectedText()
-            tw = self.num_tabwidth.value()
-            txt = editor.toPlainText()
-            if self.check_spaceTabs.isChecked():
-                e = "\t"
-                b4 = before.count(e) * (tw - 1)
-                cstart += b4
-                cend += seltxt.count(e) * (tw - 1) + b4
-                txt = txt.replace(e, " " * tw)
-            else:
-                e = " " * tw
-                b4 = before.count(e) * (tw - 1)
-                cstart -= b4
-                cend -= seltxt.count(e) * (tw - 1) + b4
-                txt = txt.replace(e, "\t")
-            editor.setText(txt)
-            cursor.setPosition(cstart)
-            cursor.setPosition(cend, QtGui.QTextCursor.MoveMode.KeepAnchor)
-            editor.setTextCursor(cursor)
+            if "theme" in changed and len(old) > 0:
+                editor.highlighter.rehighlight()
+            if len(changed) > 0:
+                editor.positionChangedSlot(True)
 
     def applyPlugins(self):
         pll = self.pluginlist.findChildren(PluginButton)
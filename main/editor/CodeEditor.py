@@ -20,12 +20,60 @@ from main.editor.Highlighter import BaseHighlighter
 from main.extra.GraphicsView import GraphicsView
 from main.Preferences import bool
 from main.plugins import PluginLoader
-from main.editor.Intellisense import Types, ICONS
-import os
+from main.editor.Intellisense import Types, CompletionModel
+from main.editor.Selections import SelectionManager, visibleRange, inRange
+from main.extra.Threading import UpdateScheduler
+from main.FindReplace import replaceInEditor, template
+import os, bisect, difflib
 
 pluginloader = PluginLoader.instance()
 Config = IOHandler.get_preferences()
 
+# Amount of characters that are inserted at once when loading a large text
+CHUNK_SIZE = 1 << 20
+
+
+def splitLines(text):
+    """Split a text in lines, which keep their line endings."""
+    parts = text.split("\n")
+    res = [part + "\n" for part in parts[:-1]]
+    if parts[-1] != "":
+        res.append(parts[-1])
+    return res
+
+
+def lineDiff(old, new):
+    """Obtain the lines that differ between two texts.
+
+    Args:
+        old (str):  The original text.
+        new (str):  The new text.
+
+    Returns:
+        A list of (start, end, text) tuples, sorted by start. Each tuple indicates
+        that the range [start, end) of the original text must be replaced by text.
+        All positions are expressed in UTF-16 code units, like in a QTextDocument.
+    """
+    a = splitLines(old)
+    b = splitLines(new)
+    # Most changes only touch a small part of a file, hence the common lines at
+    # the start and the end are skipped before the actual diff
+    pre = 0
+    while pre < len(a) and pre < len(b) and a[pre] == b[pre]:
+        pre += 1
+    post = 0
+    while post < len(a) - pre and post < len(b) - pre and a[-1 - post] == b[-1 - post]:
+        post += 1
+    offsets = [0]
+    for line in a[:len(a) - post]:
+        offsets.append(offsets[-1] + len(line.encode("utf-16-le")) // 2)
+    res = []
+    matcher = difflib.SequenceMatcher(None, a[pre:len(a) - post], b[pre:len(b) - post])
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            res.append((offsets[pre + i1], offsets[pre + i2], "".join(b[pre + j1:pre + j2])))
+    return res
+
 class StatusBar(QtWidgets.QStatusBar):
     def __init__(self, wrapper, parent=None):
         super(StatusBar, self).__init__(parent)
@@ -48,6 +96,7 @@ class StatusBar(QtWidgets.QStatusBar):
 
         self.encCombo = QtWidgets.QComboBox()
         self.encCombo.addItem("UTF-8", "utf-8")
+        self.encCombo.addItem("UTF-8-SIG", "utf-8-sig")
         self.encCombo.addItem("UTF-16", "utf-16")
         self.encCombo.addItem("ASCII", "ascii")
         self.encCombo.addItem("ISO-8859-1", "latin1")
@@ -86,6 +135,12 @@ class EditorWrapper(QtWidgets.QWidget):
         self.linesep = self.statusBar.leCombo
         self.encoding = self.statusBar.encCombo
 
+        # Cursor of a restored tab whose file has not been loaded yet
+        self.pending = None
+        # The file of a restored tab, as read in the background (see MainWindow.prefetch)
+        self.prefetched = None
+        self.reading = False
+
         self._layout.setContentsMargins(0, 0, 0, 0)
         self._layout.addWidget(self.editor, 0, 0, 1, -1)
         self.filetype.currentIndexChanged.connect(self.alter)
@@ -93,7 +148,12 @@ class EditorWrapper(QtWidgets.QWidget):
         self.setLayout(self._layout)
 
     def setTypes(self):
-        self.types = pluginloader.getFileTypes()
+        types = pluginloader.getFileTypes()
+        names = [types[t][0] for t in types]
+        if names == [self.filetype.itemText(i) for i in range(self.filetype.count())]:
+            self.types = types
+            return
+        self.types = types
         txt = self.filetype.currentText()
         self.filetype.clear()
         for type in self.types:
@@ -119,11 +179,14 @@ class EditorWrapper(QtWidgets.QWidget):
 
 
 class CodeEditor(QtWidgets.QPlainTextEdit):
+    savedChanged = QtCore.pyqtSignal("bool")
+
     def __init__(self, parent=None):
         super(CodeEditor, self).__init__(parent)
         self.mainwindow = parent.parent()
         self.wrapper = parent
         self.lineNumberArea = LineNumberArea(self)
+        self.updates = UpdateScheduler(self)
 
         self.undoAvailable.connect(self.mainwindow.setUndoEnabled)
         self.redoAvailable.connect(self.mainwindow.setRedoEnabled)
@@ -133,17 +196,38 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         self.cursorPositionChanged.connect(self.positionChangedSlot)
         self.textChanged.connect(self.textChangedSlot)
 
+        self.matches = []
+        self.errors = []
+
+        self.selections = SelectionManager(self)
+        self.selections.register("line", self._lineSelections,
+                                 lambda: (bool(Config.value("editor/highlightCurrentLine")), self.isReadOnly(),
+                                          self.textCursor().position()))
+        self.selections.register("brackets", self._bracketSelections,
+                                 lambda: (bool(Config.value("editor/parentheses")), self.textCursor().position(),
+                                          self.document().revision()))
+        self.selections.register("matches", self._matchSelections,
+                                 lambda: (id(self.matches), len(self.matches), *visibleRange(self, 5)))
+        self.selections.register("errors", self._errorSelections,
+                                 lambda: (bool(Config.value("editor/useParser", True)), id(self.errors),
+                                          len(self.errors), *visibleRange(self, 5)))
+
         self.updateLineNumberAreaWidth()
         self.highlightCurrentLine()
         self.highlighter = BaseHighlighter(self.document(), self)
 
-        self.matches = []
-        self.errors = []
-
         self.setMouseTracking(True)
 
         self.filename = ""
-        self.filecontents = ""
+        self.appliedPreferences = {}
+        self._filecontents = ""
+        self._filehash = hash("")
+        self._filelength = 0
+        self._cleanMatches = True
+        self._savedKey = None
+        self.saved = True
+        self.loading = False  # True while a large text is inserted by loadText
+        self.document().modificationChanged.connect(lambda m: self.checkSaved())
 
         self.completer = None
         self.setCompleter()
@@ -154,6 +238,14 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         self.stTimer = QtCore.QTimer(self)
         self.stTimer.setSingleShot(True)
         self.stTimer.timeout.connect(self.stoppedTyping)
+        self.parsePending = False
+
+        # Cursor movements are coalesced into a single update per event-loop iteration
+        self.updates.register("reparse", lambda: self.stTimer.start(int(Config.value("editor/autoreparse", 100))))
+        self.updates.register("selections", self.selections.update, budget=8)
+        self.updates.register("indicator", self.updateIndicator, self.indicatorState)
+        self.updates.register("symbols", self.publishSymbols, budget=8)
+        self.verticalScrollBar().valueChanged.connect(lambda v: self.updates.mark("selections"))
 
     def textChangedSlot(self):
         txt = self.toPlainText()
@@ -167,6 +259,7 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
             if len(curs.selectedText()) == 0:
                 curs.movePosition(QtGui.QTextCursor.MoveOperation.PreviousCharacter)
                 self.setTextCursor(curs)
+        self.checkSaved()
 
     def alter(self, highlighter):
         self.highlighter.deleteLater()
@@ -178,19 +271,29 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
                                                line=curs.block().blockNumber() + 1, col=curs.columnNumber())
 
     def stoppedTyping(self):
+        if not self.isVisible():
+            # Tabs in the background are only parsed once they are shown
+            self.parsePending = True
+            return
+        self.parsePending = False
         self.highlighter.storeErrors()
+        self.updates.mark("symbols")
         if bool(Config.value("editor/useParser", True)):
             self.highlightErrors()
 
-    def positionChangedSlot(self):
-        self.stTimer.start(int(Config.value("editor/autoreparse", 100)))
-        if bool(Config.value("editor/highlightCurrentLine")):
-            self.highlightCurrentLine()
-        if bool(Config.value("editor/parentheses")):
-            self.matchBrackets()
-        self.highlightMatches()
-        self.updateIndicator()
-        self.mainwindow.updateTitle()
+    def publishSymbols(self):
+        """Share the symbols of the last parse with the other tabs."""
+        symbols = self.highlighter.parser.visitor.completer.sources.get("parse", {})
+        self.mainwindow.symbols.publish(self, self.wrapper.filetype.currentText(), symbols)
+
+    def positionChangedSlot(self, force=False):
+        if force:
+            self.selections.invalidate()
+        self.updates.mark("reparse", "selections", "indicator", force=force)
+
+    def indicatorState(self):
+        curs = self.textCursor()
+        return curs.position(), curs.anchor(), curs.blockNumber(), curs.columnNumber()
 
     def lineNrChanged(self):
         self.updateLineNumberAreaWidth()
@@ -209,17 +312,67 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         menu.addAction(self.mainwindow.action_Select_All)
         menu.exec(event.globalPos())
 
+    @property
+    def filecontents(self):
+        """The contents of the file as they were last loaded or saved."""
+        return self._filecontents
+
+    @filecontents.setter
+    def filecontents(self, text):
+        self._filecontents = text
+        self._filehash = hash(text)
+        self._filelength = len(text.encode("utf-16-le")) // 2
+        self._cleanMatches = False
+
     def isSaved(self):
-        """Returns True if the file was saved."""
-        txt = self.toPlainText()
+        """Returns True if the file was saved.
+
+        The result is cached for each document revision, hence this can be
+        called on every cursor move without copying the document.
+        """
+        key = (self.document().revision(), self.document().isModified(), self.filename, self._filehash)
+        if key != self._savedKey:
+            self._savedKey = key
+            self.saved = self._computeSaved()
+        return self.saved
+
+    def _computeSaved(self):
+        doc = self.document()
+        size = doc.characterCount() - 1
         if self.filename != "":
-            return txt == self.filecontents
+            if self._cleanMatches and not doc.isModified():
+                return True
+            if size != self._filelength:
+                return False
+            return hash(self.toPlainText()) == self._filehash
+        if size > len(os.linesep):
+            return False
+        txt = self.toPlainText()
         if bool(Config.value("editor/emptyline")):
             txt = txt[:-len(os.linesep)]
         return txt == ""
 
-    def save(self):
-        self.filecontents = self.toPlainText()
+    def checkSaved(self):
+        """Emits savedChanged iff the saved state flipped since the last check."""
+        old = self.saved
+        if self.isSaved() != old:
+            self.savedChanged.emit(self.saved)
+
+    def save(self, contents=None):
+        """Mark the editor as saved.
+
+        Args:
+            contents (str): The text that was written to the file. Defaults to
+                            None (the current text).
+        """
+        text = self.toPlainText()
+        if contents is None:
+            contents = text
+        self.filecontents = contents
+        if contents == text:
+            self.document().setModified(False)
+            self._cleanMatches = True
+        self.checkSaved()
         if self.treeView is not None and self.treeView.isVisible():
             self.viewParseTree(False)
 
@@ -229,7 +382,12 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
 
     def clearFile(self):
         self.filename = ""
-        self.filecontents = ""
+        self._filecontents = ""
+        self._filehash = hash("")
+        self._filelength = 0
+        self._cleanMatches = True
+        self._savedKey = None
+        self.saved = True
 
     def setCompleter(self):
         self.completer = QtWidgets.QCompleter(self)
@@ -239,20 +397,20 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         table.setShowGrid(False)
         table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
         self.completer.setPopup(table)
-        self.completer.setModel(QtGui.QStandardItemModel())
+        self.completer.setModel(CompletionModel(self.completer))
         self.completer.setFilterMode(QtCore.Qt.MatchFlag.MatchContains)
-        self.completer.setModelSorting(QtWidgets.QCompleter.ModelSorting.CaseInsensitivelySortedModel)
+        self.completer.setModelSorting(QtWidgets.QCompleter.ModelSorting.UnsortedModel)
         self.completer.setCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
         self.completer.setWrapAround(False)
         self.completer.setWidget(self)
         self.completer.setCompletionMode(QtWidgets.QCompleter.CompletionMode.UnfilteredPopupCompletion)
 
     def insertCompletion(self, completion):
-        comp, _ = self.highlighter.parser.visitor.completer.get(completion)
-        if len(comp) == 0:
+        data = self.highlighter.parser.visitor.completer.data(completion)
+        if data is None or data[1] is None:
             text = completion
         else: # In case of snippets, use the value (not the name)
-            text = comp[0][0] if comp[0][2] is None else comp[0][2]
+            text = data[1]
 
         cursor = self.textCursor()
         cursor.select(QtGui.QTextCursor.SelectionType.WordUnderCursor)
@@ -432,8 +590,125 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
         return QtWidgets.QPlainTextEdit.event(self, event)
 
     def setText(self, text):
+        self._cleanMatches = False
         self.document().setPlainText(text)
 
+    def loadText(self, text):
+        """Replace the contents of the editor, like setText. Large texts are
+        inserted in chunks, while a progress dialog is shown.
+
+        The highlighter is detached during the insertion, such that the whole
+        document is only highlighted once at the end.
+        """
+        if len(text) <= CHUNK_SIZE:
+            self.setText(text)
+            return
+        self._cleanMatches = False
+        self.loading = True
+        doc = self.document()
+        progress = QtWidgets.QProgressDialog("Loading %s..." % os.path.basename(self.filename), None, 0,
+                                             len(text), self.mainwindow)
+        progress.setWindowTitle("Loading File")
+        progress.setWindowModality(QtCore.Qt.WindowModality.ApplicationModal)
+        progress.setMinimumDuration(500)
+
+        # The editor's signals are blocked, such that the partial text is never parsed. While
+        #   events are processed, the editor is marked as loading, such that its partial text
+        #   is not used elsewhere either (see MainWindow.loading).
+        self.blockSignals(True)
+        self.highlighter.setDocument(None)
+        doc.setUndoRedoEnabled(False)
+        doc.clear()
+        cursor = QtGui.QTextCursor(doc)
+        try:
+            for start in range(0, len(text), CHUNK_SIZE):
+                cursor.insertText(text[start:start + CHUNK_SIZE])
+                progress.setValue(start)
+                QtWidgets.QApplication.processEvents()
+            doc.setUndoRedoEnabled(True)
+            progress.setLabelText("Highlighting %s..." % os.path.basename(self.filename))
+            progress.setRange(0, 0)
+            QtWidgets.QApplication.processEvents()
+            self.highlighter.setDocument(doc)
+            self.highlighter.rehighlight()
+        finally:
+            self.loading = False
+            self.blockSignals(False)
+        progress.close()
+        progress.deleteLater()
+        self.updateLineNumberAreaWidth()
+        self.viewport().update()
+        self.textChanged.emit()
+
+    def reloadText(self, text):
+        """Replace the contents of the editor by only altering the lines that differ.
+
+        All changes form a single undoable edit, hence the cursor, the scroll
+        position and the undo history are kept. Only the changed lines (and the
+        lines of which the global highlighting changed) are highlighted again.
+
+        Args:
+            text (str): The new contents.
+
+        Returns:
+            True iff the contents changed.
+        """
+        changes = lineDiff(self.toPlainText(), text)
+        if len(changes) == 0:
+            return False
+        self._cleanMatches = False
+        before = self.highlighter.allGlobalMatches()
+        hscroll = self.horizontalScrollBar().value()
+        vscroll = self.verticalScrollBar().value()
+
+        # The editor's signals are blocked, such that the line count change does not
+        # highlight the whole document again
+        self.blockSignals(True)
+        cursor = QtGui.QTextCursor(self.document())
+        moved = []
+        delta = sum([len(txt.encode("utf-16-le")) // 2 - (end - start) for start, end, txt in changes])
+        for start, end, txt in reversed(changes):
+            if len(moved) == 0:
+                cursor.beginEditBlock()
+            else:
+                cursor.joinPreviousEditBlock()
+            cursor.setPosition(start)
+            cursor.setPosition(end, QtGui.QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(txt)
+            cursor.endEditBlock()
+            size = len(txt.encode("utf-16-le")) // 2
+            delta -= size - (end - start)
+            moved.append((start, end, start + delta, start + delta + size))
+        self.blockSignals(False)
+        moved.reverse()
+
+        # Map the old global matches onto the new text and highlight the differences
+        starts = [m[0] for m in moved]
+
+        def move(pos, bias):
+            k = bisect.bisect_right(starts, pos) - 1
+            if k < 0:
+                return pos
+            start, end, nstart, nend = moved[k]
+            if pos <= end:
+                return nend if bias else nstart
+            return pos - end + nend
+
+        before = {(i, move(start, True), move(end, False)) for i, start, end in before}
+        after = self.highlighter.allGlobalMatches()
+        ranges = [(nstart, nend) for _, _, nstart, nend in moved]
+        ranges += [(min(start, end), max(start, end)) for _, start, end in before ^ after]
+        self.highlighter.rehighlightRanges(ranges)
+
+        self.horizontalScrollBar().setValue(hscroll)
+        self.verticalScrollBar().setValue(vscroll)
+        self.updateLineNumberAreaWidth()
+        self.viewport().update()
+        self.lineNumberArea.update()
+        self.textChanged.emit()
+        self.cursorPositionChanged.emit()
+        return True
+
     def mouseMoveEvent(self, event: QtGui.QMouseEvent):
         pos = event.pos()
         cursor = self.cursorForPosition(pos)
@@ -668,35 +943,20 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
 
         ctr = self.highlighter.parser.visitor.completer
 
-        # Reload the completion set
-        ctr.clear()
-        self.highlighter.storeErrors()
+        # The parse results are kept up-to-date by the reparse task
 
         tp = self.wrapper.filetype.currentText()
+        snippets = {}
         for p in pluginloader.get():
             snps = p.types.get(tp, {}).get("snippets", {})
             for n in snps:
-                ctr.add(n, Types.SNIPPET, snps[n])
+                snippets[n] = (Types.SNIPPET, snps[n])
         snps = self.mainwindow.snippets.snippets
         for n in snps.get(tp, {}):
-            ctr.add(n, Types.SNIPPET, snps[tp].get(n, None))
-        completions, prefix = ctr.get(prefix)
-
-        mdl = self.completer.model()
-        mdl.clear()
-        for px, ty, v in completions:
-            if px == prefix: continue
-            pth = [px.index(x) for x in prefix]
-            itc = "".join(["<b>%s</b>" % px[s] if s in pth else px[s] for s in range(len(px))])
-            ite = ""
-            if v is not None:
-                ite = "<div align='right'>%s&nbsp;</div>" % v
-            it = QtGui.QStandardItem(itc)
-            ico = ICONS[ty]
-            if ico is not None:
-                it.setIcon(ico)
-            it.setData(px, QtCore.Qt.ItemDataRole.UserRole)
-            mdl.appendRow([it, QtGui.QStandardItem(ite)])
+            snippets[n] = (Types.SNIPPET, snps[tp].get(n, None))
+        ctr.update("snippets", snippets)
+        completions, prefix = ctr.rank(prefix, others=lambda p: self.mainwindow.symbols.lookup(p, tp))
+        self.completer.model().setCompletions(completions)
 
         if len(completions) == 0:
             return
@@ -739,10 +999,39 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
     def caseTitle(self):
         self._changeText(lambda txt: txt.title())
 
+    def convertIndentation(self, spaces=None, width=None):
+        """Turn tabs into spaces or vice versa, as a single undo step.
+
+        Args:
+            spaces (bool):  When True, tabs become spaces. Otherwise, each run of
+                            width spaces becomes a tab. Defaults to None (the
+                            "spaces over tabs" preference).
+            width (int):    The amount of spaces in a tab. Defaults to None (the
+                            tab width preference).
+
+        Returns:
+            The amount of replacements.
+        """
+        if spaces is None:
+            spaces = bool(Config.value("editor/spacesOverTabs"))
+        if width is None:
+            width = int(Config.value("editor/tabwidth"))
+        if spaces:
+            regex, text = QtCore.QRegularExpression("\t"), " " * width
+        else:
+            regex, text = QtCore.QRegularExpression(" {%i}" % width), "\t"
+        return replaceInEditor(self, regex, template(text))
+
     def matchBrackets(self):
-        paired = pluginloader.getPairedBrackets(self.wrapper.filetype.currentText())
-        bopen = [x[0] for x in paired]
-        bclose = [x[1] for x in paired]
+        self.selections.update("brackets")
+
+    def bracketPositions(self):
+        """Get the (position, size) tuples of the bracket pair at the cursor."""
+        res = []
+        table = pluginloader.getBracketTable(self.wrapper.filetype.currentText())
+        paired = table.paired
+        bopen = table.opening
+        bclose = table.closing
 
         curs = self.textCursor()
         data = curs.block().userData()
@@ -764,8 +1053,8 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
                             j = curs.block().userData().indexOf(curs.positionInBlock())
                             opos = self.getOpeningBracketPos(paired[oidx], curs.block(), j - 1)
                             if info.pos == opos - pos:
-                                self.highlightBrackets(opos, len(paired[oidx][0]))
-                                self.highlightBrackets(cpos, len(paired[oidx][1]))
+                                res.append((opos, len(paired[oidx][0])))
+                                res.append((cpos, len(paired[oidx][1])))
                     if info.char in bclose:
                         opos = self.getOpeningBracketPos(paired[cidx], block, i - 1)
                         if opos >= 0:
@@ -773,17 +1062,17 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
                             j = curs.block().userData().indexOf(curs.positionInBlock())
                             cpos = self.getClosingBracketPos(paired[cidx], curs.block(), j + 1)
                             if info.pos == cpos - pos:
-                                self.highlightBrackets(cpos, len(paired[cidx][1]))
-                                self.highlightBrackets(opos, len(paired[cidx][0]))
+                                res.append((cpos, len(paired[cidx][1])))
+                                res.append((opos, len(paired[cidx][0])))
+        return res
 
-    def getOpeningBracketPos(self, pair, block, i, num=0):
+    @staticmethod
+    def _scanOpening(pair, block, i, num=0):
         data = block.userData()
-        infos = data.parenthesis
+        infos = [] if data is None else data.parenthesis
 
         docPos = block.position()
-        for j in range(i, -1, -1):
-            if len(infos) == 0:
-                break
+        for j in range(min(i, len(infos) - 1), -1, -1):
             info = infos[j]
 
             if info.char == pair[1] and pair[0] != pair[1]:
@@ -791,20 +1080,14 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
                 continue
             if info.char == pair[0]:
                 if num == 0:
-                    return docPos + info.pos
+                    return docPos + info.pos, num
                 num -= 1
+        return -1, num
 
-        block = block.previous()
-        if block.isValid():
-            return self.getOpeningBracketPos(pair, block, 0, num)
-
-        return -1
-
-    def getClosingBracketPos(self, pair, block, i, num=0):
-        if i < 0:
-            return -1
+    @staticmethod
+    def _scanClosing(pair, block, i, num=0):
         data = block.userData()
-        infos = data.parenthesis
+        infos = [] if data is None else data.parenthesis
 
         docPos = block.position()
         for j in range(i, len(infos)):
@@ -815,68 +1098,88 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
                 continue
             if info.char == pair[1]:
                 if num == 0:
-                    return docPos + info.pos
+                    return docPos + info.pos, num
                 num -= 1
+        return -1, num
 
-        block = block.next()
-        if block.isValid():
-            return self.getClosingBracketPos(pair, block, 0, num)
-
-        return -1
+    def getOpeningBracketPos(self, pair, block, i, num=0):
+        pos, num = self._scanOpening(pair, block, i, num)
+        if pos >= 0:
+            return pos
 
-    def highlightBrackets(self, pos, size=1):
-        selection = QtWidgets.QTextEdit.ExtraSelection()
-        selection.format.setBackground(QtGui.QColor(Config.value("col/clnb")))
-        selection.format.setForeground(QtGui.QColor(Config.value("col/clnf")))
+        index = self.highlighter.bracketIndex()
+        if pair not in index.table.paired:
+            return -1
+        bnr, num = index.findOpening(index.table.paired.index(pair), block.blockNumber(), num)
+        if bnr == -1:
+            return -1
+        block = self.document().findBlockByNumber(bnr)
+        return self._scanOpening(pair, block, len(block.userData().parenthesis) - 1, num)[0]
 
-        curs = self.textCursor()
-        curs.setPosition(pos)
-        curs.movePosition(QtGui.QTextCursor.MoveOperation.NextCharacter, QtGui.QTextCursor.MoveMode.KeepAnchor, size)
-        selection.cursor = curs
+    def getClosingBracketPos(self, pair, block, i, num=0):
+        if i < 0:
+            return -1
+        pos, num = self._scanClosing(pair, block, i, num)
+        if pos >= 0:
+            return pos
 
-        selections = self.extraSelections()
-        selections.append(selection)
-        self.setExtraSelections(selections)
+        index = self.highlighter.bracketIndex()
+        if pair not in index.table.paired:
+            return -1
+        bnr, num = index.findClosing(index.table.paired.index(pair), block.blockNumber() + 1, num)
+        if bnr == -1:
+            return -1
+        return self._scanClosing(pair, self.document().findBlockByNumber(bnr), 0, num)[0]
 
     def highlightMatches(self):
-        selections = self.extraSelections()
-
-        for start, end, _ in self.matches:
-            selection = QtWidgets.QTextEdit.ExtraSelection()
-            selection.format.setBackground(QtGui.QColor(Config.value("col/find")))
-
-            curs = self.textCursor()
-            curs.setPosition(start)
-            curs.setPosition(end, QtGui.QTextCursor.MoveMode.KeepAnchor)
-            selection.cursor = curs
-            selections.append(selection)
-
-        self.setExtraSelections(selections)
+        self.selections.update("matches")
 
     def highlightErrors(self):
-        selections = self.extraSelections()
-        for start, size, message in self.errors:
-            selection = QtWidgets.QTextEdit.ExtraSelection()
-            selection.format = BaseHighlighter.format_error()
-
-            curs = self.textCursor()
-            curs.setPosition(start)
-            curs.setPosition(start + size, QtGui.QTextCursor.MoveMode.KeepAnchor)
-            selection.cursor = curs
-            selections.append(selection)
-        self.setExtraSelections(selections)
+        self.selections.update("errors")
 
     def highlightCurrentLine(self):
-        selections = []
-        if not self.isReadOnly():
-            selection = QtWidgets.QTextEdit.ExtraSelection()
-            selection.format.setBackground(QtGui.QColor(Config.value("col/cline")))
-            selection.format.setProperty(QtGui.QTextFormat.Property.FullWidthSelection, True)
-            selection.cursor = self.textCursor()
-            selection.cursor.clearSelection()
-            selections.append(selection)
+        self.selections.update("line")
 
-        self.setExtraSelections(selections)
+    def _selection(self, fmt, start, end):
+        last = self.document().characterCount() - 1
+        selection = QtWidgets.QTextEdit.ExtraSelection()
+        selection.format = fmt
+        curs = self.textCursor()
+        curs.setPosition(min(start, last))
+        curs.setPosition(min(end, last), QtGui.QTextCursor.MoveMode.KeepAnchor)
+        selection.cursor = curs
+        return selection
+
+    def _bracketSelections(self):
+        if not bool(Config.value("editor/parentheses")):
+            return []
+        fmt = QtGui.QTextCharFormat()
+        fmt.setBackground(QtGui.QColor(Config.value("col/clnb")))
+        fmt.setForeground(QtGui.QColor(Config.value("col/clnf")))
+        return [self._selection(fmt, pos, pos + size) for pos, size in self.bracketPositions()]
+
+    def _matchSelections(self):
+        fmt = QtGui.QTextCharFormat()
+        fmt.setBackground(QtGui.QColor(Config.value("col/find")))
+        start, end = visibleRange(self, 5)
+        return [self._selection(fmt, s, e) for s, e, _ in inRange(self.matches, start, end)]
+
+    def _errorSelections(self):
+        if not bool(Config.value("editor/useParser", True)):
+            return []
+        fmt = BaseHighlighter.format_error()
+        start, end = visibleRange(self, 5)
+        return [self._selection(fmt, s, s + size) for s, size, _ in self.errors if s <= end and s + size >= start]
+
+    def _lineSelections(self):
+        if self.isReadOnly() or not bool(Config.value("editor/highlightCurrentLine")):
+            return []
+        selection = QtWidgets.QTextEdit.ExtraSelection()
+        selection.format.setBackground(QtGui.QColor(Config.value("col/cline")))
+        selection.format.setProperty(QtGui.QTextFormat.Property.FullWidthSelection, True)
+        selection.cursor = self.textCursor()
+        selection.cursor.clearSelection()
+        return [selection]
 
     def lineNumberAreaPaintEvent(self, event):
         self.verticalScrollBar().setSliderPosition(self.verticalScrollBar().sliderPosition())
@@ -918,8 +1221,14 @@ class CodeEditor(QtWidgets.QPlainTextEdit):
 
         return 13 + self.fontMetrics().maxWidth() * digits + self.lineNumberArea.offset
 
+    def showEvent(self, event):
+        QtWidgets.QPlainTextEdit.showEvent(self, event)
+        if self.parsePending:
+            self.stTimer.start(0)
+
     def resizeEvent(self, event):
         QtWidgets.QPlainTextEdit.resizeEvent(self, event)
+        self.updates.mark("selections")
         cr = self.contentsRect()
         self.lineNumberArea.setGeometry(QtCore.QRect(cr.left(), cr.top(), self.lineNumberAreaWidth(), cr.height()))
 
@@ -0,0 +1,240 @@
+"""Renders the neighbourhood of a single node of a DOT graph, instead of the whole graph.
+
+The edges of the graph are stored in a compact adjacency structure (in the
+CSR format), from which the nodes within a few hops of the focused node are
+extracted. The extracted subgraph is written as a new DOT graph, in which
+ghost stubs mark the edges that were cut off.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from main.editor.Parser import nodeName, nodeNames
+from lark import Token, Tree
+from collections import OrderedDict
+from array import array
+import bisect
+
+# The amount of hops from the focused node
+FOCUS_DEPTH = 2
+
+# The maximal amount of nodes in a neighbourhood; the edges to all other nodes are cut
+MAX_NODES = 500
+
+# The amount of neighbourhoods that are cached
+CACHE_SIZE = 16
+
+
+def quote(name):
+    return '"%s"' % name.replace('"', '\\"')
+
+
+class FocusGraph:
+    """The structure of a DOT graph, from which neighbourhoods can be extracted.
+
+    Subgraphs are flattened: only the node and edge statements (and their attributes)
+    and the attributes of the graph itself are kept. The statements are extracted in
+    their original order, such that default attributes only apply to the nodes and
+    edges that follow them.
+
+    Args:
+        tree (Tree):    The parse tree of the graph.
+        text (str):     The parsed text.
+    """
+    def __init__(self, tree, text):
+        self.tree = tree
+        self.ids = {}
+        self.names = []
+        self.nodeAttrs = {}
+        self.firstSeen = {}
+        self.stmtAttrs = []
+        self.stmtStarts = array("i")
+        self.tails = array("i")
+        self.heads = array("i")
+        self.stmts = array("i")
+        self.cache = OrderedDict()
+
+        graph = tree.children[0]
+        tokens = [str(c).lower() for c in graph.children if isinstance(c, Token)]
+        self.header = " ".join(tokens)
+        self.op = "->" if "digraph" in tokens else "--"
+        # The (start, text) of the attributes of the graph and the defaults of its nodes and edges
+        stmts = graph.children[-1].children[1].children
+        self.defaults = [(stmt.meta.start_pos, self.source(text, stmt)) for stmt in stmts
+                         if isinstance(stmt, Tree) and stmt.children[0].data in ["attr_stmt", "attr"]]
+
+        positions = []  # The (start, end, node) of each node_id
+        statements = []  # The (start, end, node) of each node and edge statement
+
+        def endpoint(tree):
+            if tree.data == "node_id":
+                node = self.node(nodeName(tree))
+                positions.append((tree.meta.start_pos, tree.meta.end_pos, node))
+                self.firstSeen.setdefault(node, tree.meta.start_pos)
+                return [node]
+            walk(tree.children[-1].children[1].children)
+            return [self.node(n) for n in nodeNames(tree)]
+
+        def walk(stmts):
+            for stmt in stmts:
+                stmt = stmt.children[0]
+                if stmt.data == "node_stmt":
+                    node = endpoint(stmt.children[0])[0]
+                    attrs = self.source(text, stmt.children[1]) if len(stmt.children) > 1 else ""
+                    self.nodeAttrs.setdefault(node, []).append((stmt.meta.start_pos, attrs))
+                    statements.append((stmt.meta.start_pos, stmt.meta.end_pos, node))
+                elif stmt.data == "edge_stmt":
+                    attrs = stmt.children[2] if len(stmt.children) > 2 else None
+                    self.stmtAttrs.append("" if attrs is None else self.source(text, attrs))
+                    self.stmtStarts.append(stmt.meta.start_pos)
+                    left = endpoint(stmt.children[0])
+                    if len(left) > 0:
+                        statements.append((stmt.meta.start_pos, stmt.meta.end_pos, left[0]))
+                    rhs = stmt.children[1]
+                    while rhs is not None:
+                        right = endpoint(rhs.children[1])
+                        for a in left:
+                            for b in right:
+                                self.tails.append(a)
+                                self.heads.append(b)
+                                self.stmts.append(len(self.stmtAttrs) - 1)
+                        left = right
+                        rhs = rhs.children[2] if len(rhs.children) > 2 else None
+                elif stmt.data == "subgraph":
+                    walk(stmt.children[-1].children[1].children)
+
+        walk(stmts)
+        positions.sort()
+        statements.sort()
+        self.positions = ([p[0] for p in positions], [p[1] for p in positions], [p[2] for p in positions])
+        self.statements = ([s[0] for s in statements], [s[1] for s in statements], [s[2] for s in statements])
+        self.buildAdjacency()
+
+    @staticmethod
+    def source(text, tree):
+        return text[tree.meta.start_pos:tree.meta.end_pos]
+
+    def node(self, name):
+        """Get the index of a node, adding it if it is new."""
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+        return self.ids[name]
+
+    def buildAdjacency(self):
+        """Store the edges of each node in the CSR format: the edges of node n are
+        self.edges[self.offsets[n]:self.offsets[n + 1]]."""
+        size = len(self.names)
+        self.offsets = array("i", bytes(4 * (size + 1)))
+        for a, b in zip(self.tails, self.heads):
+            self.offsets[a + 1] += 1
+            if a != b:
+                self.offsets[b + 1] += 1
+        for n in range(size):
+            self.offsets[n + 1] += self.offsets[n]
+        self.edges = array("i", bytes(4 * self.offsets[size]))
+        fill = array("i", self.offsets)
+        for e, (a, b) in enumerate(zip(self.tails, self.heads)):
+            self.edges[fill[a]] = e
+            fill[a] += 1
+            if a != b:
+                self.edges[fill[b]] = e
+                fill[b] += 1
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def nodeAt(self, position):
+        """Get the name of the node at a position in the parsed text, or None.
+
+        When the position is not on a node itself, the first node of the node or edge
+        statement at the position is used.
+        """
+        for starts, ends, nodes in [self.positions, self.statements]:
+            idx = bisect.bisect_right(starts, position) - 1
+            if idx >= 0 and position <= ends[idx]:
+                return self.names[nodes[idx]]
+        return None
+
+    def neighbourhood(self, name, depth=FOCUS_DEPTH, limit=MAX_NODES):
+        """Find the nodes within a certain amount of hops of a node.
+
+        Args:
+            name (str):     The name of the node.
+            depth (int):    The amount of hops. Defaults to FOCUS_DEPTH.
+            limit (int):    The maximal amount of nodes. Defaults to MAX_NODES.
+
+        Returns:
+            A set of node indices.
+        """
+        start = self.ids[name]
+        res = {start}
+        frontier = [start]
+        for _ in range(depth):
+            found = []
+            for n in frontier:
+                for e in self.edges[self.offsets[n]:self.offsets[n + 1]]:
+                    m = self.heads[e] if self.tails[e] == n else self.tails[e]
+                    if m not in res and len(res) < limit:
+                        res.add(m)
+                        found.append(m)
+            frontier = found
+        return res
+
+    def extract(self, name, depth=FOCUS_DEPTH, limit=MAX_NODES):
+        """Write the neighbourhood of a node as a DOT graph.
+
+        Args:
+            name (str):     The name of the node.
+            depth (int):    The amount of hops. Defaults to FOCUS_DEPTH.
+            limit (int):    The maximal amount of nodes. Defaults to MAX_NODES.
+
+        Returns:
+            The text of the DOT graph.
+        """
+        key = (name, depth, limit)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        nodes = self.neighbourhood(name, depth, limit)
+        edges = set()
+        for n in nodes:
+            edges.update(self.edges[self.offsets[n]:self.offsets[n + 1]])
+
+        # The (start, kind, line) of each statement, as default attributes only apply to what follows
+        stmts = [(start, 0, line) for start, line in self.defaults]
+        for n in nodes:
+            for start, attrs in self.nodeAttrs.get(n, [(self.firstSeen[n], "")]):
+                stmts.append((start, 1, ("%s %s" % (quote(self.names[n]), attrs)).rstrip()))
+        cutOut = {}
+        cutIn = {}
+        for e in sorted(edges):
+            a, b = self.tails[e], self.heads[e]
+            if a in nodes and b in nodes:
+                stmts.append((self.stmtStarts[self.stmts[e]], 2, ("%s %s %s %s" % (
+                    quote(self.names[a]), self.op, quote(self.names[b]), self.stmtAttrs[self.stmts[e]])).rstrip()))
+            elif a in nodes:
+                cutOut[a] = cutOut.get(a, 0) + 1
+            else:
+                cutIn[b] = cutIn.get(b, 0) + 1
+        stmts.sort(key=lambda x: x[:2])
+        lines = [self.header + " {"] + [line for _, _, line in stmts]
+        # Ghost stubs mark the edges that were cut off
+        ghost = '%s [label="+%d" shape=plaintext fontcolor=gray]'
+        for n, count in sorted(cutOut.items()):
+            lines.append(ghost % (quote("__focus_out_%d" % n), count))
+            lines.append("%s %s %s [style=dashed color=gray]" % (quote(self.names[n]), self.op,
+                                                                  quote("__focus_out_%d" % n)))
+        for n, count in sorted(cutIn.items()):
+            lines.append(ghost % (quote("__focus_in_%d" % n), count))
+            lines.append("%s %s %s [style=dashed color=gray]" % (quote("__focus_in_%d" % n), self.op,
+                                                                  quote(self.names[n])))
+        lines.append("}")
+
+        res = "\n".join(lines)
+        self.cache[key] = res
+        while len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return res
@@ -4,10 +4,14 @@ Author: Randy Paredis
 Date:   12/14/2019
 """
 import math
+import re
+from array import array
+from bisect import bisect_left, bisect_right
 
 from PyQt6 import QtGui, QtCore
 from main.extra import Constants
 from main.editor.Parser import Parser, EOFToken
+from main.editor.Selections import inRange
 from main.extra.IOHandler import IOHandler
 from main.Preferences import bool
 
@@ -16,6 +20,8 @@ from lark import UnexpectedToken, UnexpectedCharacters, Token
 Config = IOHandler.get_preferences()
 
 class BracketInfo:
+    __slots__ = ("char", "pos")
+
     def __init__(self, char, pos):
         self.char = char
         self.pos = pos
@@ -26,29 +32,311 @@ class BracketInfo:
     def __repr__(self):
         return "BracketInfo <%s, %i>" % (self.char, self.pos)
 
+class BracketTable:
+    """Precompiled lookup structure for the paired brackets of a single file type.
+
+    All bracket characters are combined into a single alternation regex, which
+    allows a block of text to be scanned in one left-to-right pass.
+
+    Args:
+        paired (list):  A list of (open, close) tuples.
+    """
+    def __init__(self, paired):
+        self.paired = list(paired)
+        self.opening = [x[0] for x in self.paired]
+        self.closing = [x[1] for x in self.paired]
+        chars = sorted(set(self.opening + self.closing), key=len, reverse=True)
+        self.regex = re.compile("|".join([re.escape(c) for c in chars])) if len(chars) > 0 else None
+
+    def scan(self, text: str):
+        """Get all brackets in a text, sorted on their position.
+
+        Args:
+            text (str): The text to scan.
+
+        Returns:
+            A list of BracketInfo objects.
+        """
+        if self.regex is None:
+            return []
+        return [BracketInfo(m.group(), m.start()) for m in self.regex.finditer(text)]
+
 class TextBlockData(QtGui.QTextBlockUserData):
-    def __init__(self):
+    def __init__(self, parenthesis=None):
         super(TextBlockData, self).__init__()
-        self.parenthesis = []
+        self.parenthesis = [] if parenthesis is None else parenthesis
+        self.positions = array('i', [info.pos for info in self.parenthesis])
 
     def insert(self, info):
-        i = 0
-        while i < len(self.parenthesis) and info.pos > self.parenthesis[i].pos:
-            i += 1
+        i = bisect_left(self.positions, info.pos)
         self.parenthesis.insert(i, info)
+        self.positions.insert(i, info.pos)
 
     def indexOf(self, pos):
-        for i in range(len(self.parenthesis)):
-            if pos <= self.parenthesis[i].pos:
-                return i
+        i = bisect_left(self.positions, pos)
+        if i < len(self.positions):
+            return i
         return -1
 
+class BracketIndex:
+    """Document-wide index of the bracket depths, allowing fast partner lookups.
+
+    For each block and each paired bracket type, a 3-tuple (sum, minimal prefix,
+    maximal suffix) of the depth changes in that block is kept, where an opening
+    bracket counts as +1 and a closing bracket as -1. Symmetric brackets (e.g.
+    quotes) do not change the depth, but are marked as -1 prefix and +1 suffix,
+    such that the next/previous occurrence is always found.
+
+    The blocks are stored in chunks of about CHUNK_SIZE blocks, over which a
+    segment tree is kept for each bracket type. This way, the block that contains
+    a partner bracket can be found in O(log n) chunks, and inserting or removing
+    blocks only changes a single chunk (and the tree is only rebuilt when the
+    amount of chunks changes). Changed chunks are only aggregated again on the
+    next lookup, as highlighting a large text updates all of its blocks.
+
+    Args:
+        table (BracketTable):   The bracket table to index.
+    """
+    EMPTY = (0, 0, 0)
+    CHUNK_SIZE = 64
+
+    def __init__(self, table):
+        self.table = table
+        self.size = 0
+        self.chunks = []  # For each chunk, the list of leaves (a 3-tuple per pair) of its blocks
+        self.starts = []  # The number of the first block of each chunk
+        self.capacity = 1
+        self.trees = []
+        self.stale = set()  # The chunks that changed since the trees were updated
+        self.dirty = True
+
+    @staticmethod
+    def combine(a, b):
+        return a[0] + b[0], min(a[1], a[0] + b[1]), max(b[2], b[0] + a[2])
+
+    @staticmethod
+    def leaf(pair, infos):
+        """Compute the leaf value for a single pair in a list of BracketInfo objects."""
+        o, c = pair
+        if o == c:
+            count = len([i for i in infos if i.char == o])
+            return 0, -count, count
+        total = mn = 0
+        for info in infos:
+            if info.char == o:
+                total += 1
+            elif info.char == c:
+                total -= 1
+                mn = min(mn, total)
+        mx = suffix = 0
+        for info in reversed(infos):
+            if info.char == o:
+                suffix += 1
+                mx = max(mx, suffix)
+            elif info.char == c:
+                suffix -= 1
+        return total, mn, mx
+
+    def leaves(self, infos):
+        """Compute the leaf values of all pairs for a single block."""
+        if len(infos) == 0:
+            return (BracketIndex.EMPTY,) * len(self.table.paired)
+        return tuple(BracketIndex.leaf(pair, infos) for pair in self.table.paired)
+
+    def build(self, blocks):
+        """Rebuild the full index.
+
+        Args:
+            blocks (list):  For each block, the sorted list of BracketInfo objects.
+        """
+        leaves = [self.leaves(infos) for infos in blocks]
+        self.chunks = [leaves[i:i + self.CHUNK_SIZE] for i in range(0, len(leaves), self.CHUNK_SIZE)]
+        self.size = len(blocks)
+        self.rebuild()
+        self.dirty = False
+
+    def aggregate(self, chunk, pair):
+        res = BracketIndex.EMPTY
+        for leaf in chunk:
+            res = BracketIndex.combine(res, leaf[pair])
+        return res
+
+    def rebuild(self):
+        """Rebuild the trees over the chunks, after the amount of chunks changed."""
+        self.starts = []
+        size = 0
+        for chunk in self.chunks:
+            self.starts.append(size)
+            size += len(chunk)
+        self.capacity = 1
+        while self.capacity < len(self.chunks):
+            self.capacity *= 2
+        self.trees = []
+        for p in range(len(self.table.paired)):
+            tree = [BracketIndex.EMPTY] * (2 * self.capacity)
+            for c, chunk in enumerate(self.chunks):
+                tree[self.capacity + c] = self.aggregate(chunk, p)
+            for n in range(self.capacity - 1, 0, -1):
+                tree[n] = BracketIndex.combine(tree[2 * n], tree[2 * n + 1])
+            self.trees.append(tree)
+        self.stale.clear()
+
+    def refresh(self):
+        """Update the trees for all chunks whose blocks changed."""
+        for c in self.stale:
+            for p, tree in enumerate(self.trees):
+                n = self.capacity + c
+                tree[n] = self.aggregate(self.chunks[c], p)
+                n //= 2
+                while n > 0:
+                    tree[n] = BracketIndex.combine(tree[2 * n], tree[2 * n + 1])
+                    n //= 2
+        self.stale.clear()
+
+    def locate(self, block):
+        """Get the chunk of a block and the position of the block in that chunk."""
+        c = bisect_right(self.starts, block) - 1
+        return c, block - self.starts[c]
+
+    def splice(self, block, delta):
+        """Insert (delta > 0) or remove (delta < 0) blocks after a block."""
+        c, i = self.locate(block)
+        chunk = self.chunks[c]
+        if delta > 0:
+            chunk[i + 1:i + 1] = [self.leaves([])] * delta
+        else:
+            removed = -delta
+            rest = chunk[i + 1:]
+            del chunk[i + 1:]
+            while len(rest) < removed:
+                # The removed blocks continue in the next chunks
+                removed -= len(rest)
+                rest = self.chunks.pop(c + 1)
+            chunk += rest[removed:]
+        self.size += delta
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            self.chunks[c:c + 1] = [chunk[j:j + self.CHUNK_SIZE]
+                                    for j in range(0, len(chunk), self.CHUNK_SIZE)]
+        if len(self.chunks) != len(self.starts):
+            self.rebuild()
+            return
+        for k in range(c + 1, len(self.starts)):
+            self.starts[k] += delta
+        self.stale.add(c)
+
+    def update(self, block, infos, count):
+        """Update the information of a single block.
+
+        Args:
+            block (int):    The block number.
+            infos (list):   The sorted list of BracketInfo objects for this block.
+            count (int):    The current amount of blocks in the document. If this
+                            differs from the indexed size, the blocks after this one
+                            were inserted (or removed, i.e. merged into this one),
+                            as the highlighter starts at the first changed block.
+        """
+        if self.dirty or block >= self.size or block >= count:
+            self.dirty = True
+            return
+        if count != self.size:
+            if count < self.size and block + 1 + self.size - count > self.size:
+                self.dirty = True
+                return
+            self.splice(block, count - self.size)
+        c, i = self.locate(block)
+        self.chunks[c][i] = self.leaves(infos)
+        self.stale.add(c)
+
+    def findClosing(self, pair, start, depth=0):
+        """Find the first block at or after start in which the depth drops below zero.
+
+        Args:
+            pair (int):     The index of the pair in the bracket table.
+            start (int):    The first block to look at.
+            depth (int):    The amount of unmatched opening brackets before start.
+
+        Returns:
+            A tuple (block, depth) of the found block number (or -1) and the amount
+            of unmatched opening brackets at the start of that block.
+        """
+        if self.dirty or start >= self.size:
+            return -1, depth
+        self.refresh()
+        c, i = self.locate(start)
+        while c != -1:
+            for j in range(i, len(self.chunks[c])):
+                total, mn, _ = self.chunks[c][j][pair]
+                if depth + mn < 0:
+                    return self.starts[c] + j, depth
+                depth += total
+            c, depth = self._forward(self.trees[pair], 1, 0, self.capacity, c + 1, depth)
+            i = 0
+        return -1, depth
+
+    def findOpening(self, pair, end, depth=0):
+        """Find the last block before end in which, scanning backwards, the depth drops below zero.
+
+        Args:
+            pair (int):     The index of the pair in the bracket table.
+            end (int):      The block before which to start looking.
+            depth (int):    The amount of unmatched closing brackets after the block end - 1.
+
+        Returns:
+            A tuple (block, depth) of the found block number (or -1) and the amount
+            of unmatched closing brackets at the end of that block.
+        """
+        if self.dirty or end <= 0:
+            return -1, depth
+        self.refresh()
+        c, i = self.locate(min(end, self.size) - 1)
+        while c != -1:
+            for j in range(i, -1, -1):
+                total, _, mx = self.chunks[c][j][pair]
+                if mx > depth:
+                    return self.starts[c] + j, depth
+                depth -= total
+            c, depth = self._backward(self.trees[pair], 1, 0, self.capacity, c, depth)
+            if c != -1:
+                i = len(self.chunks[c]) - 1
+        return -1, depth
+
+    def _forward(self, tree, node, nl, nr, start, depth):
+        if nr <= start:
+            return -1, depth
+        total, mn, _ = tree[node]
+        if nl >= start and depth + mn >= 0:
+            return -1, depth + total
+        if nr - nl == 1:
+            return nl, depth
+        mid = (nl + nr) // 2
+        block, depth = self._forward(tree, 2 * node, nl, mid, start, depth)
+        if block != -1:
+            return block, depth
+        return self._forward(tree, 2 * node + 1, mid, nr, start, depth)
+
+    def _backward(self, tree, node, nl, nr, end, depth):
+        if nl >= end:
+            return -1, depth
+        total, _, mx = tree[node]
+        if nr <= end and mx <= depth:
+            return -1, depth - total
+        if nr - nl == 1:
+            return nl, depth
+        mid = (nl + nr) // 2
+        block, depth = self._backward(tree, 2 * node + 1, mid, nr, end, depth)
+        if block != -1:
+            return block, depth
+        return self._backward(tree, 2 * node, nl, mid, end, depth)
+
 class BaseHighlighter(QtGui.QSyntaxHighlighter):
     def __init__(self, parent=None, editor=None):
         super(BaseHighlighter, self).__init__(parent)
         self.editor = editor
         self.highlightingRules = []
         self.parser = Parser()
+        self.brackets = None
+        self.globalKey = None
+        self.globalSpans = {}
 
     def setRules(self, rules):
         def obtainRegex(value):
@@ -81,6 +369,7 @@ class BaseHighlighter(QtGui.QSyntaxHighlighter):
                 fmt = getattr(self, "format_%s" % rule["format"])
                 if regex is not None:
                     self.highlightingRules.append((regex, fmt, rule.get("global", False)))
+                    self.globalKey = None
             else:
                 raise ValueError("Invalid Highlighting Rule %s" % str(rule))
 
@@ -88,6 +377,8 @@ class BaseHighlighter(QtGui.QSyntaxHighlighter):
         self.editor.errors = []
         text = self.editor.toPlainText()
         T = self.parser.parse(text) if text != "" else None
+        if text == "":
+            self.parser.visitor.completer.clear("parse")
         if T is None:
             for token, msg, exp in self.parser.errors:
                 startIndex = token.pos_in_stream
@@ -114,17 +405,69 @@ class BaseHighlighter(QtGui.QSyntaxHighlighter):
 
     def storeBrackets(self, text:str):
         from main.plugins import PluginLoader
-        paired = PluginLoader.instance().getPairedBrackets(self.editor.wrapper.filetype.currentText())
-        flattened = list(set([x for p in paired for x in p]))
-
-        data = TextBlockData()
-        for c in flattened:
-            leftpos = text.find(c)
-            while leftpos != -1:
-                info = BracketInfo(c, leftpos)
-                data.insert(info)
-                leftpos = text.find(c, leftpos + 1)
+        table = PluginLoader.instance().getBracketTable(self.editor.wrapper.filetype.currentText())
+        data = TextBlockData(table.scan(text))
         self.setCurrentBlockUserData(data)
+        if self.brackets is None or self.brackets.table is not table:
+            self.brackets = BracketIndex(table)
+        self.brackets.update(self.currentBlock().blockNumber(), data.parenthesis, self.document().blockCount())
+
+    def bracketIndex(self):
+        """Get the up-to-date BracketIndex of the document."""
+        from main.plugins import PluginLoader
+        table = PluginLoader.instance().getBracketTable(self.editor.wrapper.filetype.currentText())
+        if self.brackets is None or self.brackets.table is not table:
+            self.brackets = BracketIndex(table)
+        if self.brackets.dirty or self.brackets.size != self.document().blockCount():
+            blocks = []
+            block = self.document().begin()
+            while block.isValid():
+                data = block.userData()
+                blocks.append([] if data is None else data.parenthesis)
+                block = block.next()
+            self.brackets.build(blocks)
+        return self.brackets
+
+    def globalMatches(self, idx):
+        """Get the (start, end) spans of a global highlighting rule in the document.
+        These are cached per document revision, such that highlighting multiple blocks
+        after a single change only matches the full text once.
+
+        Args:
+            idx (int):  The index of the rule in the list of highlighting rules.
+        """
+        key = (self.document().revision(), self.document().characterCount())
+        if self.globalKey != key:
+            self.globalKey = key
+            self.globalSpans = {}
+        if idx not in self.globalSpans:
+            spans = []
+            it = self.highlightingRules[idx][0].globalMatch(self.editor.toPlainText())
+            while it.hasNext():
+                match = it.next()
+                spans.append((match.capturedStart(), match.capturedStart() + match.capturedLength()))
+            self.globalSpans[idx] = spans
+        return self.globalSpans[idx]
+
+    def allGlobalMatches(self):
+        """Get the spans of all global highlighting rules, as a set of (rule, start, end) tuples."""
+        return {(i, start, end) for i, rule in enumerate(self.highlightingRules) if rule[2]
+                for start, end in self.globalMatches(i)}
+
+    def rehighlightRanges(self, ranges):
+        """Rehighlight all blocks that intersect with a list of (start, end) positions."""
+        doc = self.document()
+        numbers = set()
+        for start, end in ranges:
+            first = doc.findBlock(start).blockNumber()
+            last = doc.findBlock(end).blockNumber()
+            if last == -1:
+                last = doc.blockCount() - 1
+            if first == -1:
+                first = last
+            numbers.update(range(first, last + 1))
+        for number in sorted(numbers):
+            self.rehighlightBlock(doc.findBlockByNumber(number))
 
     def highlightBlock(self, text):
         self.storeBrackets(text)
@@ -133,14 +476,11 @@ class BaseHighlighter(QtGui.QSyntaxHighlighter):
         if sh:
             bpos = self.currentBlock().position()
             blen = self.currentBlock().length()
-            for rule in self.highlightingRules:
+            for i, rule in enumerate(self.highlightingRules):
                 expression, formatter, g = rule
                 if g:
-                    it = expression.globalMatch(self.editor.toPlainText())
-                    while it.hasNext():
-                        match = it.next()
-                        index = match.capturedStart()
-                        length = match.capturedLength()
+                    for index, end in inRange(self.globalMatches(i), bpos, bpos + blen):
+                        length = end - index
                         if bpos <= index <= index + length <= bpos + blen:
                             self.setFormat(index - bpos, length, formatter())
                         elif bpos <= index:
@@ -6,12 +6,17 @@ autocompletion.
 Author: Randy Paredis
 Date:   01/21/2020
 """
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from itertools import islice
+import heapq
 import re
+import threading
 
-from PyQt6 import QtGui
+from PyQt6 import QtCore, QtGui
 
-from main.editor.automata import FSA, ssc
+from main.editor.automata import FSA
 from main.extra import Constants
 
 
@@ -19,11 +24,13 @@ class Types(Enum):
     """Allows future expansion into different autocompletion types."""
     DEFAULT = 0
     SNIPPET = 1
+    WORKSPACE = 2
 
 
 ICONS = {
     Types.DEFAULT: QtGui.QIcon(),
-    Types.SNIPPET: QtGui.QIcon()
+    Types.SNIPPET: QtGui.QIcon(),
+    Types.WORKSPACE: QtGui.QIcon()
 }
 
 class CompletionStorage:
@@ -32,12 +39,21 @@ class CompletionStorage:
     It is known that this corresponds to some duplicate functionality presented by
     Qt, but because the future is uncertain, this class provides a simple interface
     to keep future changes working as well.
+
+    Items are grouped per source (e.g. the parse results and the snippets), which
+    allows the storage to persist between requests. Updating a source only inserts
+    and removes the items that actually changed.
     """
     def __init__(self):
         self.completions = FSA()
-        self.items = []
+        self.sources = {}
+        self.refs = {}
+        self.letters = Counter()
+        self.pending = None
+        self.source = None
+        self.haystack = None
 
-    def add(self, items, type = Types.DEFAULT, value=None):
+    def add(self, items, type = Types.DEFAULT, value=None, source=None):
         """Add a set of items.
 
         Args:
@@ -48,21 +64,118 @@ class CompletionStorage:
             value (Any):    Optional value to assign to the item(s). Can be used
                             for storing additional information.
                             Defaults to None.
+            source (str):   The source to add the items to. While a new generation
+                            of this source is being collected (see `begin`), the
+                            items are gathered for that generation instead.
+                            Defaults to None, i.e. the source that is being
+                            collected, or "default" if there is none.
         """
-        def ins(item):
-            self.completions.insert(item, (type, value))
-            self.items.append(item)
-
         if isinstance(items, str):
-            ins(items)
-        elif isinstance(items, (list, tuple, iter)):
-            for it in items:
-                ins(it)
+            items = [items]
+        elif not isinstance(items, (list, tuple, set)):
+            return
+
+        if source is None:
+            source = "default" if self.pending is None else self.source
+        if self.pending is not None and source == self.source:
+            for item in items:
+                self.pending[item] = (type, value)
+        else:
+            entries = self.sources.setdefault(source, {})
+            for item in items:
+                if entries.get(item, None) != (type, value):
+                    entries[item] = (type, value)
+                    self._ref(item, source, (type, value))
+
+    def begin(self, source="parse"):
+        """Start collecting a new generation of items for a source. All subsequent
+        calls to `add` for this source will be gathered until `commit` (or `abort`)
+        is called.
+
+        Args:
+            source (str):   The source to collect. Defaults to "parse".
+        """
+        self.pending = {}
+        self.source = source
+
+    def commit(self):
+        """Replace the items of the source that is being collected with the items
+        gathered since the last call to `begin`."""
+        if self.pending is None:
+            return
+        pending, self.pending = self.pending, None
+        self.update(self.source, pending)
+
+    def abort(self):
+        """Discard the items gathered since the last call to `begin`, keeping the
+        current items of the source."""
+        self.pending = None
+
+    def update(self, source, entries):
+        """Set the items of a source, only touching the items that have changed.
+
+        Args:
+            source (str):   The source to update.
+            entries (dict): A mapping of item -> (type, value).
+        """
+        old = self.sources.get(source, {})
+        if old == entries:
+            return
+        for item in old:
+            if item not in entries:
+                self._unref(item, source)
+        for item, data in entries.items():
+            if old.get(item, None) != data:
+                self._ref(item, source, data)
+        if len(entries) > 0:
+            self.sources[source] = dict(entries)
+        else:
+            self.sources.pop(source, None)
+
+    def _ref(self, item, source, data):
+        refs = self.refs.setdefault(item, {})
+        if len(refs) == 0:
+            self.letters.update(item)
+            self.haystack = None
+        refs[source] = data
+        self.completions.insert(item, self._data(refs))
+
+    def _unref(self, item, source):
+        refs = self.refs[item]
+        del refs[source]
+        if len(refs) == 0:
+            del self.refs[item]
+            self.haystack = None
+            self.letters.subtract(item)
+            self.letters += Counter()
+            self.completions.remove(item)
+        else:
+            self.completions.insert(item, self._data(refs))
+
+    @staticmethod
+    def _data(refs):
+        # Items with a value (e.g. snippets) take precedence
+        for data in refs.values():
+            if data[1] is not None:
+                return data
+        return next(iter(refs.values()))
+
+    def clear(self, source=None):
+        """Clears the completions of a source.
 
-    def clear(self):
-        """Clears the full list of completions. Only use with precaution!"""
+        Args:
+            source (str):   The source to clear. When None, the full list of
+                            completions is cleared. Only use with precaution!
+        """
+        if source is not None:
+            self.update(source, {})
+            return
         self.completions.clear()
-        self.items.clear()
+        self.sources.clear()
+        self.refs.clear()
+        self.letters.clear()
+        self.pending = None
+        self.haystack = None
 
     def alphabet(self):
         """Get all the letters of the alphabet that makes up the autocomplete items.
@@ -70,7 +183,7 @@ class CompletionStorage:
         Returns:
             A set of single-character strings.
         """
-        return set("".join(self.items))
+        return set(self.letters)
 
     def get(self, prefix: str):
         """Get all possibilities for the given prefix.
@@ -82,13 +195,308 @@ class CompletionStorage:
             A tuple (list, str), respectively the list of completions and the transformed
             prefix string (all unknown characters are removed)
         """
-        if len(self.alphabet()) > 0:
-            prefix = re.sub("[^%s]" % re.escape("".join(self.alphabet())), "", prefix)
-        dfa = ssc(self.completions)
-        nodes = dfa.find(prefix)
+        if len(self.letters) > 0:
+            prefix = "".join([c for c in prefix if c in self.letters])
         comps = set()
-        for fins in nodes:
-            for node in fins.data:
-                if node.data is not None:
-                    comps.add((node.label, *node.data))
+        for node in self.completions.find(prefix):
+            if node.data is not None:
+                comps.add((node.label, *node.data))
         return sorted(comps, key=lambda x: x[0].lower()), prefix
+
+    def data(self, item: str):
+        """Get the (type, value) tuple of an item, or None if it is not known."""
+        refs = self.refs.get(item, None)
+        if refs is None:
+            return None
+        return self._data(refs)
+
+    def rank(self, prefix: str, limit: int = 100, others=None):
+        """Get the best fuzzy matches for the given prefix. Items that match on their
+        prefix (or capitals) are preferred over items that only contain the prefix
+        as a subsequence.
+
+        Args:
+            prefix (str):   The prefix to check against.
+            limit (int):    The maximal amount of matches to return. Defaults to 100.
+            others (callable):  Optional function that obtains additional (prefix)
+                                matches from outside of this storage for the
+                                given prefix (e.g. `SymbolIndex.lookup`).
+                                These get the WORKSPACE type. Defaults to None.
+
+        Returns:
+            A tuple (list, str), respectively the list of the best (label, type, value,
+            positions) tuples, ordered by relevance, and the transformed prefix string
+            (all characters that occur in no item are removed). The positions indicate
+            which characters of the label were matched.
+        """
+        # The outside items are looked up with the full prefix, as they may use other letters
+        extra = set() if others is None else {x for x in others(prefix) if x not in self.refs}
+        if len(self.letters) > 0:
+            letters = set(self.letters).union(*extra)
+            prefix = "".join([c for c in prefix if c in letters])
+        strict = {node.label for node in self.completions.find(prefix) if node.data is not None}
+        strict |= extra
+        strict.discard(prefix)
+
+        if len(strict) >= limit:
+            # The candidates are already too many; keep the shortest ones
+            labels = heapq.nsmallest(limit, strict, key=lambda x: (len(x), x.lower()))
+            scored = [(fuzzyScore(prefix, x), x) for x in labels]
+            scored.sort(key=lambda x: -x[0][0])
+        else:
+            scored = []
+            for label in strict:
+                score, pos = fuzzyScore(prefix, label)
+                scored.append(((score + 100, pos), label))
+            for label in self._fuzzy(prefix, limit * 4):
+                if label not in strict and label != prefix:
+                    scored.append((fuzzyScore(prefix, label), label))
+            scored = heapq.nlargest(limit, scored, key=lambda x: (x[0][0], -len(x[1])))
+        return [(label, *((Types.WORKSPACE, None) if label in extra else self.data(label)), pos)
+                for (_, pos), label in scored], prefix
+
+    def _fuzzy(self, prefix, amount):
+        """Get the items that contain the prefix as a (case-insensitive) subsequence.
+
+        Args:
+            prefix (str):   The prefix to match.
+            amount (int):   The maximal amount of items to return. A cheap estimate
+                            (match at the start, length of the matched span) is used
+                            to select the most promising items.
+        """
+        # Items are separated by NUL characters, as (quoted) items may contain newlines
+        if self.haystack is None:
+            self.haystack = "\0".join(self.refs)
+        if prefix == "":
+            return heapq.nsmallest(amount, self.refs, key=lambda x: (len(x), x.lower()))
+        # Each character is matched at its first occurrence, which avoids backtracking
+        chars = ["[^\0%s]*%s" % (re.escape(c), re.escape(c)) for c in prefix]
+        pattern = "(?:^|(?<=\0))(%s)%s([^\0]*)" % (chars[0], "".join(chars[1:]))
+        matches = re.finditer(pattern, self.haystack, re.IGNORECASE)
+        matches = heapq.nsmallest(amount, matches, key=lambda m: (m.end(1) > m.start() + 1,
+                                                                  m.start(2) - m.start(), m.end() - m.start()))
+        return [m.group(0) for m in matches if m.group(0) in self.refs]
+
+# Identifiers and quoted strings
+SYMBOL = re.compile(r'"(?:[^"\\]|\\.)*"|[^\W\d]\w*')
+
+
+def scanSymbols(text: str):
+    """Cheaply approximate the symbols of a text without parsing it, i.e. all of its
+    identifiers and quoted strings. Used for files that were not parsed yet.
+
+    Args:
+        text (str): The text to scan.
+
+    Returns:
+        A set of symbols.
+    """
+    return set(SYMBOL.findall(text))
+
+
+class SymbolIndex:
+    """Inverted prefix index over the symbols of multiple files (e.g. all open tabs),
+    such that completions can be offered across file boundaries.
+
+    Each file has its own symbol table. All (lowercase) prefixes of a symbol, up to
+    a certain depth, refer to that symbol, which means a lookup only needs to scan a
+    single bucket.
+
+    The symbol tables can be indexed in a background thread (see `publish`), while
+    lookups happen on the GUI thread.
+
+    Args:
+        depth (int):    The maximal length of the indexed prefixes. Defaults to 3.
+    """
+    def __init__(self, depth=3):
+        self.depth = depth
+        self.files = {}
+        self.index = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=1)
+
+    def publish(self, key, filetype: str, symbols):
+        """Like `update`, but indexes the symbols in the background. All calls to
+        `publish` and `discard` are handled in order.
+
+        Returns:
+            A Future of the update.
+        """
+        return self.pool.submit(self.update, key, filetype, frozenset(symbols))
+
+    def discard(self, key):
+        """Like `remove`, but in the background, after all preceding calls to `publish`.
+
+        Returns:
+            A Future of the removal.
+        """
+        return self.pool.submit(self.remove, key)
+
+    def update(self, key, filetype: str, symbols):
+        """Set the symbol table of a file, only reindexing the symbols that changed.
+
+        Args:
+            key (Any):          Unique identification of the file.
+            filetype (str):     The filetype of the file. Lookups are limited to a
+                                single filetype.
+            symbols (iter):     The symbols of the file.
+        """
+        symbols = frozenset(symbols)
+        old = self.files.get(key, None)
+        if old is not None and old[0] != filetype:
+            self.remove(key)
+            old = None
+        oldsymbols = frozenset() if old is None else old[1]
+        if old is not None and oldsymbols == symbols:
+            return
+        # The prefixes are computed first, such that lookups are only blocked while the buckets change
+        removed = [(symbol, self._prefixes(symbol)) for symbol in oldsymbols - symbols]
+        added = [(symbol, self._prefixes(symbol)) for symbol in symbols - oldsymbols]
+        with self.lock:
+            for symbol, prefixes in removed:
+                self._unindex(filetype, symbol, prefixes)
+            for symbol, prefixes in added:
+                self._index(filetype, symbol, prefixes)
+            self.files[key] = (filetype, symbols)
+
+    def remove(self, key):
+        """Remove the symbol table of a file."""
+        with self.lock:
+            old = self.files.pop(key, None)
+            if old is not None:
+                for symbol in old[1]:
+                    self._unindex(old[0], symbol, self._prefixes(symbol))
+
+    def _prefixes(self, symbol):
+        low = symbol.lower()
+        return [low[:i] for i in range(1, min(len(low), self.depth) + 1)]
+
+    def _index(self, filetype, symbol, prefixes):
+        for px in prefixes:
+            bucket = self.index.setdefault((filetype, px), {})
+            bucket[symbol] = bucket.get(symbol, 0) + 1
+
+    def _unindex(self, filetype, symbol, prefixes):
+        for px in prefixes:
+            bucket = self.index[(filetype, px)]
+            bucket[symbol] -= 1
+            if bucket[symbol] == 0:
+                del bucket[symbol]
+                if len(bucket) == 0:
+                    del self.index[(filetype, px)]
+
+    def lookup(self, prefix: str, filetype: str, limit: int = 100):
+        """Get the symbols that start with a prefix (case-insensitive).
+
+        Args:
+            prefix (str):   The prefix to look for. When empty, nothing is returned.
+            filetype (str): The filetype to look in.
+            limit (int):    The maximal amount of symbols to return. Defaults to 100.
+
+        Returns:
+            A list of symbols, in no particular order.
+        """
+        if prefix == "":
+            return []
+        low = prefix.lower()
+        with self.lock:
+            bucket = self.index.get((filetype, low[:self.depth]), {})
+            if len(low) <= self.depth:
+                return list(islice(bucket, limit))
+            return list(islice((x for x in bucket if x.lower().startswith(low)), limit))
+
+
+def fuzzyScore(prefix: str, word: str):
+    """Score how well a word matches a prefix as a subsequence. Matches at the start,
+    consecutive matches and matches at word boundaries (capitals, after separators)
+    score higher, whereas gaps and long words are penalized.
+
+    Args:
+        prefix (str):   The prefix to match.
+        word (str):     The word to score.
+
+    Returns:
+        A tuple (score, positions) with the positions of the matched characters in
+        the word, or None if the word does not contain the prefix.
+    """
+    positions = _subsequence(prefix, word, True) or _subsequence(prefix, word, False)
+    if positions is None:
+        return None
+
+    score = 0
+    prev = -1
+    for k, p in enumerate(positions):
+        if p == 0:
+            score += 8
+        elif p == prev + 1:
+            score += 5
+        elif (word[p].isupper() and not word[p-1].isupper()) or not word[p-1].isalnum():
+            score += 4
+        else:
+            score -= min(p - prev - 1, 3)
+        if word[p] == prefix[k]:
+            score += 1
+        prev = p
+    score -= len(word) // 8
+    return score, positions
+
+
+def _subsequence(prefix: str, word: str, capitals: bool):
+    lower = word.lower()
+    positions = []
+    i = 0
+    for c in prefix:
+        # Capitals prefer an exact match (a word boundary) over the first occurrence
+        j = word.find(c, i) if capitals and c.isupper() else -1
+        i = lower.find(c.lower(), i) if j < 0 else j
+        if i < 0:
+            return None
+        positions.append(i)
+        i += 1
+    return positions
+
+
+class CompletionModel(QtCore.QAbstractTableModel):
+    """Virtual model for the completion popup. The rows are only rendered when
+    the view requests them.
+
+    Args:
+        parent (QObject):   The parent of this model.
+    """
+    def __init__(self, parent=None):
+        super(CompletionModel, self).__init__(parent)
+        self.completions = []
+
+    def setCompletions(self, completions):
+        """Replace the contents of the model.
+
+        Args:
+            completions (list): A list of (label, type, value, positions) tuples, as
+                                obtained from `CompletionStorage.rank`.
+        """
+        self.beginResetModel()
+        self.completions = completions
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.completions)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else 2
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.completions):
+            return None
+        px, ty, v, pth = self.completions[index.row()]
+        if role == QtCore.Qt.ItemDataRole.UserRole:
+            return px
+        if index.column() == 0:
+            if role == QtCore.Qt.ItemDataRole.DisplayRole:
+                return "".join(["<b>%s</b>" % px[s] if s in pth else px[s] for s in range(len(px))])
+            if role == QtCore.Qt.ItemDataRole.EditRole:
+                return px
+            if role == QtCore.Qt.ItemDataRole.DecorationRole:
+                return ICONS[ty]
+        elif role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return "" if v is None else "<div align='right'>%s&nbsp;</div>" % v
+        return None
@@ -13,6 +13,7 @@ class Parser:
     def __init__(self, file="", parser="lalr"):
         self.grammar = ""
         self.parser = None
+        self.tree = None  # The last tree that was parsed without errors
         if file != "":
             with open(file, "r") as file:
                 self.grammar = file.read()
@@ -30,8 +31,16 @@ class Parser:
                     self.visitor.clear()
                     self.visitor.line = line
                     self.visitor.column = col
-                    self.visitor.visit(tree)
+                    try:
+                        self.visitor.visit(tree)
+                    except Exception:
+                        # Keep the items of the last successful visit
+                        self.visitor.completer.abort()
+                        raise
+                    self.visitor.completer.commit()
                     self.errors += self.visitor.errors
+                    if len(self.errors) == 0:
+                        self.tree = tree
                     if len(self.errors) == 0 or yld:
                         return tree
         except (UnexpectedCharacters, UnexpectedToken) as e:
@@ -62,6 +71,74 @@ class Parser:
         return None
 
 
+def nodeName(node_id):
+    """Get the name of a node_id in a DOT graph, as Graphviz uses it."""
+    parts = []
+    for token in node_id.children[0].children:
+        value = str(token)
+        if token.type == "STRING":
+            value = value[1:-1].replace('\\"', '"')
+        elif token.type == "HTML":
+            value = value[1:-1]
+        parts.append(value)
+    return "".join(parts)
+
+
+def nodeNames(tree):
+    """Get the names of the nodes of an edge endpoint (a node_id or a subgraph) in a DOT graph."""
+    if tree.data == "node_id":
+        return [nodeName(tree)]
+    res = []
+    for node_id in tree.find_data("node_id"):
+        if nodeName(node_id) not in res:
+            res.append(nodeName(node_id))
+    return res
+
+
+def sourcePositions(tree):
+    """Find the statements that define the nodes, edges and clusters of a DOT graph.
+
+    Args:
+        tree (Tree):    The parse tree of the graph.
+
+    Returns:
+        A dict that maps (class, name) tuples onto lists of (start, end) positions
+        in the parsed text, in the same way Graphviz names the elements of its SVG
+        output (e.g. ("node", "a"), ("edge", "a->b") or ("cluster", "cluster_x")).
+        The node statements of a node come before the edges that refer to it.
+    """
+    def span(tree):
+        return tree.meta.start_pos, tree.meta.end_pos
+
+    nodes = {}
+    references = {}
+    res = {}
+    for stmt in tree.iter_subtrees_topdown():
+        if stmt.data == "node_stmt":
+            nodes.setdefault(("node", nodeName(stmt.children[0])), []).append(span(stmt))
+        elif stmt.data == "edge_stmt":
+            left = nodeNames(stmt.children[0])
+            rhs = stmt.children[1]
+            while rhs is not None:
+                op = str(rhs.children[0].children[0])
+                right = nodeNames(rhs.children[1])
+                for a in left:
+                    for b in right:
+                        res.setdefault(("edge", a + op + b), []).append(span(stmt))
+                for n in left + right:
+                    spans = references.setdefault(("node", n), [])
+                    if span(stmt) not in spans:
+                        spans.append(span(stmt))
+                left = right
+                rhs = rhs.children[2] if len(rhs.children) > 2 else None
+        elif stmt.data == "subgraph" and len(stmt.children) > 2:
+            res[("cluster", nodeName(Tree("node_id", [stmt.children[1]])))] = [(stmt.meta.start_pos,
+                                                                           stmt.children[1].meta.end_pos)]
+    for key in set(nodes) | set(references):
+        res[key] = nodes.get(key, []) + references.get(key, [])
+    return res
+
+
 class EOFToken:
     """Helperclass for UnexpectedEOF errors."""
     def __init__(self, text):
@@ -245,7 +322,7 @@ class CheckVisitor:
     def clear(self):
         """Clear the visitor."""
         self.errors.clear()
-        self.completer.clear()
+        self.completer.begin()
         self.scope.clear()
         self.line = -1
         self.column = -1
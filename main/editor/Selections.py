@@ -0,0 +1,123 @@
+"""Layered management of the extra selections of the code editor.
+
+Qt only allows a single list of extra selections on a text editor, which
+re-layouts the viewport every time it is set. This module splits this list
+up in named layers (e.g. current line, brackets, find matches, diagnostics),
+each of which is cached and only rebuilt when its inputs change. The
+composite list is pushed to Qt at most once per update.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from bisect import bisect_left
+
+from PyQt6 import QtCore
+
+
+class SelectionManager:
+    """Keeps track of all layers of extra selections for an editor.
+
+    Args:
+        editor (QPlainTextEdit):    The editor to manage the selections for.
+    """
+    def __init__(self, editor):
+        self.editor = editor
+        self.layers = {}
+        self.order = []
+
+    def register(self, name, build, key=None):
+        """Add a new layer on top of all existing layers.
+
+        Args:
+            name (str):         The unique name of the layer.
+            build (callable):   Function that returns the list of ExtraSelections
+                                for this layer.
+            key (callable):     Optional function that returns a hashable state
+                                of the layer's inputs. The layer is only rebuilt
+                                when this state changes. Defaults to None (always
+                                rebuild).
+        """
+        if name not in self.layers:
+            self.order.append(name)
+        self.layers[name] = {"build": build, "key": key, "last": None, "selections": []}
+
+    def invalidate(self, *names):
+        """Force a set of layers to be rebuilt on the next update.
+        When no names are given, all layers are invalidated."""
+        for name in (names if len(names) > 0 else self.order):
+            self.layers[name]["last"] = None
+
+    def selections(self, name):
+        """Get the cached selections of a layer."""
+        return self.layers[name]["selections"]
+
+    def update(self, *names):
+        """Rebuild all changed layers and push the composite to the editor.
+
+        Args:
+            *names (str):   When given, only these layers will be checked.
+                            Otherwise, all layers are checked.
+        """
+        changed = False
+        for name in (names if len(names) > 0 else self.order):
+            layer = self.layers[name]
+            key = None if layer["key"] is None else layer["key"]()
+            if key is not None and key == layer["last"]:
+                continue
+            layer["last"] = key
+            layer["selections"] = layer["build"]()
+            changed = True
+        if changed:
+            composite = []
+            for name in self.order:
+                composite += self.layers[name]["selections"]
+            self.editor.setExtraSelections(composite)
+        return changed
+
+
+def visibleRange(editor, margin=0):
+    """Get the range of document positions that are currently visible in an editor.
+
+    Args:
+        editor (QPlainTextEdit):    The editor to check.
+        margin (int):               Amount of additional blocks to include before
+                                    and after the visible area. Defaults to 0.
+
+    Returns:
+        A tuple (start, end) of document positions.
+    """
+    block = editor.firstVisibleBlock()
+    for _ in range(margin):
+        if not block.previous().isValid():
+            break
+        block = block.previous()
+    start = block.position()
+
+    vp = editor.viewport()
+    end = editor.cursorForPosition(QtCore.QPoint(vp.width(), vp.height())).block()
+    for _ in range(margin):
+        if not end.next().isValid():
+            break
+        end = end.next()
+    return start, end.position() + end.length()
+
+
+def inRange(ranges, start, end):
+    """Filter a list of non-overlapping (start, end, ...) tuples, sorted on their
+    start, to those that intersect with [start, end].
+
+    Args:
+        ranges (list):  The sorted list of tuples.
+        start (int):    The start of the range.
+        end (int):      The end of the range.
+
+    Returns:
+        A list of the intersecting tuples.
+    """
+    res = []
+    i = max(0, bisect_left(ranges, start, key=lambda r: r[0]) - 1)
+    while i < len(ranges) and ranges[i][0] <= end:
+        if ranges[i][1] >= start:
+            res.append(ranges[i])
+        i += 1
+    return res
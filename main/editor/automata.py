@@ -3,48 +3,95 @@
 We can see our prefix tree as a simple e-NFA, but we will allow the creation
 of additional edges with the same labels (for capital completion).
 
+The literal edges of each node are stored in a dictionary (making the prefix
+tree a compact trie), whereas the capital completion edges are kept in a
+separate skip index. This allows words to be inserted and removed without
+rebuilding the automaton.
+
+Lookups happen on a lazily determinized view of this NFA, which only constructs
+the states along the paths that are actually followed.
+
 Author: Randy Paredis
 Date:   01/21/2020
 """
 
 class Node:
+    __slots__ = ["label", "final", "data", "children", "skips", "finals"]
+
     def __init__(self, label = "", final: bool = False, data = None):
         self.label = label
         self.final = final
         self.data = data
-        self.transitions = set()
+        self.children = {}
+        self.skips = {}
+        self.finals = None
+
+    @property
+    def transitions(self):
+        res = set()
+        for label, end in self.children.items():
+            res.add(Transition(self, end, label))
+        for label, ends in self.skips.items():
+            for end in ends:
+                res.add(Transition(self, end, label, True))
+        return res
 
     def addTransition(self, end, label, skip=False):
-        trans = Transition(self, end, label, skip)
-        if trans not in self.transitions:
-            self.transitions.add(trans)
+        if skip:
+            self.skips.setdefault(label, set()).add(end)
+        else:
+            self.children[label] = end
+
+    def removeTransition(self, end, label):
+        if self.children.get(label, None) is end:
+            del self.children[label]
+        ends = self.skips.get(label, None)
+        if ends is not None:
+            ends.discard(end)
+            if len(ends) == 0:
+                del self.skips[label]
 
     def clear(self):
         self.final = False
         self.data = None
-        self.transitions.clear()
+        self.children.clear()
+        self.skips.clear()
+        self.finals = None
 
     def follow(self, label, follow_skip=False):
-        for trans in self.transitions:
-            if not follow_skip and trans.skip: continue
-            if trans.label == label:
-                return trans.end
-        return None
+        nx = self.children.get(label, None)
+        if nx is None and follow_skip and label in self.skips:
+            nx = next(iter(self.skips[label]))
+        return nx
 
     def followAll(self, label):
-        res = set()
-        for trans in self.transitions:
-            if trans.label == label:
-                res.add(trans.end)
+        res = set(self.skips.get(label, ()))
+        if label in self.children:
+            res.add(self.children[label])
         return res
 
     def findFinals(self):
-        finals = set()
-        if self.final:
-            finals.add(self)
-        for trans in self.transitions:
-            finals |= trans.end.findFinals()
-        return finals
+        """Get the (memoized) set of final nodes that can be reached from this node.
+        The memoization must be reset by the owner of the node when a descendant changes.
+
+        Skip edges always point to descendants, so it suffices to walk the literal edges.
+        """
+        stack = [self]
+        while len(stack) > 0:
+            node = stack[-1]
+            if node.finals is not None:
+                stack.pop()
+                continue
+            todo = [child for child in node.children.values() if child.finals is None]
+            if len(todo) > 0:
+                stack.extend(todo)
+                continue
+            stack.pop()
+            finals = {node} if node.final else set()
+            for child in node.children.values():
+                finals |= child.finals
+            node.finals = frozenset(finals)
+        return self.finals
 
 
 class Transition:
@@ -64,12 +111,16 @@ class Transition:
 class FSA:
     def __init__(self, start=None):
         self.start = Node() if start is None else start
-        self.nodes = [self.start]
+        self.nodes = {self.start: None}  # Used as an ordered set
         self.alphabet = set()
+        self.version = 0
+        self.dfa = None
 
     def clear(self):
         self.start.clear()
-        self.nodes = [self.start]
+        self.nodes = {self.start: None}
+        self.alphabet = set()
+        self.version += 1
 
     def follow(self, word):
         nodes = {self.start}
@@ -78,6 +129,8 @@ class FSA:
             for node in nodes:
                 new |= node.followAll(c)
             nodes = new
+            if len(nodes) == 0:
+                break
         return nodes
 
     def insert(self, word, data = None):
@@ -90,80 +143,157 @@ class FSA:
             if nx is None:
                 nx = Node(word[:i+1])
                 node.addTransition(nx, c)
-                self.nodes.append(nx)
+                self.nodes[nx] = None
+                if c.isupper():
+                    for n in path:
+                        n.addTransition(nx, c, True)
             node = nx
-            if c.isupper():
-                for n in path:
-                    n.addTransition(node, c, True)
             path.append(node)
+        if not node.final:
+            self.start.finals = None
+            for n in path:
+                n.finals = None
+            self.version += 1
         node.final = True
         node.label = word
         node.data = data
 
+    def remove(self, word):
+        """Remove a word from the automaton, pruning all nodes that no longer lead to
+        a final state. The alphabet is left untouched.
+
+        Returns:
+            True if the word was removed, False if it was not present.
+        """
+        path = [self.start]
+        for c in word:
+            nx = path[-1].follow(c)
+            if nx is None:
+                return False
+            path.append(nx)
+        node = path[-1]
+        if not node.final:
+            return False
+        node.final = False
+        node.data = None
+        for n in path:
+            n.finals = None
+        self.version += 1
+        for i in range(len(word), 0, -1):
+            node = path[i]
+            if node.final or len(node.children) > 0:
+                break
+            c = word[i-1]
+            path[i-1].removeTransition(node, c)
+            if c.isupper():
+                for n in path[1:i]:
+                    n.removeTransition(node, c)
+            del self.nodes[node]
+        return True
+
     def find(self, prefix):
-        nodes = self.follow(prefix)
-        fins = set()
-        for node in nodes:
-            fins |= node.findFinals()
-        return fins
+        if self.dfa is None:
+            self.dfa = LazyDFA(self)
+        return self.dfa.find(prefix)
 
     def toDot(self):
+        nodes = list(self.nodes)
         res = "digraph FSA {\n"
-        for i in range(len(self.nodes)):
+        for i in range(len(nodes)):
             s = ""
-            if self.nodes[i].final:
+            if nodes[i].final:
                 s = ' color="red"'
-            res += '\tN%i [label="%s"%s];\n' % (i, self.nodes[i].label, s)
+            res += '\tN%i [label="%s"%s];\n' % (i, nodes[i].label, s)
         res += "\n"
-        for i in range(len(self.nodes)):
-            node = self.nodes[i]
+        for i in range(len(nodes)):
+            node = nodes[i]
             for trans in node.transitions:
                 s = ""
                 if trans.skip:
                     s = ' color="blue"'
-                res += '\tN%i -> N%i [label="%s"%s];\n' % (i, self.nodes.index(trans.end), trans.label, s)
+                res += '\tN%i -> N%i [label="%s"%s];\n' % (i, nodes.index(trans.end), trans.label, s)
         res += "}"
         return res
 
-def ssc(nfa: FSA):
-    toCheck = []
 
-    start = Node(label='{%s}' % nfa.start.label, data={nfa.start})
-    dfa = FSA(start)
-    dfa.DFA = True
-    toCheck.append(start)
+class LazyDFA:
+    """Deterministic view on an NFA of which the states are only constructed when they
+    are followed. The states are identified by the frozenset of NFA nodes they contain
+    and are cached until the NFA changes.
 
-    # garbage = Node(label='{} [GARBAGE]', data=set())
-    # toCheck.append(garbage)
-    # dfa.nodes.append(garbage)
+    Args:
+        nfa (FSA):  The automaton to determinize.
+    """
+    def __init__(self, nfa: FSA):
+        self.nfa = nfa
+        self.version = None
+        self.states = {}
+        self.start = None
 
-    while len(toCheck) > 0:
-        prevNode = toCheck.pop(0)
-        elements = prevNode.data
+    def reset(self):
+        """Drop all known states."""
+        self.version = self.nfa.version
+        self.states = {}
+        self.start = self.state(frozenset([self.nfa.start]))
 
-        for character in nfa.alphabet:
-            newElements = set()
-            for elem in elements:
-                newElements |= elem.followAll(character)
-
-            if len(newElements) == 0: continue
-
-            found = False
-            for n in dfa.nodes:
-                if n.data == newElements:
-                    prevNode.addTransition(n, character)
-                    found = True
-                    break
-            if found:
-                continue
+    def state(self, elements: frozenset):
+        """Get the state for a set of NFA nodes, creating it if it does not exist."""
+        node = self.states.get(elements, None)
+        if node is None:
+            node = Node(label='{%s}' % ", ".join([ne.label for ne in elements]),
+                        final=any([n.final for n in elements]), data=elements)
+            self.states[elements] = node
+        return node
 
-            isAccept = any([n.final for n in newElements])
+    def step(self, node: Node, label):
+        """Follow a single transition from a state, or None if there is no such transition."""
+        nx = node.children.get(label, None)
+        if nx is None:
+            elements = set()
+            for elem in node.data:
+                elements |= elem.followAll(label)
+            if len(elements) == 0:
+                return None
+            nx = self.state(frozenset(elements))
+            node.addTransition(nx, label)
+        return nx
 
-            newNode = Node(label = '{%s}' % ", ".join([ne.label for ne in newElements]),final=isAccept, data=newElements)
-            dfa.nodes.append(newNode)
-            prevNode.addTransition(newNode, character)
-            toCheck.append(newNode)
+    def follow(self, word):
+        """Follow a word from the start state, or None if the word cannot be followed."""
+        if self.version != self.nfa.version:
+            self.reset()
+        node = self.start
+        for c in word:
+            node = self.step(node, c)
+            if node is None:
+                break
+        return node
 
-    return dfa
+    def find(self, prefix):
+        """Get all final NFA nodes that can be reached with the given prefix."""
+        node = self.follow(prefix)
+        fins = set()
+        if node is not None:
+            for elem in node.data:
+                fins |= elem.findFinals()
+        return fins
+
+
+def ssc(nfa: FSA):
+    """Fully determinize an NFA using the subset construction."""
+    lazy = LazyDFA(nfa)
+    lazy.reset()
+    dfa = FSA(lazy.start)
+    dfa.DFA = True
+    toCheck = [lazy.start]
 
+    while len(toCheck) > 0:
+        prevNode = toCheck.pop(0)
+        for character in nfa.alphabet:
+            known = len(lazy.states)
+            newNode = lazy.step(prevNode, character)
+            if len(lazy.states) > known:
+                dfa.nodes[newNode] = None
+                toCheck.append(newNode)
 
+    return dfa
@@ -0,0 +1,147 @@
+"""Export of a QGraphicsScene to an image file with a bounded amount of memory.
+
+The scene is rendered in horizontal strips, which are streamed into the
+encoder of the output file one by one. Hence, only a single strip has to be
+kept in memory at any time. This is done for the PNG and PPM formats; all
+other formats are rendered as a single image by Qt.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from PyQt6 import QtCore, QtGui
+from main.extra.IOHandler import IOHandler
+import math
+import struct
+import zlib
+
+# Maximal amount of bytes in a single strip
+STRIP_SIZE = 1 << 26
+
+
+class ExportCancelled(Exception):
+    """Raised when an export was cancelled by the user."""
+    pass
+
+
+def renderStrips(scene, source, width, height, fill, progress=None, rows=None):
+    """Render a part of a scene in horizontal strips.
+
+    Args:
+        scene (QGraphicsScene):     The scene to render.
+        source (QRectF):            The part of the scene to render.
+        width (int):                The width of the resulting image.
+        height (int):               The height of the resulting image.
+        fill (QColor):              The background of the image.
+        progress (callable):        Called with the amount of rendered rows and the
+                                    total amount of rows before each strip. When it
+                                    returns False, ExportCancelled is raised.
+                                    Defaults to None.
+        rows (int):                 The amount of rows per strip. Defaults to None
+                                    (as many as fit in STRIP_SIZE bytes).
+
+    Returns:
+        A generator of ARGB32 QImages.
+    """
+    if rows is None:
+        rows = max(1, STRIP_SIZE // (4 * width))
+    for top in range(0, height, rows):
+        if progress is not None and not progress(top, height):
+            raise ExportCancelled()
+        image = QtGui.QImage(width, min(rows, height - top), QtGui.QImage.Format.Format_ARGB32)
+        image.fill(fill)
+        painter = QtGui.QPainter(image)
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        scene.render(painter, QtCore.QRectF(0, -top, width, height), source,
+                     QtCore.Qt.AspectRatioMode.IgnoreAspectRatio)
+        painter.end()
+        yield image
+    if progress is not None:
+        progress(height, height)
+
+
+def rowsOf(image, fmt, size):
+    """Obtain the rows of an image, converted to a format with size bytes per pixel."""
+    image = image.convertToFormat(fmt)
+    data = image.constBits().asstring(image.sizeInBytes())
+    stride = image.bytesPerLine()
+    length = image.width() * size
+    return [data[y * stride:y * stride + length] for y in range(image.height())]
+
+
+def encodePNG(width, height, strips, dpi=72):
+    """Encode an image as a PNG file.
+
+    Args:
+        width (int):        The width of the image.
+        height (int):       The height of the image.
+        strips (iterable):  The QImages that form the image from top to bottom.
+        dpi (float):        The resolution of the image. Defaults to 72.
+
+    Returns:
+        A generator of bytes.
+    """
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    yield b"\x89PNG\r\n\x1a\n"
+    yield chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+    ppm = round(dpi / 0.0254)
+    yield chunk(b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+    compressor = zlib.compressobj()
+    for strip in strips:
+        rows = rowsOf(strip, QtGui.QImage.Format.Format_RGBA8888, 4)
+        data = compressor.compress(b"".join([b"\x00" + row for row in rows]))
+        if len(data) > 0:
+            yield chunk(b"IDAT", data)
+    yield chunk(b"IDAT", compressor.flush())
+    yield chunk(b"IEND", b"")
+
+
+def encodePPM(width, height, strips):
+    """Encode an image as a binary PPM file.
+
+    Args:
+        width (int):        The width of the image.
+        height (int):       The height of the image.
+        strips (iterable):  The QImages that form the image from top to bottom.
+
+    Returns:
+        A generator of bytes.
+    """
+    yield b"P6\n%d %d\n255\n" % (width, height)
+    for strip in strips:
+        yield b"".join(rowsOf(strip, QtGui.QImage.Format.Format_RGB888, 3))
+
+
+def exportScene(scene, fileName, dpi=72, progress=None):
+    """Export all items of a scene to an image file.
+
+    Args:
+        scene (QGraphicsScene): The scene to export.
+        fileName (str):         The file to export to. Its extension identifies the format.
+        dpi (float):            The resolution of the image. At 72 DPI, the image has the
+                                same size as the scene. Defaults to 72.
+        progress (callable):    See renderStrips. Defaults to None.
+
+    Raises:
+        ExportCancelled: When the export was cancelled.
+        IOError: When the file could not be written.
+    """
+    source = scene.itemsBoundingRect()
+    scale = dpi / 72
+    width = max(1, math.ceil(source.width() * scale))
+    height = max(1, math.ceil(source.height() * scale))
+    transparent = QtGui.QColor(QtCore.Qt.GlobalColor.transparent)
+    ext = fileName.split(".")[-1].lower()
+    if ext == "png":
+        strips = renderStrips(scene, source, width, height, transparent, progress)
+        IOHandler.write_atomic(fileName, encodePNG(width, height, strips, dpi))
+    elif ext == "ppm":
+        strips = renderStrips(scene, source, width, height, QtGui.QColor(QtCore.Qt.GlobalColor.white), progress)
+        IOHandler.write_atomic(fileName, encodePPM(width, height, strips))
+    else:
+        image = next(renderStrips(scene, source, width, height, transparent, progress, height))
+        image.setDotsPerMeterX(round(dpi / 0.0254))
+        image.setDotsPerMeterY(round(dpi / 0.0254))
+        if not image.save(fileName):
+            raise IOError("Cannot write the image to '%s'." % fileName)
@@ -12,11 +12,26 @@ Date:   01/01/2020
 """
 
 from PyQt6 import QtWidgets, QtCore, QtSvg, QtSvgWidgets, QtGui
-from main.extra import IOHandler, isSVG, Constants
+from main.extra import IOHandler, isSVG, Constants, Export
+from main.extra.Tiles import TiledSvgItem
+from main.extra.SpatialIndex import GridIndex
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as et
 import os
+import queue
 
 Config = IOHandler.IOHandler.get_preferences()
 
+# Larger SVG images (in pixels) are shown through a tile pyramid
+TILE_THRESHOLD = 1 << 22
+
+SVG_NS = "http://www.w3.org/2000/svg"
+et.register_namespace("", SVG_NS)
+et.register_namespace("xlink", "http://www.w3.org/1999/xlink")
+
+# When more renderers than this are in use by the items of a graph, all items are moved to the newest one
+MAX_RENDERERS = 4
+
 FILE_TYPES_OUT = {
     "Windows Bitmap Format": ["bmp"],
     "JPEG": ["jpg", "jpeg"],
@@ -26,8 +41,87 @@ FILE_TYPES_OUT = {
     "X11 Pixmap": ["xpm"]
 }
 
+def _elements(graph):
+    """Iterate the (element, key, id) of the nodes, edges and clusters of a Graphviz graph."""
+    counts = {}
+    for child in list(graph):
+        cls = child.get("class")
+        id = child.get("id")
+        if child.tag != "{%s}g" % SVG_NS or cls not in ["node", "edge", "cluster"] or id is None:
+            continue
+        title = child.find("{%s}title" % SVG_NS)
+        name = (cls, id if title is None else title.text)
+        counts[name] = counts.get(name, 0) + 1
+        yield child, name + (counts[name],), id
+
+
+def graphElements(bdata):
+    """Split an SVG image that was generated by Graphviz in its nodes, edges and clusters.
+
+    The elements are identified by their class and title (i.e. the name of the node,
+    edge or cluster), because the ids that Graphviz generates change whenever an
+    element is added or removed before them.
+
+    Args:
+        bdata (bytes):  The SVG image.
+
+    Returns:
+        A tuple (context, base, elements), or None if the image was not generated by
+        Graphviz. The context identifies the size and the transformation of the graph,
+        the base is the SVG image without its elements and the elements are a list of
+        (key, id, xml) tuples in drawing order.
+    """
+    try:
+        root = et.fromstring(bdata)
+    except et.ParseError:
+        return None
+    graph = root.find("{%s}g" % SVG_NS)
+    if graph is None or graph.get("class") != "graph":
+        return None
+    elements = []
+    for child, key, id in _elements(graph):
+        child.set("id", "")
+        elements.append((key, id, et.tostring(child)))
+        child.set("id", id)
+        graph.remove(child)
+    if len(elements) == 0:
+        return None
+    context = (root.get("width"), root.get("height"), root.get("viewBox"), graph.get("transform"))
+    return context, et.tostring(root), elements
+
+
+def elementBounds(bdata):
+    """Get the bounding boxes of the nodes, edges and clusters of an SVG image that was
+    generated by Graphviz, without splitting it. Can run in a background thread.
+
+    Args:
+        bdata (bytes):  The SVG image.
+
+    Returns:
+        A list of ((x1, y1, x2, y2), key) tuples in scene coordinates (see graphElements
+        for the keys), which is empty if the image was not generated by Graphviz.
+    """
+    try:
+        root = et.fromstring(bdata)
+    except et.ParseError:
+        return []
+    graph = root.find("{%s}g" % SVG_NS)
+    if graph is None or graph.get("class") != "graph":
+        return []
+    renderer = QtSvg.QSvgRenderer(bdata)
+    res = []
+    for _, key, id in _elements(graph):
+        bounds = renderer.boundsOnElement(id)
+        rect = GraphicsView.elementTransform(renderer, id).mapRect(QtCore.QRectF(QtCore.QPointF(0, 0), bounds.size()))
+        res.append(((rect.left(), rect.top(), rect.right(), rect.bottom()), key))
+    return res
+
+
 class GraphicsView(QtWidgets.QWidget):
     zoomed = QtCore.pyqtSignal(float)
+    rendered = QtCore.pyqtSignal(bytes, QtCore.QRectF)  # The graph and the part of the scene it covers
+    elementClicked = QtCore.pyqtSignal(object)  # The key of a node, edge or cluster (see graphElements)
+    elementHovered = QtCore.pyqtSignal(object, QtCore.QPoint)  # The key (or None) and the global position
 
     def __init__(self, mainwindow, parent=None, controls=False):
         super(GraphicsView, self).__init__(parent)
@@ -36,6 +130,23 @@ class GraphicsView(QtWidgets.QWidget):
         self._view = QtWidgets.QGraphicsView(self._scene, parent)
         self._view.wheelEvent = self.viewWheelEvent
         self._view.setTransformationAnchor(QtWidgets.QGraphicsView.ViewportAnchor.AnchorUnderMouse)
+        self.tilePool = ThreadPoolExecutor(max_workers=2)
+        self.graph = None
+        self.index = None
+        self.areas = {}  # The area of the bounding box of each indexed element
+
+        # Tiled graphs are indexed in the background
+        self.indexPool = ThreadPoolExecutor(max_workers=1)
+        self.indexResults = queue.SimpleQueue()
+        self.indexGeneration = 0
+        self.indexPending = 0
+        self.indexTimer = QtCore.QTimer(self)
+        self.indexTimer.setInterval(30)
+        self.indexTimer.timeout.connect(self.drainIndex)
+        self.hovered = None
+        self.pressed = None
+        self._view.viewport().installEventFilter(self)
+        self._view.viewport().setMouseTracking(True)
 
         self.layout = QtWidgets.QGridLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
@@ -130,27 +241,212 @@ class GraphicsView(QtWidgets.QWidget):
         return self.zoom_level_max == self.zoomlevel
 
     def clear(self):
+        for item in self._scene.items():
+            if isinstance(item, TiledSvgItem):
+                item.cancel()
         self._scene.clear()
-        self._scene.deleteLater()
-        self._view.setScene(QtWidgets.QGraphicsScene())
-        self._scene = self._view.scene()
+        self.graph = None
+        self.setIndex([])
+        self.rendered.emit(b"", QtCore.QRectF())
 
     def add(self, bdata):
         if isSVG(bdata):
             svgRenderer = QtSvg.QSvgRenderer(bdata)
-            dot = QtSvgWidgets.QGraphicsSvgItem()
-            dot.setSharedRenderer(svgRenderer)
-            self._scene.addItem(dot)
+            size = svgRenderer.defaultSize()
+            if size.width() * size.height() > TILE_THRESHOLD:
+                self._scene.addItem(TiledSvgItem(bdata, self.tilePool))
+            else:
+                dot = QtSvgWidgets.QGraphicsSvgItem()
+                dot.setSharedRenderer(svgRenderer)
+                dot.setCacheMode(QtWidgets.QGraphicsItem.CacheMode.DeviceCoordinateCache)
+                self._scene.addItem(dot)
+            self.rendered.emit(bytes(bdata), QtCore.QRectF(QtCore.QPointF(0, 0), QtCore.QSizeF(size)))
         else:
             image = QtGui.QImage()
             image.loadFromData(bdata)
             pixmap = QtGui.QPixmap.fromImage(image)
             self._scene.addPixmap(pixmap)
+            self.rendered.emit(bytes(bdata), QtCore.QRectF(pixmap.rect()))
         margin = 25
         sr = self._scene.itemsBoundingRect()
         sr.adjust(-margin, -margin, margin, margin)
         self._scene.setSceneRect(sr)
 
+    def setGraph(self, bdata):
+        """Show a rendered graph in the current scene, which keeps the zoom level, the
+        scroll position and the selection.
+
+        Graphviz images are shown as one item per node, edge and cluster. Only the items
+        that differ from the currently shown graph are replaced.
+
+        Args:
+            bdata (bytes):  The rendered graph.
+        """
+        parts = None
+        if isSVG(bdata):
+            renderer = QtSvg.QSvgRenderer(bdata)
+            size = renderer.defaultSize()
+            if size.width() * size.height() <= TILE_THRESHOLD:
+                parts = graphElements(bdata)
+        if parts is None:
+            self.clear()
+            self.add(bdata)
+            if isSVG(bdata):
+                # Tiled graphs are not split in items, but their elements can still be found
+                self.indexPending += 1
+                future = self.indexPool.submit(self.indexTask, self.indexGeneration, bytes(bdata))
+                future.add_done_callback(lambda f: self.indexResults.put(f.result()))
+                self.indexTimer.start()
+            return
+        context, base, elements = parts
+        if self.graph is None:
+            self.clear()
+            self.graph = {"context": None, "base": (None, None), "items": {}}
+        changed = self.graph["context"] != context
+        self.graph["context"] = context
+
+        item, xml = self.graph["base"]
+        if xml != base:
+            if item is not None:
+                self._scene.removeItem(item)
+            item = QtSvgWidgets.QGraphicsSvgItem()
+            item.setSharedRenderer(QtSvg.QSvgRenderer(base, item))
+            item.setZValue(-1)
+            self._scene.addItem(item)
+            self.graph["base"] = (item, base)
+
+        old = self.graph["items"]
+        items = {}
+        moved = len(old) != len(elements)
+        for z, (key, id, xml) in enumerate(elements):
+            item, oxml = old.pop(key, (None, None))
+            if item is None:
+                item = QtSvgWidgets.QGraphicsSvgItem()
+                item.setFlag(QtWidgets.QGraphicsItem.GraphicsItemFlag.ItemIsSelectable)
+                self._scene.addItem(item)
+            if changed or oxml != xml:
+                moved = True
+                item.setSharedRenderer(renderer)
+                item.setElementId(id)
+                item.setTransform(self.elementTransform(renderer, id))
+            item.setZValue(z)
+            items[key] = (item, xml)
+        for item, _ in old.values():
+            self._scene.removeItem(item)
+        self.graph["items"] = items
+        if moved or self.index is None:
+            self.buildIndex()
+
+        # Unchanged items keep the renderer of an older graph, but only a few of those are kept alive
+        renderers = {item.renderer() for item, _ in items.values()}
+        if len(renderers) > MAX_RENDERERS:
+            for key, id, _ in elements:
+                item = items[key][0]
+                item.setSharedRenderer(renderer)
+                item.setElementId(id)
+        self.graph["renderers"] = [renderer] if len(renderers) > MAX_RENDERERS else list(renderers)
+
+        margin = 25
+        sr = self._scene.itemsBoundingRect()
+        sr.adjust(-margin, -margin, margin, margin)
+        if sr != self._scene.sceneRect():
+            self._scene.setSceneRect(sr)
+        self.rendered.emit(bytes(bdata), QtCore.QRectF(QtCore.QPointF(0, 0), QtCore.QSizeF(renderer.defaultSize())))
+
+    def buildIndex(self):
+        """Index the bounding boxes of all nodes, edges and clusters of the shown graph."""
+        entries = []
+        for key, (item, _) in self.graph["items"].items():
+            rect = item.sceneBoundingRect()
+            entries.append(((rect.left(), rect.top(), rect.right(), rect.bottom()), key))
+        self.setIndex(entries)
+
+    def setIndex(self, entries, index=None):
+        """Replace the index of the shown graph, which cancels the indexing in the background.
+
+        Args:
+            entries (list):     A list of ((x1, y1, x2, y2), key) tuples, see elementBounds.
+            index (GridIndex):  The index of the entries. Defaults to None, in which case
+                                it is built.
+        """
+        self.indexGeneration += 1
+        if index is None and len(entries) > 0:
+            index = GridIndex(entries)
+        self.index = index
+        self.areas = {key: (x2 - x1) * (y2 - y1) for (x1, y1, x2, y2), key in entries}
+
+    @staticmethod
+    def indexTask(generation, bdata):
+        """Index the elements of a graph. Runs in a background thread."""
+        try:
+            entries = elementBounds(bdata)
+        except Exception:
+            entries = []
+        return generation, entries, GridIndex(entries) if len(entries) > 0 else None
+
+    def drainIndex(self):
+        while True:
+            try:
+                generation, entries, index = self.indexResults.get_nowait()
+            except queue.Empty:
+                break
+            self.indexPending -= 1
+            if generation == self.indexGeneration:
+                self.setIndex(entries, index)
+        if self.indexPending == 0:
+            self.indexTimer.stop()
+
+    def elementAt(self, point):
+        """Get the key of the node, edge or cluster at a point in the scene, or None.
+
+        Nodes take precedence over edges and edges over clusters. Amongst elements of the
+        same class, the one with the smallest bounding box is chosen.
+        """
+        if self.index is None:
+            return None
+        found = self.index.at(point.x(), point.y())
+        if len(found) == 0:
+            return None
+        order = {"node": 0, "edge": 1, "cluster": 2}
+        return min(found, key=lambda key: (order.get(key[0], 3), self.areas[key]))
+
+    def elementsIn(self, rect):
+        """Get the keys of all nodes, edges and clusters that intersect a rectangle in the scene."""
+        if self.index is None:
+            return []
+        return self.index.within(rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def eventFilter(self, obj, event):
+        etype = event.type()
+        if etype == QtCore.QEvent.Type.MouseMove and event.buttons() == QtCore.Qt.MouseButton.NoButton:
+            key = self.elementAt(self._view.mapToScene(event.position().toPoint()))
+            if key != self.hovered:
+                self.hovered = key
+                self.elementHovered.emit(key, event.globalPosition().toPoint())
+        elif etype == QtCore.QEvent.Type.MouseButtonPress and event.button() == QtCore.Qt.MouseButton.LeftButton:
+            self.pressed = event.position().toPoint()
+        elif etype == QtCore.QEvent.Type.MouseButtonRelease and event.button() == QtCore.Qt.MouseButton.LeftButton:
+            # Only a click jumps to the source, not the end of a drag
+            pos = event.position().toPoint()
+            if self.pressed is not None and (pos - self.pressed).manhattanLength() \
+                    < QtWidgets.QApplication.startDragDistance():
+                key = self.elementAt(self._view.mapToScene(pos))
+                if key is not None:
+                    self.elementClicked.emit(key)
+            self.pressed = None
+        return False
+
+    @staticmethod
+    def elementTransform(renderer, id):
+        """Get the transformation that positions an element of an SVG image in the scene."""
+        vb = renderer.viewBoxF()
+        size = renderer.defaultSize()
+        view = QtGui.QTransform.fromTranslate(-vb.x(), -vb.y())
+        if vb.width() > 0 and vb.height() > 0:
+            view *= QtGui.QTransform.fromScale(size.width() / vb.width(), size.height() / vb.height())
+        bounds = renderer.boundsOnElement(id)
+        return QtGui.QTransform.fromTranslate(bounds.x(), bounds.y()) * renderer.transformForElement(id) * view
+
     @QtCore.pyqtSlot(QtCore.QPoint, name="centerOn")
     def centerOn(self, point):
         self._view.centerOn(point)
@@ -200,22 +496,37 @@ class GraphicsView(QtWidgets.QWidget):
                 ext = rext[0]
                 fileName += "." + ext
                 if os.path.isfile(fileName):
-                    yes = self.question("File already exists!", "This file already exists. Are you sure, you want "
-                                                                "to replace it?")
+                    yes = self.mainwindow.question("File already exists!", "This file already exists. Are you sure, "
+                                                                           "you want to replace it?")
                     if not yes:
                         # Reboot file chooser window
                         return self.save()
+            dpi, ok = QtWidgets.QInputDialog.getInt(self, "Export Resolution", "Resolution (DPI):", 72, 1, 2400)
+            if not ok:
+                return
 
             # Do the actual saving
             self._scene.clearSelection()    # If there were to be any selections, these would also render to the file
-            self._scene.setSceneRect(self._scene.itemsBoundingRect())
-            image = QtGui.QImage(self._scene.sceneRect().size().toSize(), QtGui.QImage.Format.Format_ARGB32)
-            image.fill(QtCore.Qt.GlobalColor.transparent)
-            painter = QtGui.QPainter(image)
-            painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
-            self._scene.render(painter)
-            image.save(fileName)
-            painter.end()
+            progress = QtWidgets.QProgressDialog("Exporting %s..." % os.path.basename(fileName), "Cancel", 0, 0, self)
+            progress.setWindowTitle("Export to Image")
+            progress.setWindowModality(QtCore.Qt.WindowModality.ApplicationModal)
+            progress.setMinimumDuration(500)
+
+            def update(done, total):
+                progress.setMaximum(total)
+                progress.setValue(done)
+                QtWidgets.QApplication.processEvents()
+                return not progress.wasCanceled()
+
+            try:
+                Export.exportScene(self._scene, fileName, dpi, update)
+            except Export.ExportCancelled:
+                pass
+            except (IOError, MemoryError) as e:
+                self.mainwindow.error("Uh oh!", "It looks as if something went wrong whilst trying to export this "
+                                                "file.\n" + str(e))
+            progress.close()
+            progress.deleteLater()
 
     def viewWheelEvent(self, event: QtGui.QWheelEvent):
         mods = Config.value("view/scrollKey").split(" + ")
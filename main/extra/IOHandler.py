@@ -7,7 +7,12 @@ Date:   12/14/2019
 """
 from PyQt6 import QtCore
 import xml.etree.ElementTree as ET
+import chardet
+import codecs
+import mmap
 import os
+import shutil
+import tempfile
 
 class IOHandler:
     @staticmethod
@@ -76,6 +81,10 @@ class IOHandler:
     def dir_config():
         return os.path.dirname(IOHandler.get_settings().fileName())
 
+    @staticmethod
+    def dir_journal(*paths):
+        return os.path.realpath(IOHandler.join(IOHandler.dir_config(), "journal", *paths))
+
     @staticmethod
     def file_preferences():
         return os.path.realpath(IOHandler.join(IOHandler.dir_config(), "preferences.conf"))
@@ -93,4 +102,105 @@ class IOHandler:
         for file in files:
             os.remove(file)
 
+    @staticmethod
+    def read_text(path, sample=65536):
+        """Read a text file through a memory map.
+
+        The encoding is obtained from the BOM if there is one. Otherwise, UTF-8 is
+        tried first and chardet is only used on a sample of the file if that fails.
+
+        Args:
+            path (str):     The file to read.
+            sample (int):   The amount of bytes to use for encoding detection.
+
+        Returns:
+            A tuple (text, encoding), or None if the file could not be decoded
+            (e.g. binary files).
+        """
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return "", "utf-8"
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                try:
+                    if data[:3] == codecs.BOM_UTF8:
+                        return str(memoryview(data)[3:], "utf-8"), "utf-8-sig"
+                    if data[:2] in [codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE]:
+                        return str(data, "utf-16"), "utf-16"
+                except UnicodeDecodeError:
+                    return None
+                if data.find(b"\0", 0, sample) != -1:
+                    return None
+                try:
+                    return str(data, "utf-8"), "utf-8"
+                except UnicodeDecodeError:
+                    pass
+                encoding = chardet.detect(data[:sample])["encoding"]
+                if encoding is None:
+                    return None
+                try:
+                    return str(data, encoding), encoding
+                except (UnicodeDecodeError, LookupError):
+                    return None
+
+    @staticmethod
+    def write_atomic(path, data):
+        """Write a file, such that it either has its old or its new contents, even if
+        the application crashes halfway. The data is written to a temporary file in
+        the same folder, which then replaces the original.
+
+        Args:
+            path (str):     The file to write.
+            data:           The new contents of the file, as bytes or as an iterable
+                            of bytes chunks.
+        """
+        path = os.path.realpath(path)
+        fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp",
+                                   dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in ([data] if isinstance(data, (bytes, bytearray)) else data):
+                    file.write(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            if os.path.exists(path):
+                shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @staticmethod
+    def encode_chunks(text, encoding, linesep="\n", size=1 << 20):
+        """Encode a text in chunks, such that no full copy of it has to be kept in memory.
+
+        Args:
+            text (str):     The text to encode.
+            encoding (str): The encoding to use.
+            linesep (str):  The line separator that replaces the newlines. Defaults to "\\n".
+            size (int):     The amount of characters per chunk.
+
+        Returns:
+            A generator of bytes.
+        """
+        encoder = codecs.getincrementalencoder(encoding)()
+        for start in range(0, len(text), size):
+            chunk = text[start:start + size]
+            if linesep != "\n":
+                chunk = chunk.replace("\n", linesep)
+            yield encoder.encode(chunk)
+        yield encoder.encode("", True)
+
+    @staticmethod
+    def write_text(path, text, encoding, linesep="\n"):
+        """Atomically write a text file, which is encoded while it is being written.
+
+        Args:
+            path (str):     The file to write.
+            text (str):     The contents of the file, using "\\n" as newlines.
+            encoding (str): The encoding to use.
+            linesep (str):  The line separator to use. Defaults to "\\n".
+        """
+        IOHandler.write_atomic(path, IOHandler.encode_chunks(text, encoding, linesep))
+
 from main.extra import Constants
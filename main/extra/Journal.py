@@ -0,0 +1,294 @@
+"""Crash recovery for the unsaved changes of all open editors.
+
+All changes to a document are recorded as deltas in an append-only journal
+file (one per editor) in the config folder. The deltas are collected on the
+GUI thread and handed to a background thread, which appends them in batches.
+When a journal becomes too long, it is compacted into a snapshot of the text.
+
+Each session uses its own folder, which is locked while the session runs.
+When the lock of a folder is stale, its session crashed and its journals can
+be recovered.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from PyQt6 import QtCore, QtGui
+from main.extra.IOHandler import IOHandler
+from main.extra.Threading import WorkerThread
+import json
+import os
+import queue
+import shutil
+import uuid
+
+
+def replay(text, records):
+    """Apply a list of deltas to a text.
+
+    The positions of the deltas are expressed in UTF-16 code units, like the
+    positions of a QTextDocument.
+
+    Args:
+        text (str):     The text to start from.
+        records (list): A list of {"p": position, "r": removed, "t": text} dicts.
+
+    Returns:
+        The resulting text.
+    """
+    data = bytearray(text.encode("utf-16-le"))
+    for record in records:
+        start = min(2 * record["p"], len(data))
+        end = min(start + 2 * record["r"], len(data))
+        data[start:end] = record["t"].encode("utf-16-le")
+    return data.decode("utf-16-le")
+
+
+class JournalState:
+    """The journal of a single editor."""
+    def __init__(self, editor):
+        self.id = uuid.uuid4().hex
+        self.editor = editor
+        self.buffer = []
+        self.base = None
+        self.started = False
+        self.count = 0
+        self.paused = False
+
+
+class Journal(QtCore.QObject):
+    """Keeps the journals of all open editors.
+
+    Args:
+        parent (QObject):   The parent of the journal.
+        interval (int):     The amount of milliseconds between two flushes.
+        compact (int):      The amount of deltas after which a journal is compacted.
+    """
+    def __init__(self, parent=None, interval=1000, compact=5000):
+        super(Journal, self).__init__(parent)
+        self.compact = compact
+        self.states = {}
+        self.folder = IOHandler.dir_journal(uuid.uuid4().hex)
+        os.makedirs(self.folder, exist_ok=True)
+        self.lock = QtCore.QLockFile(os.path.join(self.folder, "lock"))
+        self.lock.tryLock(0)
+
+        self.queue = queue.SimpleQueue()
+        self.writer = WorkerThread(self.write)
+        self.writer.start()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def path(self, id):
+        return os.path.join(self.folder, id + ".journal")
+
+    def track(self, editor):
+        """Start recording the changes of an editor."""
+        state = JournalState(editor)
+        state.base = self.header(editor)
+        doc = editor.document()
+
+        def changed(position, removed, added):
+            if state.paused:
+                return
+            cursor = QtGui.QTextCursor(doc)
+            end = doc.characterCount() - 1
+            cursor.setPosition(min(position, end))
+            cursor.setPosition(min(position + added, end), QtGui.QTextCursor.MoveMode.KeepAnchor)
+            state.buffer.append({"p": position, "r": removed, "t": cursor.selectedText().replace("\u2029", "\n")})
+
+        doc.contentsChange.connect(changed)
+        self.states[editor] = state
+
+    def untrack(self, editor):
+        """Stop recording the changes of an editor and remove its journal."""
+        state = self.states.pop(editor, None)
+        if state is not None and state.started:
+            self.queue.put(("remove", state.id, None))
+
+    def pause(self, editor):
+        """Stop recording the changes of an editor, until it is reset."""
+        if editor in self.states:
+            self.states[editor].paused = True
+
+    def reset(self, editor):
+        """Use the current (saved) contents of an editor as the new base of its journal."""
+        state = self.states.get(editor, None)
+        if state is not None:
+            state.paused = False
+            state.buffer = []
+            state.base = self.header(editor)
+            if state.started:
+                state.started = False
+                self.queue.put(("remove", state.id, None))
+
+    def rebase(self, editor):
+        """Restart the journal of an editor after its file was written.
+
+        The deltas of the journal cannot be replayed on the new contents of the file
+        (nor is the old base valid anymore), hence the unsaved text is stored as a
+        snapshot instead.
+        """
+        state = self.states.get(editor, None)
+        if state is None or state.paused:
+            return
+        if editor.isSaved():
+            self.reset(editor)
+            return
+        state.buffer = []
+        state.base = self.header(editor, editor.toPlainText())
+        self.queue.put(("write", state.id, [state.base]))
+        state.started = True
+        state.count = 1
+
+    @staticmethod
+    def header(editor, text=None):
+        """Describe the text that the deltas of a journal must be applied to.
+
+        Args:
+            editor (CodeEditor):    The editor.
+            text (str):             The current text, when a snapshot must be taken.
+                                    Defaults to None (the saved contents are used).
+        """
+        res = {
+            "filename": editor.filename,
+            "encoding": editor.wrapper.encoding.currentData(),
+            "linesep": editor.wrapper.linesep.currentData()
+        }
+        if text is None and editor.filename != "" and os.path.isfile(editor.filename):
+            stat = os.stat(editor.filename)
+            res["mtime"] = stat.st_mtime
+            res["size"] = stat.st_size
+        else:
+            res["text"] = editor.toPlainText() if text is None else text
+        return res
+
+    def flush(self):
+        """Move the recorded changes to the background thread."""
+        for editor, state in self.states.items():
+            if state.paused:
+                continue
+            if editor.isSaved():
+                if state.started or len(state.buffer) > 0:
+                    self.reset(editor)
+                continue
+            if len(state.buffer) == 0:
+                continue
+            records, state.buffer = state.buffer, []
+            if not state.started:
+                records = [state.base] + records
+                self.queue.put(("write", state.id, records))
+                state.started = True
+                state.count = len(records)
+            elif state.count + len(records) > self.compact or state.base["filename"] != editor.filename:
+                state.base = self.header(editor, editor.toPlainText())
+                self.queue.put(("write", state.id, [state.base]))
+                state.count = 1
+            else:
+                self.queue.put(("append", state.id, records))
+                state.count += len(records)
+
+    def write(self):
+        """Write the journals in batches. Runs in the background thread."""
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            files = {}
+            for op, id, records in batch:
+                if op is None:
+                    break
+                path = self.path(id)
+                data = b"".join([(json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")
+                                 for r in (records or [])])
+                try:
+                    if op == "append":
+                        if path not in files:
+                            files[path] = open(path, "ab")
+                        files[path].write(data)
+                        continue
+                    if path in files:
+                        files.pop(path).close()
+                    if op == "write":
+                        IOHandler.write_atomic(path, data)
+                    elif op == "remove" and os.path.exists(path):
+                        os.remove(path)
+                except OSError:
+                    pass
+            for file in files.values():
+                file.flush()
+                os.fsync(file.fileno())
+                file.close()
+            if batch[-1][0] is None:
+                return
+
+    def close(self):
+        """Stop journaling and remove all journals of this session."""
+        self.timer.stop()
+        self.queue.put((None, None, None))
+        self.writer.wait()
+        self.lock.unlock()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def recover(self):
+        """Obtain the unsaved changes of all sessions that crashed.
+
+        Returns:
+            A list of dicts with the filename, encoding, linesep and text of each
+            recovered editor, and a list of the folders they were recovered from.
+        """
+        res = []
+        folders = []
+        root = IOHandler.dir_journal()
+        for name in sorted(os.listdir(root)):
+            folder = os.path.join(root, name)
+            if folder == self.folder or not os.path.isdir(folder):
+                continue
+            lock = QtCore.QLockFile(os.path.join(folder, "lock"))
+            if not lock.tryLock(0):
+                continue  # Another session is still running
+            lock.unlock()
+            folders.append(folder)
+            for file in sorted(os.listdir(folder)):
+                if file.endswith(".journal"):
+                    item = self.load(os.path.join(folder, file))
+                    if item is not None:
+                        res.append(item)
+        return res, folders
+
+    @staticmethod
+    def load(path):
+        """Rebuild the text of a single journal, or None if that is impossible."""
+        records = []
+        with open(path, "rb") as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # The last write was interrupted
+        if len(records) == 0:
+            return None
+        header = records[0]
+        if "text" in header:
+            text = header["text"]
+        else:
+            filename = header["filename"]
+            if not os.path.isfile(filename):
+                return None
+            stat = os.stat(filename)
+            if stat.st_mtime != header["mtime"] or stat.st_size != header["size"]:
+                return None  # The file was changed since
+            read = IOHandler.read_text(filename)
+            if read is None:
+                return None
+            text = read[0].replace("\r\n", "\n").replace("\r", "\n")
+        return {
+            "filename": header["filename"],
+            "encoding": header["encoding"],
+            "linesep": header["linesep"],
+            "text": replay(text, records[1:])
+        }
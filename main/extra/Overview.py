@@ -0,0 +1,182 @@
+"""An overview of the graph in a GraphicsView.
+
+The whole graph is shown as a downsampled image, which is rendered once per
+render of the graph in a background thread. A rectangle indicates the part
+that is visible in the view; it can be dragged to pan the view.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from PyQt6 import QtWidgets, QtCore, QtGui, QtSvg
+from main.extra import isSVG
+from concurrent.futures import ThreadPoolExecutor
+import queue
+
+# The maximal width and height of the overview image, in pixels
+OVERVIEW_SIZE = 512
+
+
+def renderOverview(bdata, size=OVERVIEW_SIZE):
+    """Render a downsampled image of a graph. Runs in a background thread.
+
+    Args:
+        bdata (bytes):  The rendered graph, as an SVG or a raster image.
+        size (int):     The maximal width and height of the image.
+
+    Returns:
+        The image as a QImage.
+    """
+    if isSVG(bdata):
+        renderer = QtSvg.QSvgRenderer(bdata)
+        scaled = QtCore.QSizeF(renderer.defaultSize()).scaled(size, size, QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+        image = QtGui.QImage(max(1, round(scaled.width())), max(1, round(scaled.height())),
+                             QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(QtCore.Qt.GlobalColor.transparent)
+        painter = QtGui.QPainter(image)
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+        renderer.render(painter)
+        painter.end()
+        return image
+    image = QtGui.QImage()
+    image.loadFromData(bdata)
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                             QtCore.Qt.TransformationMode.SmoothTransformation)
+    return image
+
+
+class Overview(QtWidgets.QWidget):
+    """Shows the whole graph of a GraphicsView, with the visible part of the view.
+
+    Args:
+        view (GraphicsView):    The view to show an overview of.
+        parent (QWidget):       The parent widget. Defaults to None.
+    """
+    def __init__(self, view, parent=None):
+        super(Overview, self).__init__(parent)
+        self.view = view
+        self.pixmap = None
+        self.source = QtCore.QRectF()
+        self.latest = None  # The graph to render once the overview is shown
+        self.setMinimumSize(100, 80)
+        self.setCursor(QtCore.Qt.CursorShape.OpenHandCursor)
+
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.SimpleQueue()
+        self.generation = 0
+        self.pending = 0  # The amount of submitted renders whose result was not drained yet
+        self.drainTimer = QtCore.QTimer(self)
+        self.drainTimer.setInterval(30)
+        self.drainTimer.timeout.connect(self.drain)
+
+        view.rendered.connect(self.refresh)
+        view.zoomed.connect(self.update)
+        view._view.horizontalScrollBar().valueChanged.connect(self.update)
+        view._view.verticalScrollBar().valueChanged.connect(self.update)
+        view._view.viewport().installEventFilter(self)
+
+    def refresh(self, bdata, source):
+        """Render the overview of a new graph in the background. While the overview
+        is hidden, only the latest graph is kept, to be rendered when it is shown.
+
+        Args:
+            bdata (bytes):      The rendered graph. When empty, the overview is cleared.
+            source (QRectF):    The part of the scene that is covered by the graph.
+        """
+        self.generation += 1
+        self.latest = None
+        if len(bdata) == 0:
+            self.pixmap = None
+            self.update()
+            return
+        bdata = bytes(bdata)
+        if not self.isVisible():
+            self.latest = bdata, source
+            return
+        generation = self.generation
+
+        def task():
+            try:
+                return generation, source, renderOverview(bdata)
+            except Exception:
+                return generation, source, None
+
+        self.pending += 1
+        future = self.pool.submit(task)
+        future.add_done_callback(lambda f: self.results.put(f.result()))
+        self.drainTimer.start()
+
+    def drain(self):
+        while True:
+            try:
+                generation, source, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if generation == self.generation and image is not None:
+                self.pixmap = QtGui.QPixmap.fromImage(image)
+                self.source = source
+                self.update()
+        if self.pending == 0:
+            self.drainTimer.stop()
+
+    def showEvent(self, event):
+        super(Overview, self).showEvent(event)
+        if self.latest is not None:
+            self.refresh(*self.latest)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.Type.Resize:
+            self.update()  # The visible part of the view changed
+        return False
+
+    def target(self):
+        """Get the rectangle in which the overview is drawn."""
+        if self.pixmap is None or self.source.isEmpty():
+            return QtCore.QRectF()
+        size = self.source.size().scaled(QtCore.QSizeF(self.size()), QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+        return QtCore.QRectF((self.width() - size.width()) / 2, (self.height() - size.height()) / 2,
+                             size.width(), size.height())
+
+    def toScene(self, point):
+        target = self.target()
+        return QtCore.QPointF(self.source.left() + (point.x() - target.left()) * self.source.width() / target.width(),
+                              self.source.top() + (point.y() - target.top()) * self.source.height() / target.height())
+
+    def fromScene(self, rect):
+        target = self.target()
+        sx = target.width() / self.source.width()
+        sy = target.height() / self.source.height()
+        return QtCore.QRectF(target.left() + (rect.left() - self.source.left()) * sx,
+                             target.top() + (rect.top() - self.source.top()) * sy,
+                             rect.width() * sx, rect.height() * sy)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), self.palette().color(QtGui.QPalette.ColorRole.Base))
+        target = self.target()
+        if target.isEmpty():
+            painter.end()
+            return
+        painter.setRenderHint(QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawPixmap(target, self.pixmap, QtCore.QRectF(self.pixmap.rect()))
+        view = self.view._view
+        visible = view.mapToScene(view.viewport().rect()).boundingRect()
+        color = self.palette().color(QtGui.QPalette.ColorRole.Highlight)
+        painter.setPen(QtGui.QPen(color, 2))
+        color.setAlpha(48)
+        painter.setBrush(color)
+        painter.drawRect(self.fromScene(visible).intersected(QtCore.QRectF(self.rect())))
+        painter.end()
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.MouseButton.LeftButton and not self.target().isEmpty():
+            self.setCursor(QtCore.Qt.CursorShape.ClosedHandCursor)
+            self.view.centerOn(self.toScene(event.position()))
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & QtCore.Qt.MouseButton.LeftButton and not self.target().isEmpty():
+            self.view.centerOn(self.toScene(event.position()))
+
+    def mouseReleaseEvent(self, event):
+        self.setCursor(QtCore.Qt.CursorShape.OpenHandCursor)
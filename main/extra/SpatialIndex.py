@@ -0,0 +1,97 @@
+"""A spatial index for rectangles, used for hit testing in the rendered graph.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+import math
+
+# Rectangles that cover more cells than this are stored in a coarser grid
+MAX_CELLS = 64
+
+# The factor by which the cells of each next grid are larger
+COARSEN = 8
+
+
+class GridIndex:
+    """Divides the plane in a uniform grid of square cells. Each cell contains the
+    rectangles that intersect with it, such that a point query only has to check
+    the rectangles of a single cell.
+
+    Rectangles that would cover too many cells (e.g. long edges) are stored in a
+    coarser grid instead, and so on, such that a query checks a single cell per grid.
+
+    Args:
+        items (list):   A list of ((x1, y1, x2, y2), value) tuples.
+        cell (float):   The width and height of a cell in the finest grid. Defaults to
+                        None, in which case it is chosen from the sizes of the
+                        rectangles.
+    """
+    def __init__(self, items, cell=None):
+        self.items = items
+        if cell is None:
+            cell = 1.0
+            if len(items) > 0:
+                # The median, as a few large rectangles would make the cells too large for all others
+                sizes = sorted([(x2 - x1) + (y2 - y1) for (x1, y1, x2, y2), _ in items])
+                cell = max(sizes[len(sizes) // 2], 1.0)
+        self.cell = cell
+        self.levels = []  # The (cell size, cells) of each grid, from fine to coarse
+        pending = range(len(items))
+        while len(pending) > 0:
+            cells = {}
+            rest = []
+            for idx in pending:
+                cx1, cy1, cx2, cy2 = self.span(*items[idx][0], cell=cell)
+                if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > MAX_CELLS:
+                    rest.append(idx)
+                    continue
+                for cx in range(cx1, cx2 + 1):
+                    for cy in range(cy1, cy2 + 1):
+                        cells.setdefault((cx, cy), []).append(idx)
+            self.levels.append((cell, cells))
+            pending = rest
+            cell *= COARSEN
+
+    def __len__(self):
+        return len(self.items)
+
+    def span(self, x1, y1, x2, y2, cell=None):
+        """Get the range of cells (cx1, cy1, cx2, cy2) that a rectangle intersects.
+
+        Args:
+            cell (float):   The size of the cells. Defaults to None (the finest grid).
+        """
+        if cell is None:
+            cell = self.cell
+        return math.floor(x1 / cell), math.floor(y1 / cell), math.floor(x2 / cell), math.floor(y2 / cell)
+
+    def at(self, x, y):
+        """Get the values of all rectangles that contain a point, in the order they were given."""
+        found = []
+        for cell, cells in self.levels:
+            found += cells.get((math.floor(x / cell), math.floor(y / cell)), [])
+        res = []
+        for idx in sorted(found):
+            (x1, y1, x2, y2), value = self.items[idx]
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                res.append(value)
+        return res
+
+    def within(self, x1, y1, x2, y2):
+        """Get the values of all rectangles that intersect with a rectangle, in the order they were given."""
+        found = set()
+        for cell, cells in self.levels:
+            cx1, cy1, cx2, cy2 = self.span(x1, y1, x2, y2, cell)
+            if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(cells):
+                for idxs in cells.values():
+                    found.update(idxs)
+            else:
+                for cx in range(cx1, cx2 + 1):
+                    for cy in range(cy1, cy2 + 1):
+                        found.update(cells.get((cx, cy), []))
+        res = []
+        for idx in sorted(found):
+            (ix1, iy1, ix2, iy2), value = self.items[idx]
+            if ix1 <= x2 and x1 <= ix2 and iy1 <= y2 and y1 <= iy2:
+                res.append(value)
+        return res
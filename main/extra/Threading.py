@@ -20,3 +20,87 @@ class WorkerThread(QtCore.QThread):
     def run(self):
         time.sleep(0.01)  # << Make sure the thread is at least this amount of time active
         self.func()
+
+
+class UpdateScheduler(QtCore.QObject):
+    """Coalesces UI side effects into a single flush per event-loop iteration.
+
+    Tasks are registered once and marked dirty whenever they may need to run.
+    All dirty tasks are executed (in registration order) on the next iteration
+    of the event loop, which means that a burst of events (e.g. holding an arrow
+    key) only causes a single update.
+
+    Each task can have:
+        - A key function. When the key did not change since the last run, the
+          task is skipped.
+        - A cost budget (in milliseconds). When a run took longer than this
+          budget, the next run of the task is postponed by the time it took,
+          such that expensive tasks cannot block the event loop continuously.
+    """
+    def __init__(self, parent=None):
+        super(UpdateScheduler, self).__init__(parent)
+        self.tasks = {}
+        self.order = []
+        self.dirty = set()
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def register(self, name, func, key=None, budget=None):
+        """Register a new task.
+
+        Args:
+            name (str):         The unique name of the task.
+            func (callable):    The function to execute.
+            key (callable):     Optional function that returns a hashable
+                                state. When the state did not change since the
+                                previous run, the task is skipped.
+                                Defaults to None (always run).
+            budget (float):     Optional cost budget in milliseconds.
+                                Defaults to None (no budget).
+        """
+        if name not in self.tasks:
+            self.order.append(name)
+        self.tasks[name] = {"func": func, "key": key, "budget": budget, "last": None, "next": 0.0}
+
+    def mark(self, *names, force=False):
+        """Mark a set of tasks as dirty, scheduling a flush.
+
+        Args:
+            *names (str):   The names of the tasks to mark.
+            force (bool):   When True, the key check is ignored for the next run.
+        """
+        for name in names:
+            if force:
+                self.tasks[name]["last"] = None
+            self.dirty.add(name)
+        if not self.timer.isActive():
+            self.timer.start(0)
+
+    def flush(self):
+        """Execute all dirty tasks."""
+        now = time.perf_counter()
+        delay = None
+        for name in self.order:
+            if name not in self.dirty:
+                continue
+            task = self.tasks[name]
+            if task["next"] > now:
+                wait = task["next"] - now
+                delay = wait if delay is None else min(delay, wait)
+                continue
+            self.dirty.discard(name)
+            if task["key"] is not None:
+                key = task["key"]()
+                if key == task["last"]:
+                    continue
+                task["last"] = key
+            start = time.perf_counter()
+            task["func"]()
+            cost = time.perf_counter() - start
+            if task["budget"] is not None and cost * 1000 > task["budget"]:
+                task["next"] = start + 2 * cost
+            else:
+                task["next"] = 0.0
+        if delay is not None:
+            self.timer.start(int(delay * 1000) + 1)
@@ -0,0 +1,178 @@
+"""A QGraphicsItem that shows a large SVG image through a tile pyramid.
+
+The image is rendered in tiles at multiple levels of detail (each level
+doubles the resolution of the previous one). Tiles are rendered lazily in
+background threads and kept in a bounded cache. Until a tile is available,
+the corresponding part of a coarser level is shown instead. This way, the
+SVG never has to be rasterized completely on the GUI thread when panning or
+zooming.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from PyQt6 import QtWidgets, QtCore, QtGui, QtSvg
+from collections import OrderedDict
+import math
+import queue
+import threading
+
+# The width and height of a single tile, in pixels
+TILE_SIZE = 512
+
+# Maximal amount of bytes used by the tiles of a single item
+CACHE_SIZE = 1 << 28
+
+# The highest level of detail (a scale of 2 ** MAX_LEVEL)
+MAX_LEVEL = 3
+
+_local = threading.local()
+
+
+def renderTile(data, size, level, i, j):
+    """Render a single tile of an SVG image. Runs in a background thread.
+
+    Args:
+        data (bytes):   The SVG image.
+        size (QSizeF):  The size of the image at level 0.
+        level (int):    The level of detail of the tile.
+        i (int):        The column of the tile.
+        j (int):        The row of the tile.
+
+    Returns:
+        The tile as a QImage.
+    """
+    # Renderers are not shared between threads, but reused for all tiles of the same image
+    if getattr(_local, "data", None) is not data:
+        _local.data = data
+        _local.renderer = QtSvg.QSvgRenderer(data)
+    scale = 2.0 ** level
+    image = QtGui.QImage(TILE_SIZE, TILE_SIZE, QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QtCore.Qt.GlobalColor.transparent)
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+    _local.renderer.render(painter, QtCore.QRectF(-i * TILE_SIZE, -j * TILE_SIZE,
+                                                  size.width() * scale, size.height() * scale))
+    painter.end()
+    return image
+
+
+class TileState:
+    """The state of an item that is shared with the background threads."""
+    def __init__(self):
+        self.level = None
+        self.alive = True
+
+
+class TiledSvgItem(QtWidgets.QGraphicsObject):
+    """Shows an SVG image through a lazily filled tile pyramid.
+
+    Args:
+        data (bytes):           The SVG image.
+        pool (Executor):        The pool in which the tiles are rendered.
+        parent (QGraphicsItem): The parent item. Defaults to None.
+    """
+    def __init__(self, data, pool, parent=None):
+        super(TiledSvgItem, self).__init__(parent)
+        self.data = bytes(data)
+        self.pool = pool
+        self.renderer = QtSvg.QSvgRenderer(self.data)
+        self.size = QtCore.QSizeF(self.renderer.defaultSize())
+        self.setFlag(QtWidgets.QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+        # The level at which the whole image fits in a single tile
+        self.minLevel = min(0, -math.ceil(math.log2(max(self.size.width(), self.size.height(), 1) / TILE_SIZE)))
+        self.tiles = OrderedDict()
+        self.pending = set()
+        self.state = TileState()
+
+        self.results = queue.SimpleQueue()
+        self.drainTimer = QtCore.QTimer(self)
+        self.drainTimer.setInterval(30)
+        self.drainTimer.timeout.connect(self.drain)
+        self.request(self.minLevel, 0, 0)
+
+    def boundingRect(self):
+        return QtCore.QRectF(QtCore.QPointF(0, 0), self.size)
+
+    def cancel(self):
+        """Stop rendering tiles for this item."""
+        self.state.alive = False
+        self.drainTimer.stop()
+
+    def tileRect(self, level, i, j):
+        """Get the rectangle of a tile, in item coordinates."""
+        size = TILE_SIZE / 2.0 ** level
+        return QtCore.QRectF(i * size, j * size, size, size)
+
+    def request(self, level, i, j):
+        """Render a tile in the background, unless it already is (being) rendered."""
+        key = (level, i, j)
+        if key in self.tiles or key in self.pending:
+            return
+        self.pending.add(key)
+        state, data, size, results, minLevel = self.state, self.data, self.size, self.results, self.minLevel
+
+        def task():
+            # Tiles of a level that is not shown anymore are skipped
+            if not state.alive or (level != state.level and level != minLevel):
+                return key, None
+            try:
+                return key, renderTile(data, size, level, i, j)
+            except Exception:
+                return key, None  # The tile is no longer pending, but not cached either
+
+        future = self.pool.submit(task)
+        future.add_done_callback(lambda f: results.put(f.result()))
+        self.drainTimer.start()
+
+    def drain(self):
+        """Add the rendered tiles to the cache. Runs on the GUI thread."""
+        while True:
+            try:
+                key, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(key)
+            if image is None or not self.state.alive:
+                continue
+            self.tiles[key] = image
+            while len(self.tiles) * TILE_SIZE * TILE_SIZE * 4 > CACHE_SIZE:
+                old, tile = self.tiles.popitem(last=False)
+                if old[0] == self.minLevel:
+                    # The coarsest tile is always kept, as a fallback for all others
+                    self.tiles[old] = tile
+            self.update(self.tileRect(*key))
+        if len(self.pending) == 0:
+            self.drainTimer.stop()
+
+    def paint(self, painter, option, widget=None):
+        if widget is None:
+            # Not shown in a view (e.g. when exporting), hence render at full quality
+            self.renderer.render(painter, self.boundingRect())
+            return
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        level = max(self.minLevel, min(MAX_LEVEL, math.ceil(math.log2(max(lod, 1e-6)))))
+        self.state.level = level
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        size = TILE_SIZE / 2.0 ** level
+        for j in range(int(exposed.top() // size), int(math.ceil(exposed.bottom() / size))):
+            for i in range(int(exposed.left() // size), int(math.ceil(exposed.right() / size))):
+                rect = self.tileRect(level, i, j)
+                key = (level, i, j)
+                if key in self.tiles:
+                    self.tiles.move_to_end(key)
+                    painter.drawImage(rect, self.tiles[key])
+                    continue
+                self.request(level, i, j)
+                # Show the best coarser tile that is available in the meantime
+                for coarser in range(level - 1, self.minLevel - 1, -1):
+                    shift = level - coarser
+                    ckey = (coarser, i >> shift, j >> shift)
+                    if ckey in self.tiles:
+                        crect = self.tileRect(*ckey)
+                        scale = 2.0 ** coarser
+                        source = QtCore.QRectF((rect.left() - crect.left()) * scale,
+                                               (rect.top() - crect.top()) * scale,
+                                               rect.width() * scale, rect.height() * scale)
+                        painter.drawImage(rect, self.tiles[ckey], source)
+                        break
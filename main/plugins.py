@@ -8,8 +8,9 @@ Date:   01/09/2020
 """
 from main.extra.IOHandler import IOHandler
 from main.editor.Parser import Parser
-from main.editor.Highlighter import BaseHighlighter
-import sys, ast
+from main.editor.Highlighter import BaseHighlighter, BracketTable
+from contextlib import contextmanager
+import sys, ast, subprocess, threading
 
 _ioh = IOHandler
 
@@ -19,6 +20,61 @@ def command(cmd):
     if sys.platform == 'win32':
         return subprocess.check_output(cmd, stderr=subprocess.STDOUT, shell=True)
 
+# The processes started by `pipe`, with the function that tells if their job is still needed
+_processes = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+@contextmanager
+def job(alive):
+    """Mark the processes that are started by `pipe` in this thread as part of a job,
+    such that they can be killed by `killOutdated` once their result is not needed anymore.
+
+    Args:
+        alive (callable):   Returns False when the job is outdated. May be called from any thread.
+    """
+    _local.alive = alive
+    try:
+        yield
+    finally:
+        _local.alive = None
+
+def pipe(cmd, data):
+    """Run a command on some input, like a rendering engine does.
+
+    Args:
+        cmd (list):     The command to run.
+        data (bytes):   The input of the command.
+
+    Returns:
+        The output of the command.
+
+    Raises:
+        subprocess.CalledProcessError: When the command fails (or was killed).
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    alive = getattr(_local, "alive", None)
+    if alive is not None:
+        with _lock:
+            _processes[proc] = alive
+        if not alive():
+            proc.kill()  # The job became outdated while the process was started
+    try:
+        out, err = proc.communicate(data)
+    finally:
+        with _lock:
+            _processes.pop(proc, None)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, out, err)
+    return out
+
+def killOutdated():
+    """Kill the processes of all jobs that are outdated."""
+    with _lock:
+        procs = [proc for proc, alive in _processes.items() if not alive()]
+    for proc in procs:
+        proc.kill()
+
 class Plugin:
     def __init__(self, filename):
         self.filename = filename
@@ -180,14 +236,17 @@ class PluginLoader:
 
     def __init__(self):
         self.plugins = {}
+        self._brackets = {}
         self.load()
 
     def reload(self):
+        self._brackets.clear()
         for p in self.get(False):
             p.load()
 
     def load(self, failOnDuplicate=False):
         self.plugins.clear()
+        self._brackets.clear()
         for filename in os.listdir(IOHandler.dir_plugins()):
             if filename == ".dependencies":
                 continue
@@ -245,10 +304,23 @@ class PluginLoader:
         return [i for s in en for i in s]
 
     def getPairedBrackets(self, filetype, active=True):
-        types = {}
-        for d in [x.types for x in self.get(active)]:
-            types.update(d)
-        return types.get(filetype, {}).get("paired", Constants.BRACKETS)
+        return self.getBracketTable(filetype, active).paired
+
+    def getBracketTable(self, filetype, active=True):
+        """Get the (cached) BracketTable for a file type.
+
+        The cache is invalidated whenever the set of active plugins changes.
+        """
+        plugins = self.get(active)
+        signature = tuple(id(p) for p in plugins)
+        cached = self._brackets.get((filetype, active), None)
+        if cached is None or cached[0] != signature:
+            types = {}
+            for d in [x.types for x in plugins]:
+                types.update(d)
+            cached = signature, BracketTable(types.get(filetype, {}).get("paired", Constants.BRACKETS))
+            self._brackets[(filetype, active)] = cached
+        return cached[1]
 
 
 from PyQt6 import QtWidgets, QtCore, uic
@@ -272,7 +344,7 @@ class Settings(QtWidgets.QGroupBox):
         raise NotImplementedError()
 
 
-import subprocess, os
+import os
 from main.extra.Threading import WorkerThread, time
 
 class PluginInstaller(QtWidgets.QDialog):
@@ -13,8 +13,39 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from main.extra.IOHandler import IOHandler
 from main import extra
 from main.wizards.UpdateWizard import version_lt
+from main import Preferences  # Load the plugin system in the same order as the application does
+from main.editor.Highlighter import BracketTable, TextBlockData, BracketIndex
+from main.editor.Selections import inRange
+from main.editor.Intellisense import CompletionStorage, Types, SymbolIndex
+from main.editor.automata import FSA, ssc
+from main.extra.Journal import Journal, replay
+from main.editor.CodeEditor import lineDiff
+from main.extra import Export
+from main.extra.GraphicsView import graphElements, elementBounds
+from main.extra.SpatialIndex import GridIndex
+from main.editor.Parser import sourcePositions
+from main.editor.Focus import FocusGraph
 
 # Prevent the deletion of 'unused' imports
 _ioh = IOHandler
 _ex = extra
 _vlt = version_lt
+_pr = Preferences
+_bt = BracketTable
+_tbd = TextBlockData
+_bi = BracketIndex
+_ir = inRange
+_cs = CompletionStorage
+_ty = Types
+_si = SymbolIndex
+_fsa = FSA
+_ssc = ssc
+_jr = Journal
+_rp = replay
+_ld = lineDiff
+_exp = Export
+_ge = graphElements
+_eb = elementBounds
+_gi = GridIndex
+_sp = sourcePositions
+_fg = FocusGraph
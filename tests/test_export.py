@@ -0,0 +1,30 @@
+"""This file tests the streaming image encoders of main.extra.Export.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import Export
+from PyQt6 import QtGui
+
+def strips(colors, width=3):
+    res = []
+    for color in colors:
+        image = QtGui.QImage(width, 2, QtGui.QImage.Format.Format_ARGB32)
+        image.fill(QtGui.QColor(color))
+        res.append(image)
+    return res
+
+
+def test_encodePPM():
+    data = b"".join(Export.encodePPM(3, 4, strips(["#ff0000", "#0000ff"])))
+    assert data == b"P6\n3 4\n255\n" + b"\xff\x00\x00" * 6 + b"\x00\x00\xff" * 6
+
+
+def test_encodePNG():
+    data = b"".join(Export.encodePNG(3, 4, strips(["#ff0000", "#0000ff"]), 144))
+    image = QtGui.QImage.fromData(data, "PNG")
+    assert image.width() == 3 and image.height() == 4
+    assert image.pixelColor(1, 1) == QtGui.QColor("#ff0000")
+    assert image.pixelColor(1, 3) == QtGui.QColor("#0000ff")
+    assert image.dotsPerMeterX() == 5669
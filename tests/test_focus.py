@@ -0,0 +1,49 @@
+"""This file tests main.editor.Focus.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import FocusGraph, IOHandler
+from lark import Lark
+
+with open(IOHandler.dir_plugins("graphviz", "graphviz.lark")) as file:
+    parser = Lark(file.read(), parser="lalr", propagate_positions=True,
+                  import_paths=[IOHandler.dir_plugins("graphviz")])
+
+TEXT = 'digraph G {\n  rankdir=LR;\n  node [shape=box];\n  a -> b -> c [color=red];\n  b [label="B"];\n' \
+       '  subgraph { c -> d; }\n  d -> e;\n  x -> e;\n}'
+
+
+def test_nodeAt():
+    focus = FocusGraph(parser.parse(TEXT), TEXT)
+    assert len(focus) == 6 and "x" in focus
+    assert focus.nodeAt(TEXT.index("b ->")) == "b"
+    assert focus.nodeAt(TEXT.index("[color")) == "a"  # The first node of the statement
+    assert focus.nodeAt(TEXT.index("[label")) == "b"
+    assert focus.nodeAt(TEXT.index("rankdir")) is None
+    assert [focus.names[n] for n in focus.edges[focus.offsets[2]:focus.offsets[3]]] == ["b", "c"]
+
+
+def test_extract():
+    focus = FocusGraph(parser.parse(TEXT), TEXT)
+    assert {focus.names[n] for n in focus.neighbourhood("c", 1)} == {"b", "c", "d"}
+    assert {focus.names[n] for n in focus.neighbourhood("c", 2)} == {"a", "b", "c", "d", "e"}
+    assert len(focus.neighbourhood("c", 2, 3)) == 3
+
+    text = focus.extract("b", 1)
+    assert text.startswith("digraph {\nrankdir=LR\nnode [shape=box]\n")
+    assert '"b" [label="B"]' in text and '"a"\n' in text
+    assert '"a" -> "b" [color=red]' in text and '"b" -> "c" [color=red]' in text
+    assert '"d"' not in text
+    # The edge from c to d is cut off
+    assert '"__focus_out_2" [label="+1" shape=plaintext fontcolor=gray]' in text
+    assert '"c" -> "__focus_out_2" [style=dashed color=gray]' in text
+    assert parser.parse(text) is not None
+    assert focus.extract("b", 1) is text
+
+    # Default attributes only apply to the statements that follow them
+    text = 'graph {\n  a -- b;\n  node [color=red];\n  b [label="B"];\n  edge [style=bold];\n  b -- c;\n}'
+    focus = FocusGraph(parser.parse(text), text)
+    assert focus.extract("b").split("\n")[1:-1] == \
+        ['"a"', '"a" -- "b"', 'node [color=red]', '"b" [label="B"]', 'edge [style=bold]', '"b" -- "c"', '"c"']
@@ -0,0 +1,40 @@
+"""This file tests the splitting of rendered graphs in main.extra.GraphicsView.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import graphElements, elementBounds
+
+SVG = '''<svg width="62pt" height="116pt" viewBox="0.00 0.00 62.00 116.00" xmlns="http://www.w3.org/2000/svg">
+<g id="graph0" class="graph" transform="translate(4 112)"><title>G</title>
+<polygon fill="white" points="-4,4 -4,-112 58,-112 58,4 -4,4"/>
+<g id="%s" class="node"><title>a</title><ellipse cx="27" cy="-90" rx="27" ry="18"/></g>
+<g id="%s" class="node"><title>b</title><ellipse cx="27" cy="-18" rx="27" ry="18"/></g>
+<g id="edge1" class="edge"><title>a&#45;&gt;b</title><path d="M27,-71.7C27,-63.98 27,-54.71 27,-46.11"/></g>
+</g></svg>'''
+
+
+def test_graphElements():
+    context, base, elements = graphElements((SVG % ("node1", "node2")).encode())
+    assert context == ("62pt", "116pt", "0.00 0.00 62.00 116.00", "translate(4 112)")
+    assert [(key, id) for key, id, _ in elements] == [(("node", "a", 1), "node1"), (("node", "b", 1), "node2"),
+                                                      (("edge", "a->b", 1), "edge1")]
+    assert b"ellipse" not in base and b"polygon" in base
+
+    # Elements are matched by their title, not by the ids that Graphviz generates
+    _, _, others = graphElements((SVG % ("node2", "node3")).encode())
+    assert [xml for _, _, xml in others] == [xml for _, _, xml in elements]
+
+
+def test_graphElements_other():
+    assert graphElements(b'<svg xmlns="http://www.w3.org/2000/svg"><rect width="5" height="5"/></svg>') is None
+    assert graphElements(b'not an image') is None
+
+
+def test_elementBounds():
+    bounds = elementBounds((SVG % ("node1", "node2")).encode())
+    assert [key for _, key in bounds] == [("node", "a", 1), ("node", "b", 1), ("edge", "a->b", 1)]
+    # The ellipses are moved by the transformation of the graph
+    assert bounds[0][0] == (4, 4, 58, 40) and bounds[1][0] == (4, 76, 58, 112)
+    assert elementBounds(b'not an image') == []
@@ -0,0 +1,67 @@
+"""This file tests the bracket scanning of main.editor.Highlighter.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from .context import BracketTable, TextBlockData, BracketIndex
+import random
+
+def test_scan():
+    table = BracketTable([("{", "}"), ("[", "]"), ('"', '"')])
+    infos = table.scan('a [label="x"] { b }')
+    assert [(i.char, i.pos) for i in infos] == [("[", 2), ('"', 9), ('"', 11), ("]", 12), ("{", 14), ("}", 18)]
+    assert BracketTable([]).scan("{}") == []
+
+def test_indexOf():
+    data = TextBlockData(BracketTable([("(", ")")]).scan("(a) (b)"))
+    assert data.indexOf(0) == 0
+    assert data.indexOf(1) == 1
+    assert data.indexOf(3) == 2
+    assert data.indexOf(7) == -1
+
+def test_bracketIndex():
+    table = BracketTable([("{", "}"), ('"', '"')])
+    lines = ['digraph {', '  a [label="x"];', '  subgraph {', '    b;', '  }', '', '}']
+    index = BracketIndex(table)
+    index.build([table.scan(line) for line in lines])
+
+    # The closing bracket of the outer scope
+    assert index.findClosing(0, 1, 0) == (6, 0)
+    # The opening bracket of the outer scope, starting after line 4
+    assert index.findOpening(0, 5, 0) == (0, 0)
+    # The opening bracket of the inner scope, with a single unmatched closing bracket
+    assert index.findOpening(0, 4, 0) == (2, 0)
+    # Quotes match the next/previous occurrence
+    assert index.findClosing(1, 2, 0) == (-1, 0)
+    assert index.findOpening(1, 6, 0) == (1, 0)
+
+    index.update(4, [], len(lines))
+    assert index.findClosing(0, 2, 0) == (-1, 0)
+
+def test_bracketIndex_splice():
+    # Blocks are inserted and removed like the highlighter reports them: the first changed
+    #   block is updated with the new amount of blocks, followed by the other changed blocks
+    table = BracketTable([("{", "}"), ('"', '"')])
+    random.seed(7)
+    lines = [random.choice(["{", "}", "a", '"', "{ }", ""]) for _ in range(50)]
+    index = BracketIndex(table)
+    index.CHUNK_SIZE = 4
+    index.build([table.scan(line) for line in lines])
+    for _ in range(200):
+        block = random.randrange(len(lines))
+        if random.random() < 0.5:
+            new = [random.choice(["{", "}", "b", '"']) for _ in range(random.randrange(1, 12))]
+            lines[block + 1:block + 1] = new
+            changed = range(block, block + len(new) + 1)
+        else:
+            del lines[block + 1:block + 1 + random.randrange(1, 12)]
+            changed = [block]
+        for b in changed:
+            index.update(b, table.scan(lines[b]), len(lines))
+        full = BracketIndex(table)
+        full.build([table.scan(line) for line in lines])
+        assert not index.dirty and index.size == len(lines)
+        for p in range(2):
+            for b in range(0, len(lines), 3):
+                assert index.findClosing(p, b, 1) == full.findClosing(p, b, 1)
+                assert index.findOpening(p, b, 1) == full.findOpening(p, b, 1)
@@ -0,0 +1,101 @@
+"""This file tests the autocompletion storage.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from .context import CompletionStorage, Types, FSA, ssc, SymbolIndex
+
+def labels(storage, prefix):
+    return [x[0] for x in storage.get(prefix)[0]]
+
+def test_get():
+    cs = CompletionStorage()
+    cs.add(["alpha", "alphabet", "beta", "FooBarBaz", "FooXBar"])
+    assert labels(cs, "alp") == ["alpha", "alphabet"]
+    assert labels(cs, "FB") == ["FooBarBaz", "FooXBar"]
+    assert labels(cs, "FoBaB") == ["FooBarBaz"]
+    assert labels(cs, "bx") == ["beta"]
+    assert cs.get("al-p")[1] == "alp"
+
+def test_generations():
+    cs = CompletionStorage()
+    cs.begin()
+    cs.add(["node", "nodes", "edge"])
+    cs.commit()
+    cs.update("snippets", {"nodes": (Types.SNIPPET, "nodes {}")})
+    assert cs.get("nodes")[0] == [("nodes", Types.SNIPPET, "nodes {}")]
+
+    cs.begin()
+    cs.add(["edge"])
+    cs.add(["graph"], source="workspace")
+    cs.commit()
+    assert labels(cs, "") == ["edge", "graph", "nodes"]
+    cs.clear("workspace")
+    assert labels(cs, "") == ["edge", "nodes"]
+
+    cs.begin()
+    cs.add(["node"])
+    cs.abort()
+    cs.add(["edge"], source="parse")
+    assert labels(cs, "") == ["edge", "nodes"]
+    assert cs.alphabet() == set("edgnos")
+
+    cs.clear("snippets")
+    assert labels(cs, "") == ["edge"]
+    assert cs.alphabet() == set("edg")
+    assert len(cs.completions.nodes) == 5
+
+def test_lazyDFA():
+    fsa = FSA()
+    for word in ["ab", "abc", "AbCd", "ACe"]:
+        fsa.insert(word)
+    assert {n.label for n in fsa.find("AC")} == {"AbCd", "ACe"}
+    assert len(fsa.dfa.states) == 3
+    assert {n.label for n in fsa.find("a")} == {"ab", "abc"}
+    assert len(fsa.dfa.states) == 4
+    assert fsa.find("x") == set()
+
+    fsa.remove("ACe")
+    assert {n.label for n in fsa.find("AC")} == {"AbCd"}
+    fsa.insert("ACx")
+    assert {n.label for n in fsa.find("AC")} == {"AbCd", "ACx"}
+    assert {n.label for n in ssc(fsa).nodes if n.final} == {"{ab}", "{abc}", "{AbCd}", "{ACx}"}
+
+def test_rank():
+    cs = CompletionStorage()
+    cs.add(["node_one", "nodeOne", "nodes", "another_node", "done"])
+    ranked, prefix = cs.rank("nO")
+    assert [x[0] for x in ranked] == ["nodeOne", "nodes", "node_one", "another_node"]
+    assert ranked[0][3] == [0, 4]
+    assert [x[0] for x in cs.rank("nodes")[0]] == []
+    assert [x[0] for x in cs.rank("node", limit=2)[0]] == ["nodes", "nodeOne"]
+
+    # Quoted items may span multiple lines
+    cs.add(['"first\nsecond"'])
+    assert [x[0] for x in cs.rank("fs")[0]] == ['"first\nsecond"']
+
+def test_symbolIndex():
+    si = SymbolIndex(depth=2)
+    si.update("a", "Graphviz", ["cluster_0", "Node", "note"])
+    si.update("b", "Graphviz", ["cluster_1", "note"])
+    si.update("c", "Markdown", ["nothing"])
+    assert sorted(si.lookup("no", "Graphviz")) == ["Node", "note"]
+    assert sorted(si.lookup("clu", "Graphviz")) == ["cluster_0", "cluster_1"]
+    assert si.lookup("", "Graphviz") == []
+
+    si.update("a", "Graphviz", ["cluster_0"])
+    assert si.lookup("no", "Graphviz") == ["note"]
+    si.remove("b")
+    assert si.lookup("n", "Graphviz") == []
+    assert si.lookup("n", "Markdown") == ["nothing"]
+
+    cs = CompletionStorage()
+    cs.add(["node"])
+    ranked, _ = cs.rank("n", others=lambda p: si.lookup(p, "Markdown"))
+    assert [x[:2] for x in ranked] == [("node", Types.DEFAULT), ("nothing", Types.WORKSPACE)]
+
+    # Symbols of other files may contain letters that do not occur in this one
+    si.publish("d", "Graphviz", ["zeta", "zebra", "epsilon"])
+    si.discard("a").result()
+    ranked, prefix = cs.rank("ze", others=lambda p: si.lookup(p, "Graphviz"))
+    assert prefix == "ze" and sorted(x[0] for x in ranked) == ["zebra", "zeta"]
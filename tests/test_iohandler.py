@@ -5,7 +5,34 @@ Date:   12/16/2019
 """
 
 from .context import IOHandler
+import pytest
 
 def test_dir_main():
     split = IOHandler.dir_main().split("/")
-    assert split[-1] == "main"
\ No newline at end of file
+    assert split[-1] == "main"
+
+
+def test_read_write(tmp_path):
+    fname = str(tmp_path / "test.dot")
+    IOHandler.write_atomic(fname, "digraph { a -> é; }\r\n".encode("utf-8"))
+    assert IOHandler.read_text(fname) == ("digraph { a -> é; }\r\n", "utf-8")
+    IOHandler.write_atomic(fname, "\ufeffgraph".encode("utf-8"))
+    assert IOHandler.read_text(fname) == ("graph", "utf-8-sig")
+    IOHandler.write_atomic(fname, b"\x00\x01")
+    assert IOHandler.read_text(fname) is None
+    IOHandler.write_atomic(fname, b"\xef\xbb\xbfgraph \xff")  # A BOM, followed by invalid data
+    assert IOHandler.read_text(fname) is None
+    assert [x.name for x in tmp_path.iterdir()] == ["test.dot"]
+
+
+def test_write_text(tmp_path):
+    fname = str(tmp_path / "test.dot")
+    text = "graph {\n  a -- é;\n}\n" * 10
+    IOHandler.write_text(fname, text, "utf-16", "\r\n")
+    with open(fname, "rb") as file:
+        assert file.read() == text.replace("\n", "\r\n").encode("utf-16")
+    assert b"".join(IOHandler.encode_chunks(text, "utf-8-sig", "\n", 7)) == text.encode("utf-8-sig")
+    with pytest.raises(UnicodeEncodeError):
+        IOHandler.write_text(fname, "é", "ascii")
+    assert IOHandler.read_text(fname) == (text.replace("\n", "\r\n"), "utf-16")
+    assert [x.name for x in tmp_path.iterdir()] == ["test.dot"]
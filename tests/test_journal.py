@@ -0,0 +1,28 @@
+"""This file tests the crash recovery journal of main.extra.Journal.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import Journal, replay
+import json
+
+def test_replay():
+    assert replay("", [{"p": 0, "r": 0, "t": "digraph {}"}]) == "digraph {}"
+    assert replay("digraph {}", [{"p": 0, "r": 2, "t": ""}, {"p": 5, "r": 0, "t": " G"}]) == "graph G {}"
+    # Positions are counted in UTF-16 code units, like in a QTextDocument
+    assert replay("😀 -> a", [{"p": 3, "r": 2, "t": "--"}]) == "😀 -- a"
+    # Removals past the end are clamped (e.g. when the whole document is replaced)
+    assert replay("a -> b\n", [{"p": 0, "r": 8, "t": "c"}]) == "c"
+
+
+def test_load(tmp_path):
+    fname = str(tmp_path / "test.journal")
+    records = [{"filename": "", "encoding": "utf-8", "linesep": "\n", "text": "graph {}"},
+               {"p": 7, "r": 0, "t": "a -- b"}]
+    with open(fname, "w", encoding="utf-8") as file:
+        file.write("".join(json.dumps(r) + "\n" for r in records))
+        file.write('{"p": 0, "r')  # Interrupted write
+    item = Journal.load(fname)
+    assert item["text"] == "graph {a -- b}"
+    assert item["filename"] == "" and item["linesep"] == "\n"
@@ -0,0 +1,25 @@
+"""This file tests the line diff that is used to reload files in main.editor.CodeEditor.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import lineDiff, replay
+
+def apply(text, changes):
+    return replay(text, [{"p": start, "r": end - start, "t": txt} for start, end, txt in reversed(changes)])
+
+
+def test_lineDiff():
+    old = "digraph {\n  a -> b;\n  b -> c;\n  c -> d;\n}\n"
+    assert lineDiff(old, old) == []
+    new = "digraph {\n  a -> b;\n  b -> x;\n  c -> d;\n}\n"
+    assert lineDiff(old, new) == [(20, 30, "  b -> x;\n")]
+    new = "digraph G {\n  a -> b;\n  c -> d;\n}"
+    assert apply(old, lineDiff(old, new)) == new
+
+
+def test_lineDiff_utf16():
+    old = "a -> \U0001F600;\nb -> c;\n"
+    new = "a -> \U0001F600;\nb -> d;\n"
+    assert lineDiff(old, new) == [(9, 17, "b -> d;\n")]
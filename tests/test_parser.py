@@ -0,0 +1,21 @@
+"""This file tests the helper functions of main.editor.Parser.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import sourcePositions, IOHandler
+from lark import Lark
+
+
+def test_sourcePositions():
+    with open(IOHandler.dir_plugins("graphviz", "graphviz.lark")) as file:
+        parser = Lark(file.read(), parser="lalr", propagate_positions=True,
+                      import_paths=[IOHandler.dir_plugins("graphviz")])
+    text = 'digraph {\n  a -> b -> "c d";\n  a [label="A"];\n  a -> b;\n  subgraph cluster_x { e }\n}'
+    res = sourcePositions(parser.parse(text))
+    assert [text[s:e] for s, e in res[("node", "a")]] == ['a [label="A"]', 'a -> b -> "c d"', 'a -> b']
+    assert [text[s:e] for s, e in res[("edge", "a->b")]] == ['a -> b -> "c d"', 'a -> b']
+    assert [text[s:e] for s, e in res[("edge", "b->c d")]] == ['a -> b -> "c d"']
+    assert [text[s:e] for s, e in res[("cluster", "cluster_x")]] == ['subgraph cluster_x']
+    assert [text[s:e] for s, e in res[("node", "e")]] == ["e"]
@@ -0,0 +1,13 @@
+"""This file tests the helper functions of main.editor.Selections.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+from .context import inRange
+
+def test_inRange():
+    ranges = [(0, 2, None), (5, 8, None), (10, 12, None), (20, 25, None)]
+    assert inRange(ranges, 6, 11) == [(5, 8, None), (10, 12, None)]
+    assert inRange(ranges, 13, 19) == []
+    assert inRange(ranges, 0, 100) == ranges
+    assert inRange([], 0, 100) == []
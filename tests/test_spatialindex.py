@@ -0,0 +1,30 @@
+"""This file tests main.extra.SpatialIndex.
+
+Author: Randy Paredis
+Date:   10/19/2026
+"""
+
+from .context import GridIndex
+
+
+def test_at():
+    index = GridIndex([((0, 0, 10, 10), "a"), ((5, 5, 20, 20), "b"), ((100, 100, 110, 110), "c")])
+    assert index.at(1, 1) == ["a"]
+    assert index.at(7, 7) == ["a", "b"]
+    assert index.at(105, 100) == ["c"]
+    assert index.at(50, 50) == []
+    assert index.at(-5, -5) == []
+    assert len(index) == 3
+
+
+def test_large():
+    # A rectangle that covers many cells is kept in a coarser grid, but still found
+    items = [((i * 10, 0, i * 10 + 5, 5), i) for i in range(100)] + [((-1000, -1000, 1000, 1000), "all")]
+    index = GridIndex(items, cell=10)
+    assert [cell for cell, _ in index.levels] == [10, 80, 640]
+    assert index.levels[2][1][(0, 0)] == [100]
+    assert index.at(21, 3) == [2, "all"]
+    assert index.at(28, 3) == ["all"]
+    assert index.within(0, 0, 25, 1) == [0, 1, 2, "all"]
+    assert len(index.within(-2000, -2000, 2000, 2000)) == 101
+